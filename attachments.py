@@ -0,0 +1,197 @@
+"""Załączniki (głosówki, zdjęcia, dokumenty) w magazynie adresowanym treścią.
+
+- W SQLite trzymamy tylko metadane (`attachments`), plik leży w
+  <katalog>/ab/abcdef... - nazwą jest SHA-256 treści, więc ten sam
+  plik wysłany dwa razy zajmuje miejsce raz.
+- Pobieranie jest leniwe i asynchroniczne: handler zapisuje tylko file_id,
+  a plik ściąga zadanie w tle (albo `fetch` na żądanie). Treść płynie
+  strumieniem przez `HashingWriter` - skrót liczony w locie, bez trzymania
+  całego pliku w pamięci.
+- Magazyn ma limit rozmiaru: po przekroczeniu usuwamy najdawniej używane
+  pliki (LRU po mtime). Metadane zostają - usunięty plik można pobrać
+  ponownie po file_id, a do pokazania w czacie wystarczy samo file_id.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import httpx
+from telegram import Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = "attachments"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+# Po przekroczeniu limitu sprzątamy do tego ułamka limitu (żeby nie sprzątać przy każdym pliku)
+EVICT_TARGET_RATIO = 0.9
+CHUNK_SIZE = 64 * 1024
+# Bot API nie pozwala pobierać większych plików
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+
+# rodzaj -> (metoda Bot API do ponownego wysłania, nazwa argumentu)
+SEND_METHODS = {
+    'voice': ('send_voice', 'voice'),
+    'audio': ('send_audio', 'audio'),
+    'photo': ('send_photo', 'photo'),
+    'video': ('send_video', 'video'),
+    'video_note': ('send_video_note', 'video_note'),
+    'document': ('send_document', 'document'),
+}
+
+KIND_LABELS = {
+    'voice': "🎤 Notatka głosowa",
+    'audio': "🎵 Nagranie",
+    'photo': "📷 Zdjęcie",
+    'video': "🎬 Wideo",
+    'video_note': "🎬 Wideo",
+    'document': "📎 Dokument",
+}
+
+def extract(message: Message) -> tuple[str, object, str | None] | None:
+    """Zwraca (rodzaj, obiekt pliku Telegrama, nazwa pliku) albo None."""
+    if message.photo:
+        return 'photo', message.photo[-1], None  # największy rozmiar
+    for kind in ('voice', 'audio', 'video', 'video_note', 'document'):
+        media = getattr(message, kind)
+        if media:
+            return kind, media, getattr(media, 'file_name', None)
+    return None
+
+class HashingWriter:
+    """Plik do zapisu, który po drodze liczy SHA-256 i rozmiar treści."""
+
+    def __init__(self, out):
+        self._out = out
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> int:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        return self._out.write(chunk)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+class BlobStore:
+    def __init__(self, repo, root: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.repo = repo  # storage.AttachmentRepository
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._total = None  # liczone leniwie przy pierwszym zapisie
+        self._client = None
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    async def fetch(self, bot, attachment_id: int) -> Path | None:
+        """Zapewnia lokalną kopię załącznika; None, gdy pobranie jest niemożliwe."""
+        attachment = self.repo.get(attachment_id)
+        if attachment is None:
+            return None
+
+        # Już mamy ten plik (ten sam załącznik albo ta sama treść wysłana wcześniej)
+        sha256 = attachment['sha256'] or self.repo.find_sha256(attachment['file_unique_id'])
+        if sha256 and await asyncio.to_thread(self._touch, sha256):
+            if not attachment['sha256']:
+                self.repo.set_sha256(attachment_id, sha256)
+            return self.path(sha256)
+
+        if attachment['size'] and attachment['size'] > TELEGRAM_DOWNLOAD_LIMIT:
+            logger.info("Załącznik #%s ma %d B - powyżej limitu pobierania Bot API", attachment_id,
+                        attachment['size'])
+            return None
+
+        tg_file = await bot.get_file(attachment['file_id'])
+        sha256, size = await self._download(tg_file.file_path)
+        self.repo.set_sha256(attachment_id, sha256)
+        await asyncio.to_thread(self._evict)
+        logger.info("Załącznik #%s zapisany jako %s (%d B)", attachment_id, sha256[:12], size)
+        return self.path(sha256)
+
+    async def prefetch(self, bot, attachment_id: int):
+        """`fetch` do uruchomienia w tle - błędy tylko logujemy (plik pobierze się później)."""
+        try:
+            await self.fetch(bot, attachment_id)
+        except Exception:
+            logger.exception("Nie udało się pobrać załącznika #%s", attachment_id)
+
+    async def _download(self, file_path: str) -> tuple[str, int]:
+        """Strumieniowo zapisuje plik do katalogu tymczasowego i przenosi pod nazwę = skrót."""
+        await asyncio.to_thread(self.root.mkdir, parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix='.part-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                writer = HashingWriter(out)
+                if file_path.startswith(('http://', 'https://')):
+                    if self._client is None:
+                        self._client = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+                    async with self._client.stream('GET', file_path) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                            await asyncio.to_thread(writer.write, chunk)
+                else:
+                    # Lokalny serwer Bot API zwraca ścieżkę na dysku
+                    await asyncio.to_thread(self._copy_local, file_path, writer)
+            sha256 = writer.hexdigest()
+            await asyncio.to_thread(self._commit, tmp_name, sha256, writer.size)
+            return sha256, writer.size
+        except BaseException:
+            await asyncio.to_thread(Path(tmp_name).unlink, missing_ok=True)
+            raise
+
+    @staticmethod
+    def _copy_local(file_path: str, writer: HashingWriter):
+        with open(file_path, 'rb') as src:
+            shutil.copyfileobj(src, writer, CHUNK_SIZE)
+
+    def _commit(self, tmp_name: str, sha256: str, size: int):
+        target = self.path(sha256)
+        if target.exists():
+            Path(tmp_name).unlink()  # ta sama treść już jest - deduplikacja
+            target.touch()
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, target)
+        if self._total is not None:
+            self._total += size
+
+    def _touch(self, sha256: str) -> bool:
+        """Odświeża mtime (LRU); False, gdy pliku nie ma (np. usunięty przez limit)."""
+        try:
+            os.utime(self.path(sha256))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _blobs(self) -> list[tuple[float, int, Path]]:
+        blobs = []
+        for sub in self.root.iterdir() if self.root.exists() else ():
+            if sub.is_dir():
+                for entry in os.scandir(sub):
+                    stat = entry.stat()
+                    blobs.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        return blobs
+
+    def total_bytes(self) -> int:
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._blobs())
+        return self._total
+
+    def _evict(self):
+        """Usuwa najdawniej używane pliki, gdy magazyn przekroczył limit."""
+        if self.total_bytes() <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        blobs = sorted(self._blobs())
+        self._total = sum(size for _, size, _ in blobs)
+        for _, size, path in blobs:
+            if self._total <= target:
+                break
+            path.unlink(missing_ok=True)
+            self._total -= size
+            logger.info("Limit magazynu: usunięto %s (%d B)", path.name[:12], size)
@@ -1,18 +1,87 @@
 import os
 import re
+import sys
+import socket
+import time
+import asyncio
 import logging
 import datetime
 from datetime import timedelta
+from functools import partial
 from dotenv import load_dotenv
-from telegram import Update, BotCommand, ReplyKeyboardRemove
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters, Application
+from telegram import Bot, Update, BotCommand, ReplyKeyboardRemove
+from telegram.error import TelegramError
+from telegram.error import BadRequest
+from telegram.request import BaseRequest, HTTPXRequest
+from telegram.ext import (ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler,
+                          filters, Application, TypeHandler)
 
 import database as db
+import attachments
+import dateparse
+import gate
+import health
+import icsfeed
+import keyboards
+import logconfig
+import profiling
+import recording
+import render
+import review
+import scoring
+import sender
+import shutdown
+import storage
+import textsync
+from dateparse import WEEKDAY_MAP
 
 # Konfiguracja
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_TOKEN")
 MY_CHAT_ID = os.getenv("MY_CHAT_ID")
+# Identyfikator procesu - trafia do tokenów rezerwacji przypomnień
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# Skalowanie poziome: proces z dzierżawą "updates" obsługuje aktualizacje,
+# pozostałe (i te uruchomione z --worker) tylko rozsyłają przypomnienia.
+LEADER_LEASE = "updates"
+LEADER_LEASE_TTL = 60
+WORKER_POLL_SECONDS = 30
+
+# Digest: przypomnienia należne w tym oknie wychodzą jedną wiadomością
+DIGEST_WINDOW_SECONDS = int(os.getenv("DIGEST_WINDOW_SECONDS", "60"))
+# Przypomnienia do 08:00 + tyle minut są dołączane do porannego raportu
+BRIEFING_MERGE_MINUTES = int(os.getenv("BRIEFING_MERGE_MINUTES", "10"))
+# Poranny raport wychodzi raz na dobę (interwał dla watchdoga)
+DAY_SECONDS = 24 * 3600
+# Niepotwierdzone przypomnienie wraca co tyle minut (do kliknięcia ✅ lub drzemki)
+NAG_INTERVAL_MINUTES = int(os.getenv("NAG_INTERVAL_MINUTES", "10"))
+# Ile digestów (po MAX_REMINDER_ROWS przypomnień) może wyjść w jednym przebiegu joba
+MAX_DIGESTS_PER_RUN = 10
+# Drzemki z przycisków pod przypomnieniem; None = jutro o dateparse.DEFAULT_TIME
+SNOOZE_OPTIONS = {
+    keyboards.REMINDER_SNOOZE_10M: timedelta(minutes=10),
+    keyboards.REMINDER_SNOOZE_1H: timedelta(hours=1),
+    keyboards.REMINDER_SNOOZE_TOMORROW: None,
+}
+# Termin zadania (@dzień) oznacza koniec tego dnia
+TASK_DUE_TIME = datetime.time(23, 59)
+# Ile zadań pokazuje /teraz bez argumentu
+NEXT_ACTIONS_LIMIT = 5
+# Ile ostatnio ukończonych zadań pokazuje /historia
+HISTORY_LIMIT = 20
+# Powroty pomysłów (review.py): dzienna porcja o tej godzinie, z tyloma pomysłami
+IDEA_REVIEW_TIME = datetime.time.fromisoformat(os.getenv("IDEA_REVIEW_TIME", "18:00"))
+IDEA_REVIEW_BATCH = int(os.getenv("IDEA_REVIEW_BATCH", str(review.BATCH_SIZE)))
+
+# Logi: JSON (logconfig.py) na stderr albo do pliku LOG_FILE rotowanego po LOG_MAX_MB
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE")
+LOG_MAX_MB = int(os.getenv("LOG_MAX_MB", "10"))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+# Z loggerów httpx/apscheduler zapisujemy co N-ty wpis INFO
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+logconfig.setup(LOG_LEVEL, LOG_FILE, LOG_MAX_MB * 1024 * 1024, LOG_BACKUPS, LOG_SAMPLE_EVERY)
 
 # Stałe Stanów (do konwersacji)
 STATE_IDLE = "IDLE"
@@ -26,80 +95,336 @@ STATE_WAITING_EDIT_ID = "WAITING_EDIT_ID"
 STATE_WAITING_EDIT_CONTENT = "WAITING_EDIT_CONTENT"
 STATE_WAITING_REMINDER = "WAITING_REMINDER"
 
-# Inicjalizacja bazy danych przy starcie
+# Inicjalizacja bazy danych przy starcie (dzierżawy workerów zawsze w SQLite)
 db.init_db()
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Silnik danych: sqlite (domyślnie) | memory | writethrough
+store = storage.open_storage(os.getenv("FOCUSBOT_STORAGE", "sqlite"))
+# Nagrywanie ruchu (aktualizacje + wywołania Bot API) do odtworzenia przez replay.py
+RECORD_FILE = os.getenv("FOCUSBOT_RECORD")
+recorder = recording.Recorder(RECORD_FILE) if RECORD_FILE else None
+if recorder:
+    recorder.snapshot(db.DB_NAME)
+# Wszystkie wiadomości wychodzące idą przez jedną kolejkę (limity, ponowienia)
+outbound = sender.OutboundQueue()
+# SIGTERM/SIGINT: koniec przyjmowania pracy, drenaż do terminu, potem przerwanie wysyłki
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", str(shutdown.TIMEOUT_SECONDS)))
+lifecycle = shutdown.Shutdown(outbound.abort, SHUTDOWN_TIMEOUT_SECONDS)
+# Profilowanie na żądanie (/profil, /pamiec) - bez narzutu, dopóki nie zostanie włączone
+profiler = profiling.SamplingProfiler()
+memory_tracker = profiling.MemoryTracker()
+# Lokalny magazyn plików z załączników (adresowany treścią, z limitem rozmiaru)
+ATTACHMENTS_DIR = os.getenv("ATTACHMENTS_DIR", attachments.DEFAULT_DIR)
+ATTACHMENTS_MAX_MB = int(os.getenv("ATTACHMENTS_MAX_MB", "500"))
+blobs = attachments.BlobStore(store.attachments, ATTACHMENTS_DIR, ATTACHMENTS_MAX_MB * 1024 * 1024)
+# Kanał iCalendar przypomnień: /kalendarz, a z CALENDAR_PORT także lokalny serwer HTTP
+CALENDAR_HOST = os.getenv("CALENDAR_HOST", "127.0.0.1")
+CALENDAR_PORT = int(os.getenv("CALENDAR_PORT", "0"))
+# Sekret w adresie kanału (http://host:port/<token>.ics) - ustaw, gdy serwer nie słucha tylko lokalnie
+CALENDAR_TOKEN = os.getenv("CALENDAR_TOKEN", "")
+calendar_feed = icsfeed.FeedCache(store)
+calendar_server = icsfeed.CalendarServer(calendar_feed, f"/{CALENDAR_TOKEN or 'focusbot'}.ics")
+# Watchdog (health.py): joby, opóźnienie obsługi aktualizacji, zapis do SQLite; z HEALTH_PORT także /healthz
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "0"))
+HEALTH_MAX_LAG_SECONDS = int(os.getenv("HEALTH_MAX_LAG_SECONDS", "60"))
+HEALTH_MAX_WRITE_MS = int(os.getenv("HEALTH_MAX_WRITE_MS", "500"))
+# Dłuższy przebieg joba jest przerywany; domyślnie czas rezerwacji - potem przypomnienia i tak wracają do puli
+HEALTH_JOB_TIMEOUT_SECONDS = int(os.getenv("HEALTH_JOB_TIMEOUT_SECONDS", str(db.CLAIM_LEASE_SECONDS)))
+monitor = health.Monitor(lambda: db.write_heartbeat(WORKER_ID), outbound.pending, max_lag=HEALTH_MAX_LAG_SECONDS,
+                         max_write_ms=HEALTH_MAX_WRITE_MS, job_timeout=HEALTH_JOB_TIMEOUT_SECONDS)
+health_server = health.HealthServer(monitor)
+# Dwustronna synchronizacja z plikiem (textsync.py): todo.txt albo .md; synchronizuje przez SQLite
+SYNC_FILE = os.getenv("SYNC_FILE")
+SYNC_POLL_SECONDS = int(os.getenv("SYNC_POLL_SECONDS", str(textsync.POLL_SECONDS)))
+text_sync = textsync.TextSync(SYNC_FILE) if SYNC_FILE and not isinstance(store, storage.MemoryStorage) else None
+
+# Bramka dostępu (gate.py): obcy odpadają przed handlerami, z limitem odpowiedzi
+GATE_REPLY_WINDOW_SECONDS = int(os.getenv("GATE_REPLY_WINDOW_SECONDS", str(gate.REPLY_WINDOW_SECONDS)))
+GATE_REPLIES_PER_MINUTE = int(os.getenv("GATE_REPLIES_PER_MINUTE", str(gate.REPLIES_PER_MINUTE)))
+
+# Dziennik zmian (database.py) dla /cofnij i /kosz - tylko na SQLite
+JOURNAL_MAX_MB = int(os.getenv("JOURNAL_MAX_MB", str(db.JOURNAL_MAX_BYTES // 2**20)))
+TRASH_DAYS = int(os.getenv("TRASH_DAYS", str(db.JOURNAL_TRASH_DAYS)))
+UNDO_MAX = 20  # najwięcej operacji cofanych jednym /cofnij
+journal_enabled = not isinstance(store, storage.MemoryStorage)
+if journal_enabled:
+    monitor.sections['journal'] = db.get_journal_stats
+
+logger = logging.getLogger(__name__)
+
+async def send_text(chat_id, text: str, reply_markup=None, **kwargs):
+    """Wysyła tekst przez kolejkę wychodzącą; za długi dzieli na kilka wiadomości (przyciski pod ostatnią)."""
+    *head, last = render.split(text)
+    for chunk in head:
+        await outbound.send('send_message', chat_id, text=chunk, **kwargs)
+    return await outbound.send('send_message', chat_id, text=last, reply_markup=reply_markup, **kwargs)
+
+async def reply(update: Update, text: str, **kwargs):
+    """Odpowiada w czacie, z którego przyszła aktualizacja."""
+    return await send_text(update.effective_chat.id, text, **kwargs)
+
+access_gate = gate.Gate(MY_CHAT_ID, reply, reply_window=GATE_REPLY_WINDOW_SECONDS,
+                        replies_per_minute=GATE_REPLIES_PER_MINUTE)
+monitor.sections['gate'] = access_gate.stats
 
 async def security_check(update: Update) -> bool:
+    # Obcych odrzuca wcześniej access_gate (grupa -1) - to druga linia obrony
     user_id = str(update.effective_user.id)
     if user_id != MY_CHAT_ID:
-        await update.message.reply_text("⛔ Brak dostępu. To jest prywatny bot.")
+        if update.callback_query:
+            await update.callback_query.answer("⛔ Brak dostępu.")
+        elif update.effective_message:
+            await reply(update, "⛔ Brak dostępu. To jest prywatny bot.")
         return False
     return True
 
-def format_task_simple(task) -> str:
-    """Formatuje zadanie z uwzględnieniem priorytetu i kategorii."""
-    priority = task['priority'] if 'priority' in task.keys() else 0
-    category = task['category'] if 'category' in task.keys() and task['category'] else None
-    cat_suffix = f" `#{category}`" if category else ""
+def order_task_tree(tasks: list) -> list:
+    """Układa zadania w drzewo (pre-order): podzadania zaraz pod rodzicem.
 
-    if priority:
-        return f"🔴 `{task['id']}`. **{task['content']}**{cat_suffix}"
-    return f"`{task['id']}`. {task['content']}{cat_suffix}"
+    Kolejność rodzeństwa zostaje ta z zapytania (priorytet, data). Zadania,
+    których rodzica nie ma na liście (np. inny filtr), są korzeniami.
+    """
+    present = {t.id for t in tasks}
+    children = {}
+    roots = []
+    for t in tasks:
+        if t.parent_id in present:
+            children.setdefault(t.parent_id, []).append(t)
+        else:
+            roots.append(t)
+    ordered = []
+    stack = list(reversed(roots))
+    while stack:
+        t = stack.pop()
+        ordered.append(t)
+        stack.extend(reversed(children.get(t.id, [])))
+    return ordered
+
+def parse_quiet_hours(value: str | None) -> tuple[datetime.time, datetime.time] | None:
+    """'22:00-07:00' -> (22:00, 07:00); puste lub błędne -> None (ciche godziny wyłączone)."""
+    match = re.match(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$', value or '')
+    if not match:
+        return None
+    h1, m1, h2, m2 = map(int, match.groups())
+    if not (0 <= h1 <= 23 and 0 <= h2 <= 23 and 0 <= m1 <= 59 and 0 <= m2 <= 59):
+        return None
+    return datetime.time(h1, m1), datetime.time(h2, m2)
+
+# Ciche godziny, np. "22:00-07:00" - wtedy wychodzą tylko pilne (`!`) przypomnienia
+QUIET_HOURS = parse_quiet_hours(os.getenv("QUIET_HOURS"))
+
+def in_quiet_hours(moment: datetime.time, quiet_hours=None) -> bool:
+    """Czy `moment` wypada w cichych godzinach (zakres może przechodzić przez północ)."""
+    quiet_hours = quiet_hours or QUIET_HOURS
+    if not quiet_hours:
+        return False
+    start_time, end_time = quiet_hours
+    if start_time <= end_time:
+        return start_time <= moment < end_time
+    return moment >= start_time or moment < end_time
+
+async def deliver_reminders(due_before: datetime.datetime | None = None, prefix: str = ""):
+    """Wysyła należne przypomnienia obu rodzajów jako digesty.
+
+    Outbox: wiersze są najpierw rezerwowane (claim), a potwierdzane (ack)
+    dopiero po udanym send_message; błąd wysyłki zwalnia rezerwacje z
+    backoffem. Bezpieczne przy wielu procesach na jednej bazie.
+
+    Obejmuje wszystko, co wypada do `due_before` (domyślnie teraz + okno
+    digestu). W cichych godzinach rezerwowane są tylko pilne (`!`), reszta
+    czeka i wychodzi jednym digestem po ich końcu. `prefix` dokleja treść
+    przed digestem (poranny raport) - wtedy wiadomość idzie zawsze.
+
+    Digest ma najwyżej MAX_REMINDER_ROWS przypomnień (każde dostaje swoje
+    przyciski); gdy należnych jest więcej, wysyłamy kolejne digesty, do
+    MAX_DIGESTS_PER_RUN na jeden przebieg joba. Po sygnale zamknięcia nie
+    rezerwujemy już następnych. Zwraca liczbę zarezerwowanych przypomnień.
+    """
+    now = datetime.datetime.now()
+    due_before = due_before or now + timedelta(seconds=DIGEST_WINDOW_SECONDS)
+    urgent_only = not prefix and in_quiet_hours(now.time())
+
+    total = 0
+    for _ in range(MAX_DIGESTS_PER_RUN):
+        if lifecycle.requested:
+            break
+        claimed = await deliver_digest(now, due_before, urgent_only, prefix)
+        total += claimed
+        if claimed < keyboards.MAX_REMINDER_ROWS:
+            break
+        prefix = ""
+    return total
+
+async def deliver_digest(now: datetime.datetime, due_before: datetime.datetime,
+                         urgent_only: bool, prefix: str) -> int:
+    """Jeden digest: claim -> send -> ack/release. Zwraca liczbę zarezerwowanych przypomnień (obu rodzajów)."""
+    claim_token = db.new_claim_token(WORKER_ID)
+    reminders = store.reminders.claim_due(claim_token, limit=keyboards.MAX_REMINDER_ROWS,
+                                          due_before=due_before, urgent_only=urgent_only)
+    # Cykliczne dopełniają digest do MAX_REMINDER_ROWS - razem z jednorazowymi, nie ponad nie
+    room = keyboards.MAX_REMINDER_ROWS - len(reminders)
+    recurring = store.recurring.claim_due(claim_token, limit=room, due_before=due_before,
+                                          urgent_only=urgent_only) if room else []
+    if not reminders and not recurring and not prefix:
+        return 0
+
+    message = prefix
+    if reminders or recurring:
+        message += ("\n\n" if prefix else "") + render.reminder_digest(reminders, recurring)
+    try:
+        await send_text(MY_CHAT_ID, message, parse_mode="HTML",
+                        reply_markup=keyboards.build_reminder_keyboard(reminders))
+    except sender.Aborted:
+        # Zamknięcie procesu: rezerwacje zwalnia finish_shutdown, bez backoffu
+        logger.warning("Digest (%d przypomnień) przerwany przy zamykaniu", len(reminders) + len(recurring))
+        return 0
+    except TelegramError:
+        logger.exception("Nie udało się wysłać digestu (%d przypomnień)", len(reminders) + len(recurring))
+        for r in reminders:
+            store.reminders.release(r.id, claim_token, r.attempts)
+        for r in recurring:
+            store.recurring.release(r.id, claim_token, r.attempts)
+        return 0
+
+    # Wysłane przypomnienia wracają co NAG_INTERVAL_MINUTES, dopóki ich nie potwierdzisz
+    nag_at = due_before + timedelta(minutes=NAG_INTERVAL_MINUTES)
+    acked = store.reminders.ack([r.id for r in reminders], claim_token, nag_at)
+    for reminder_id in sorted({r.id for r in reminders} - set(acked)):
+        logger.warning("Rezerwacja przypomnienia #%s wygasła przed potwierdzeniem", reminder_id)
+    for r in recurring:
+        # Następny termin liczony od bieżącego (może leżeć w oknie digestu, po "teraz")
+        next_run = calculate_next_run(
+            r.schedule_type,
+            r.schedule_days,
+            r.schedule_time,
+            after=max(now, datetime.datetime.fromisoformat(r.next_run))
+        )
+        if not store.recurring.ack(r.id, claim_token, next_run):
+            logger.warning("Rezerwacja cyklicznego przypomnienia #%s wygasła przed potwierdzeniem", r.id)
+    return len(reminders) + len(recurring)
 
-def format_idea_simple(idea) -> str:
-    """Formatuje pomysł z uwzględnieniem kategorii."""
-    category = idea['category'] if 'category' in idea.keys() and idea['category'] else None
-    cat_suffix = f" `#{category}`" if category else ""
-    return f"`{idea['id']}`. {idea['content']}{cat_suffix}"
+async def send_idea_review(chat_id) -> int:
+    """Porcja pomysłów z minionym terminem powrotu, z przyciskami; zwraca liczbę wysłanych."""
+    now = datetime.datetime.now()
+    ideas = store.ideas.due_for_review(now, IDEA_REVIEW_BATCH)
+    if not ideas:
+        return 0
+    await send_text(chat_id, render.idea_review(ideas), parse_mode="HTML",
+                    reply_markup=keyboards.build_review_keyboard(ideas))
+    # Bez odpowiedzi wrócą za kilka dni, a jutrzejsza porcja weźmie następne
+    store.ideas.postpone_reviews([i.id for i in ideas], now + timedelta(days=review.PENDING_DAYS))
+    return len(ideas)
+
+async def idea_review_batch(context: ContextTypes.DEFAULT_TYPE):
+    """Job: dzienna porcja pomysłów do przejrzenia."""
+    await send_idea_review(MY_CHAT_ID)
 
 async def morning_briefing(context: ContextTypes.DEFAULT_TYPE):
-    tasks = db.get_active_tasks()
-    if not tasks:
-        message = "☀️ Dzień dobry! Czysta karta na dziś."
-    else:
-        message = f"☀️ **PORANNY RAPORT**\n\nMasz {len(tasks)} zadań:\n"
-        for t in tasks:
-            message += format_task_simple(t) + "\n"
-        message += "\nUżyj `/zrobione <nr>`, aby odhaczyć."
+    message = render.briefing(store.tasks.list_active())
 
-    await context.bot.send_message(chat_id=MY_CHAT_ID, text=message, parse_mode="Markdown")
+    # Przypomnienia wypadające około 08:00 dołączamy do raportu zamiast osobnych wiadomości
+    merge_until = datetime.datetime.now() + timedelta(minutes=BRIEFING_MERGE_MINUTES)
+    await deliver_reminders(due_before=merge_until, prefix=message)
 
 async def check_reminders(context: ContextTypes.DEFAULT_TYPE):
-    """Job sprawdzający i wysyłający przypomnienia."""
-    reminders = db.get_pending_reminders()
-    for r in reminders:
-        message = f"⏰ **PRZYPOMNIENIE**\n\n{r['content']}"
-        await context.bot.send_message(chat_id=MY_CHAT_ID, text=message, parse_mode="Markdown")
-        db.mark_reminder_sent(r['id'])
+    """Job sprawdzający i wysyłający przypomnienia (jednorazowe i cykliczne)."""
+    await deliver_reminders()
+
+async def catch_up_reminders():
+    """Przebieg zaraz po starcie lidera: zaległe przypomnienia bez czekania na pierwsze tyknięcie joba."""
+    logconfig.bind(logconfig.new_correlation_id("catch-up"))
+    started = time.perf_counter()
+    try:
+        claimed = await deliver_reminders()
+    except Exception:
+        logger.exception("Błąd nadrabiania przypomnień po starcie")
+        return
+    if claimed:
+        logger.info("Po starcie nadrobiono %d przypomnień", claimed, extra={
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+
+async def send_health_alert(bot: Bot, text: str):
+    # Z pominięciem kolejki wychodzącej - alert ma dojść także wtedy, gdy to ona stoi
+    await bot.send_message(MY_CHAT_ID, text)
+
+_catch_up_task = None
 
 async def post_init(application: Application):
+    global _catch_up_task
+    outbound.start(application.bot)
+    # Sygnał zatrzymuje pobieranie aktualizacji; drenaż robi Application.stop i post_shutdown
+    lifecycle.install(application.stop_running)
+    # W tle - start pollingu i dzierżawy lidera nie czeka na wysyłkę zaległych
+    _catch_up_task = asyncio.create_task(catch_up_reminders(), name="catch-up")
     await application.bot.set_my_commands([
         BotCommand("zadanie", "Dodaj zadanie"),
+        BotCommand("teraz", "Najważniejsze zadania na teraz"),
         BotCommand("zrobione", "Oznacz zadanie jako wykonane"),
+        BotCommand("zalezy", "Zadanie czeka na inne zadanie"),
         BotCommand("pomysl", "Dodaj pomysł"),
         BotCommand("lista", "Pokaż wszystko"),
         BotCommand("usun", "Usuń zadanie lub pomysł"),
         BotCommand("edytuj", "Edytuj zadanie lub pomysł"),
         BotCommand("historia", "Pokaż ukończone zadania"),
+        BotCommand("przejrzyj", "Pomysły do przejrzenia"),
+        BotCommand("zalaczniki", "Pokaż załączniki zadania lub pomysłu"),
         BotCommand("przypomnij", "Ustaw przypomnienie"),
         BotCommand("przypomnienia", "Pokaż aktywne przypomnienia"),
         BotCommand("cyklicznie", "Ustaw cykliczne przypomnienie"),
         BotCommand("cykliczne", "Pokaż cykliczne przypomnienia"),
+        BotCommand("kalendarz", "Przypomnienia jako plik kalendarza (.ics)"),
+        BotCommand("cofnij", "Cofnij ostatnie zmiany"),
+        BotCommand("kosz", "Usunięte elementy i przywracanie"),
         BotCommand("start", "Panel startowy")
     ])
 
     if application.job_queue:
         t = datetime.time(8, 00)
-        application.job_queue.run_daily(morning_briefing, t, chat_id=MY_CHAT_ID)
-        # Sprawdzaj przypomnienia co 30 sekund
-        application.job_queue.run_repeating(check_reminders, interval=30, first=5)
-        # Sprawdzaj cykliczne przypomnienia co 30 sekund
-        application.job_queue.run_repeating(check_recurring_reminders, interval=30, first=10)
+        # Każde uruchomienie joba ma własny identyfikator korelacji w logach,
+        # a watchdog (monitor.track) pilnuje, czy job tyka i się nie zawiesił
+        application.job_queue.run_daily(
+            logconfig.traced_job(monitor.track(morning_briefing, interval=DAY_SECONDS,
+                                               stale_after=DAY_SECONDS + 3600)), t, chat_id=MY_CHAT_ID)
+        application.job_queue.run_daily(
+            logconfig.traced_job(monitor.track(idea_review_batch, interval=DAY_SECONDS,
+                                               stale_after=DAY_SECONDS + 3600)), IDEA_REVIEW_TIME)
+        # Sprawdzaj przypomnienia (jednorazowe i cykliczne) co 30 sekund
+        application.job_queue.run_repeating(logconfig.traced_job(monitor.track(check_reminders, interval=30)),
+                                            interval=30, first=5)
+        # Terminy zadań zbliżają się z czasem - okresowo przeliczamy ich wynik
+        application.job_queue.run_repeating(
+            logconfig.traced_job(monitor.track(refresh_task_scores, interval=scoring.REFRESH_INTERVAL_SECONDS)),
+            interval=scoring.REFRESH_INTERVAL_SECONDS, first=10)
+        # Odnawiaj dzierżawę lidera (obsługa aktualizacji) z zapasem względem TTL
+        application.job_queue.run_repeating(
+            logconfig.traced_job(monitor.track(renew_leader_lease, interval=LEADER_LEASE_TTL / 3)),
+            interval=LEADER_LEASE_TTL / 3, first=0)
+        if text_sync:
+            # Plik sprawdzamy po mtime - bez zmian po żadnej stronie przebieg to jedno stat()
+            application.job_queue.run_repeating(
+                logconfig.traced_job(monitor.track(sync_text_file, interval=SYNC_POLL_SECONDS)),
+                interval=SYNC_POLL_SECONDS, first=1)
+        if journal_enabled:
+            application.job_queue.run_repeating(
+                logconfig.traced_job(monitor.track(compact_journal, interval=3600)), interval=3600, first=60)
+
+    # Watchdog to osobne zadanie (nie job) - zauważy też zatrzymaną kolejkę jobów
+    monitor.start(partial(send_health_alert, application.bot))
+    if HEALTH_PORT:
+        try:
+            await health_server.start(HEALTH_HOST, HEALTH_PORT)
+            logger.info("Endpoint /healthz na %s:%d", HEALTH_HOST, HEALTH_PORT)
+        except OSError as e:
+            logger.warning("Nie udało się uruchomić serwera /healthz: %s", e)
+
+    if CALENDAR_PORT:
+        try:
+            await calendar_server.start(CALENDAR_HOST, CALENDAR_PORT)
+            logger.info("Kanał iCalendar na %s:%d", CALENDAR_HOST, CALENDAR_PORT)
+        except OSError as e:
+            # Np. port zajęty przez inny proces bota - bot działa dalej, /kalendarz też
+            logger.warning("Nie udało się uruchomić serwera kanału iCalendar: %s", e)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await security_check(update): return
@@ -107,10 +432,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Resetujemy stan
     context.user_data['state'] = STATE_IDLE
 
-    await update.message.reply_text(
+    await reply(update, 
         "👋 Cześć Szefie!\n\n"
-        "Wpisz `/` aby zobaczyć dostępne komendy.",
-        parse_mode="Markdown",
+        "Wpisz <code>/</code> aby zobaczyć dostępne komendy.",
+        parse_mode="HTML",
         reply_markup=ReplyKeyboardRemove()
     )
 
@@ -126,16 +451,58 @@ def extract_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
     return ''
 
 def parse_priority(content: str) -> tuple[str, int]:
-    """Parsuje priorytet z treści zadania.
+    """Parsuje priorytet z treści zadania (liczba `!`, maks. 3).
 
     '! Zapłacić podatki' -> ('Zapłacić podatki', 1)
+    '!!! Awaria serwera' -> ('Awaria serwera', 3)
     'Kupić mleko' -> ('Kupić mleko', 0)
     """
     content = content.strip()
-    if content.startswith('!'):
-        return content[1:].strip(), 1
+    stripped = content.lstrip('!')
+    level = len(content) - len(stripped)
+    if level:
+        return stripped.strip(), min(level, scoring.MAX_PRIORITY)
     return content, 0
 
+def parse_due(content: str) -> tuple[str, datetime.datetime | None]:
+    """Parsuje termin (@dzień) z treści - koniec wskazanego dnia.
+
+    'Raport @pt' -> ('Raport', piątek 23:59)
+    'Dentysta @15.11' -> ('Dentysta', 15.11 23:59)
+    """
+    match = re.search(r'(?:^|\s)@(\S+)', content)
+    if match:
+        day = dateparse.parse_day(match.group(1))
+        if day:
+            clean_content = (content[:match.start()] + content[match.end():]).strip()
+            return clean_content, datetime.datetime.combine(day, TASK_DUE_TIME)
+    return content, None
+
+def parse_effort(content: str) -> tuple[str, int | None]:
+    """Parsuje szacowany wysiłek (~czas) z treści.
+
+    'Umyć okna ~1h30m' -> ('Umyć okna', 90)
+    """
+    match = re.search(r'(?:^|\s)~(\S+)', content)
+    if match:
+        minutes = dateparse.parse_duration(match.group(1))
+        if minutes:
+            clean_content = (content[:match.start()] + content[match.end():]).strip()
+            return clean_content, minutes
+    return content, None
+
+def parse_parent(content: str) -> tuple[str, int | None]:
+    """Parsuje rodzica podzadania (^id) z treści.
+
+    '^12 Kupić farbę' -> ('Kupić farbę', 12)
+    'Kupić mleko' -> ('Kupić mleko', None)
+    """
+    match = re.search(r'\^(\d+)', content)
+    if match:
+        clean_content = re.sub(r'\s*\^\d+', '', content, count=1).strip()
+        return clean_content, int(match.group(1))
+    return content, None
+
 def parse_category(content: str) -> tuple[str, str | None]:
     """Parsuje kategorię (hashtag) z treści.
 
@@ -150,16 +517,6 @@ def parse_category(content: str) -> tuple[str, str | None]:
         return clean_content, category
     return content, None
 
-WEEKDAY_MAP = {
-    'pn': 0, 'pon': 0, 'poniedziałek': 0, 'poniedzialek': 0,
-    'wt': 1, 'wto': 1, 'wtorek': 1,
-    'śr': 2, 'sr': 2, 'sro': 2, 'środa': 2, 'sroda': 2,
-    'cz': 3, 'czw': 3, 'czwartek': 3,
-    'pt': 4, 'pia': 4, 'piątek': 4, 'piatek': 4,
-    'sb': 5, 'sob': 5, 'sobota': 5,
-    'nd': 6, 'nie': 6, 'niedziela': 6,
-}
-
 def parse_recurring_schedule(text: str) -> tuple[dict | None, str]:
     """Parsuje harmonogram cyklicznego przypomnienia.
 
@@ -259,9 +616,10 @@ def parse_recurring_schedule(text: str) -> tuple[dict | None, str]:
 
     return None, text
 
-def calculate_next_run(schedule_type: str, days: str | None, time_str: str) -> datetime.datetime:
-    """Oblicza następny czas uruchomienia dla cyklicznego przypomnienia."""
-    now = datetime.datetime.now()
+def calculate_next_run(schedule_type: str, days: str | None, time_str: str,
+                       after: datetime.datetime | None = None) -> datetime.datetime:
+    """Oblicza następny czas uruchomienia dla cyklicznego przypomnienia (po `after`, domyślnie teraz)."""
+    now = after or datetime.datetime.now()
     hour, minute = map(int, time_str.split(':'))
     target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
 
@@ -313,154 +671,146 @@ def calculate_next_run(schedule_type: str, days: str | None, time_str: str) -> d
 
     return target_time
 
-def format_schedule_description(schedule_type: str, days: str | None, time_str: str) -> str:
-    """Formatuje opis harmonogramu do wyświetlenia użytkownikowi."""
-    day_names = ['Pn', 'Wt', 'Śr', 'Cz', 'Pt', 'Sb', 'Nd']
-
-    if schedule_type == 'daily':
-        return f"codziennie o {time_str}"
-    elif schedule_type == 'weekdays':
-        day_indices = [int(d) for d in days.split(',')]
-        if day_indices == [0, 1, 2, 3, 4]:
-            return f"Pn-Pt o {time_str}"
-        day_str = ', '.join(day_names[d] for d in day_indices)
-        return f"{day_str} o {time_str}"
-    elif schedule_type == 'weekly':
-        day_idx = int(days)
-        return f"co tydzień ({day_names[day_idx]}) o {time_str}"
-    elif schedule_type == 'custom_days':
-        day_indices = [int(d) for d in days.split(',')]
-        day_str = ', '.join(day_names[d] for d in day_indices)
-        return f"{day_str} o {time_str}"
-    elif schedule_type == 'monthly':
-        return f"co miesiąc ({days}.) o {time_str}"
-    return time_str
-
 def parse_reminder_time(text: str) -> tuple[datetime.datetime | None, str]:
     """Parsuje czas przypomnienia z tekstu.
 
-    Obsługiwane formaty:
+    Obsługiwane formaty (pełna gramatyka w `dateparse`):
     - '15:00 Zadzwonić' -> (datetime z godziną 15:00, 'Zadzwonić')
-    - 'za 30m Sprawdzić' -> (datetime za 30 minut, 'Sprawdzić')
-    - 'za 2h Spotkanie' -> (datetime za 2 godziny, 'Spotkanie')
-    - 'za 1d Raport' -> (datetime za 1 dzień, 'Raport')
+    - 'za 30m Sprawdzić', 'za 1h30m Pranie', 'za 2 godziny Spotkanie'
+    - 'jutro 9:00 Raport', 'w piątek o 14 Przegląd', '15.11 10:00 Wizyta'
     """
-    text = text.strip()
-    now = datetime.datetime.now()
-
-    # Format: "za Xm/h/d treść"
-    relative_match = re.match(r'^za\s+(\d+)\s*(m|min|h|g|d|dni?)\s+(.+)$', text, re.IGNORECASE)
-    if relative_match:
-        amount = int(relative_match.group(1))
-        unit = relative_match.group(2).lower()
-        content = relative_match.group(3).strip()
-
-        if unit in ('m', 'min'):
-            remind_at = now + timedelta(minutes=amount)
-        elif unit in ('h', 'g'):
-            remind_at = now + timedelta(hours=amount)
-        elif unit in ('d', 'dn', 'dni'):
-            remind_at = now + timedelta(days=amount)
-        else:
-            return None, text
-
-        return remind_at, content
-
-    # Format: "HH:MM treść"
-    time_match = re.match(r'^(\d{1,2}):(\d{2})\s+(.+)$', text)
-    if time_match:
-        hour = int(time_match.group(1))
-        minute = int(time_match.group(2))
-        content = time_match.group(3).strip()
-
-        if 0 <= hour <= 23 and 0 <= minute <= 59:
-            remind_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-            # Jeśli godzina już minęła, ustaw na jutro
-            if remind_at <= now:
-                remind_at += timedelta(days=1)
-            return remind_at, content
-
+    parsed = dateparse.parse(text.strip())
+    if parsed:
+        return parsed.when, parsed.content
     return None, text
 
 # --- Funkcje pomocnicze (DRY) ---
 
-def save_task(content: str) -> tuple[str, str]:
-    """Parsuje i zapisuje zadanie. Zwraca (prefix, suffix) do odpowiedzi."""
-    task_content, priority = parse_priority(content)
+def format_similar(similar: list) -> str:
+    """Linia '🔁 Podobne: #12, #40' - podpowiedź przy prawdopodobnym duplikacie."""
+    if not similar:
+        return ""
+    return "\n🔁 Podobne: " + ", ".join(f"#{row_id}" for row_id, _ in similar)
+
+def save_task(content: str) -> tuple[int | None, str]:
+    """Parsuje i zapisuje zadanie. Zwraca (ID lub None, tekst odpowiedzi)."""
+    task_content, parent_id = parse_parent(content)
+    task_content, priority = parse_priority(task_content)
     task_content, category = parse_category(task_content)
-    db.add_task(task_content, priority, category)
+    task_content, due_at = parse_due(task_content)
+    task_content, effort = parse_effort(task_content)
+    parent_suffix = ""
+    if parent_id is not None:
+        parent = store.tasks.get(parent_id)
+        if not parent or parent.is_done:
+            return None, f"❌ Nie ma aktywnego zadania #{parent_id} (rodzic {render.code(f'^{parent_id}')})."
+        # Podzadanie bez własnego #tagu dziedziczy kategorię rodzica
+        category = category or parent.category
+        parent_suffix = f" ↳ #{parent_id}"
+    # Sprawdzamy przed zapisem, żeby nowe zadanie nie znalazło samego siebie
+    similar = store.tasks.similar(task_content)
+    task_id = store.tasks.add(task_content, priority, category, parent_id, due_at, effort)
     prefix = "🔴 PILNE: " if priority else "✅ Dodano: "
-    suffix = f" `#{category}`" if category else ""
-    return f"{prefix}{task_content}{suffix}"
+    return task_id, (f"{prefix}{render.escape(task_content)}{render.category_tag(category)}"
+                     f"{render.task_schedule(due_at, effort)}{parent_suffix}{format_similar(similar)}")
+
+def complete_task(task_id: int) -> str:
+    """Odhacza zadanie (z poddrzewem). Zwraca tekst odpowiedzi."""
+    progress = store.tasks.progress([task_id]).get(task_id)
+    blocked_before = store.tasks.blocked_ids()
+    if not store.tasks.mark_done(task_id):
+        return f"❌ Nie znaleziono zadania o ID {task_id}."
+    response = f"🎉 Brawo! Zadanie #{task_id} wykonane."
+    if progress and progress[0] < progress[1]:
+        response += f"\n☑️ Zamknięte podzadania: {progress[1] - progress[0]}"
+    unblocked = sorted(blocked_before - store.tasks.blocked_ids())
+    if unblocked:
+        response += f"\n🔓 Odblokowane: #{', #'.join(map(str, unblocked))}"
+    return response
 
-def save_idea(content: str) -> str:
-    """Parsuje i zapisuje pomysł. Zwraca tekst odpowiedzi."""
+def save_idea(content: str) -> tuple[int, str]:
+    """Parsuje i zapisuje pomysł. Zwraca (ID, tekst odpowiedzi)."""
     idea_content, category = parse_category(content)
-    db.add_idea(idea_content, category)
-    suffix = f" `#{category}`" if category else ""
-    return f"💡 Zapisano: {idea_content}{suffix}"
+    similar = store.ideas.similar(idea_content)
+    idea_id = store.ideas.add(idea_content, category)
+    return idea_id, f"💡 Zapisano: {render.escape(idea_content)}{render.category_tag(category)}{format_similar(similar)}"
+
+def parse_sync_entry(kind: str, text: str) -> tuple[str, int, str | None]:
+    """Linia z pliku synchronizacji -> (treść, priorytet, kategoria), jak /zadanie i /pomysl."""
+    content, priority = parse_priority(text) if kind == 'task' else (text.strip(), 0)
+    content, category = parse_category(content)
+    return content, priority, category
 
 def save_reminder(content: str) -> tuple[bool, str]:
-    """Parsuje i zapisuje przypomnienie. Zwraca (sukces, tekst odpowiedzi)."""
-    remind_at, reminder_content = parse_reminder_time(content)
-    if remind_at:
-        db.add_reminder(reminder_content, remind_at)
-        time_str = remind_at.strftime("%H:%M")
-        date_str = remind_at.strftime("%d.%m")
-        return True, f"⏰ Przypomnienie ustawione!\n\n📝 {reminder_content}\n🕐 {time_str} ({date_str})"
+    """Parsuje i zapisuje przypomnienie. Zwraca (sukces, tekst odpowiedzi).
+
+    Wyrażenia powtarzalne ('codziennie o 7 ...', 'co piątek 16:00 ...')
+    zapisywane są jako przypomnienia cykliczne.
+    """
+    parsed = dateparse.parse(content.strip())
+    if parsed:
+        # `!` = pilne: przebija ciche godziny
+        reminder_content, priority = parse_priority(parsed.content)
+        if parsed.recurrence:
+            rule = parsed.recurrence
+            reminder_id = store.recurring.add(
+                reminder_content, rule['type'], rule['days'], rule['time'], parsed.when, priority
+            )
+            schedule_desc = render.schedule_description(rule['type'], rule['days'], rule['time'])
+            return True, (
+                f"🔄 Cykliczne przypomnienie #{reminder_id} utworzone!\n\n"
+                f"📝 {render.escape(reminder_content)}\n🗓️ {schedule_desc}\n"
+                f"⏭️ Następne: {parsed.when.strftime('%d.%m %H:%M')}"
+            )
+        store.reminders.add(reminder_content, parsed.when, priority)
+        time_str = parsed.when.strftime("%H:%M")
+        date_str = parsed.when.strftime("%d.%m")
+        return True, f"⏰ Przypomnienie ustawione!\n\n📝 {render.escape(reminder_content)}\n🕐 {time_str} ({date_str})"
     return False, (
         "⚠️ Nie rozpoznałem formatu czasu.\n\n"
         "Użyj:\n"
-        "• `15:00 Zadzwonić do lekarza`\n"
-        "• `za 30m Sprawdzić pranie`\n"
-        "• `za 2h Spotkanie`"
+        "• <code>15:00 Zadzwonić do lekarza</code>\n"
+        "• <code>za 30m Sprawdzić pranie</code>\n"
+        "• <code>jutro 9:00 Raport</code>\n"
+        "• <code>w piątek o 14 Przegląd</code>"
     )
 
 def build_list_response(header: str, tasks: list, ideas: list, show_prompt: bool = False) -> str:
-    """Buduje odpowiedź z listą zadań i pomysłów."""
-    response = f"{header}\n\n"
-    response += "📌 **ZADANIA:**\n"
-    if tasks:
-        for t in tasks:
-            response += format_task_simple(t) + "\n"
-    else:
-        response += "(pusto)\n"
-
-    response += "\n💡 **POMYSŁY:**\n"
-    if ideas:
-        for i in ideas:
-            response += format_idea_simple(i) + "\n"
-    else:
-        response += "(pusto)\n"
-
-    if show_prompt:
-        response += "\n➡️ Wpisz `z` (zadanie) lub `p` (pomysł):"
-
-    return response
+    """Buduje odpowiedź z listą zadań (jako drzewo) i pomysłów; `header` to gotowy HTML."""
+    task_ids = [t.id for t in tasks]
+    return render.task_list(
+        header, tasks, ideas,
+        progress=store.tasks.progress(task_ids) if tasks else {},
+        blocked=store.tasks.blocked_ids() if tasks else set(),
+        task_clips=store.attachments.counts('task', task_ids),
+        idea_clips=store.attachments.counts('idea', [i.id for i in ideas]),
+        prompt=("➡️ Kliknij przycisk albo wpisz <code>z</code> (zadanie) lub <code>p</code> (pomysł):"
+                if show_prompt else None),
+    )
 
 async def add_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await security_check(update): return
     content = extract_content(update, context)
 
     if content:
-        response = save_task(content)
-        await update.message.reply_text(response, parse_mode="Markdown")
+        _, response = save_task(content)
+        await reply(update, response, parse_mode="HTML")
         context.user_data['state'] = STATE_IDLE
     else:
         context.user_data['state'] = STATE_WAITING_TASK
-        await update.message.reply_text("✍️ Napisz treść zadania:\n_(Dodaj `!` = PILNE, `#tag` = kategoria)_", parse_mode="Markdown")
+        await reply(update, "✍️ Napisz treść zadania:\n<i>(Dodaj <code>!</code>/<code>!!</code>/<code>!!!</code> = priorytet, <code>#tag</code> = kategoria, <code>@pt</code> = termin, <code>~30m</code> = czas, <code>^nr</code> = podzadanie)</i>", parse_mode="HTML")
 
 async def add_idea_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await security_check(update): return
     content = extract_content(update, context)
 
     if content:
-        response = save_idea(content)
-        await update.message.reply_text(response, parse_mode="Markdown")
+        _, response = save_idea(content)
+        await reply(update, response, parse_mode="HTML")
         context.user_data['state'] = STATE_IDLE
     else:
         context.user_data['state'] = STATE_WAITING_IDEA
-        await update.message.reply_text("🧠 Napisz swój pomysł:\n_(Dodaj `#tag` = kategoria)_", parse_mode="Markdown")
+        await reply(update, "🧠 Napisz swój pomysł:\n<i>(Dodaj <code>#tag</code> = kategoria)</i>", parse_mode="HTML")
 
 async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await security_check(update): return
@@ -469,18 +819,14 @@ async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args:
         try:
             task_id = int(context.args[0])
-            success = db.mark_task_done(task_id)
-            if success:
-                await update.message.reply_text(f"🎉 Brawo! Zadanie #{task_id} wykonane.")
-            else:
-                await update.message.reply_text(f"❌ Nie znaleziono zadania o ID {task_id}.")
+            await reply(update, complete_task(task_id))
             context.user_data['state'] = STATE_IDLE
         except ValueError:
-             await update.message.reply_text("⚠️ Numer musi być cyfrą.")
+             await reply(update, "⚠️ Numer musi być cyfrą.")
     else:
         # Kliknięto sam przycisk
         context.user_data['state'] = STATE_WAITING_DONE_ID
-        await update.message.reply_text("🔢 Podaj numer zadania do odhaczenia:")
+        await reply(update, "🔢 Podaj numer zadania do odhaczenia:")
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Obsługuje zwykły tekst w zależności od stanu rozmowy."""
@@ -494,25 +840,21 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     if state == STATE_WAITING_TASK:
-        response = save_task(text)
-        await update.message.reply_text(response, parse_mode="Markdown")
+        _, response = save_task(text)
+        await reply(update, response, parse_mode="HTML")
         context.user_data['state'] = STATE_IDLE
 
     elif state == STATE_WAITING_IDEA:
-        response = save_idea(text)
-        await update.message.reply_text(response, parse_mode="Markdown")
+        _, response = save_idea(text)
+        await reply(update, response, parse_mode="HTML")
         context.user_data['state'] = STATE_IDLE
 
     elif state == STATE_WAITING_DONE_ID:
         try:
             task_id = int(text)
-            success = db.mark_task_done(task_id)
-            if success:
-                await update.message.reply_text(f"🎉 Brawo! Zadanie #{task_id} wykonane.")
-            else:
-                await update.message.reply_text(f"❌ Nie znaleziono zadania o ID {task_id}.")
+            await reply(update, complete_task(task_id))
         except ValueError:
-            await update.message.reply_text("⚠️ To nie jest numer. Spróbuj ponownie lub użyj innej komendy.")
+            await reply(update, "⚠️ To nie jest numer. Spróbuj ponownie lub użyj innej komendy.")
         finally:
             context.user_data['state'] = STATE_IDLE
 
@@ -521,13 +863,13 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if choice in ['z', 'zadanie']:
             context.user_data['delete_type'] = 'task'
             context.user_data['state'] = STATE_WAITING_DELETE_ID
-            await update.message.reply_text("🔢 Podaj numer(y) zadań do usunięcia:\n_(np. `3` lub `1,3,5`)_", parse_mode="Markdown")
+            await reply(update, "🔢 Podaj numer(y) zadań do usunięcia:\n<i>(np. <code>3</code> lub <code>1,3,5</code>)</i>", parse_mode="HTML")
         elif choice in ['p', 'pomysl', 'pomysł']:
             context.user_data['delete_type'] = 'idea'
             context.user_data['state'] = STATE_WAITING_DELETE_ID
-            await update.message.reply_text("🔢 Podaj numer(y) pomysłów do usunięcia:\n_(np. `2` lub `1,4,6`)_", parse_mode="Markdown")
+            await reply(update, "🔢 Podaj numer(y) pomysłów do usunięcia:\n<i>(np. <code>2</code> lub <code>1,4,6</code>)</i>", parse_mode="HTML")
         else:
-            await update.message.reply_text("⚠️ Wpisz `z` (zadanie) lub `p` (pomysł).", parse_mode="Markdown")
+            await reply(update, "⚠️ Wpisz <code>z</code> (zadanie) lub <code>p</code> (pomysł).", parse_mode="HTML")
 
     elif state == STATE_WAITING_DELETE_ID:
         # Obsługa wielu ID: "1,3,5" lub "1 3 5" lub "1, 3, 5"
@@ -537,20 +879,22 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         not_found = []
         invalid = []
 
-        for raw_id in raw_ids:
-            try:
-                item_id = int(raw_id.strip())
-                if delete_type == 'task':
-                    success = db.delete_task(item_id)
-                else:
-                    success = db.delete_idea(item_id)
-
-                if success:
-                    deleted.append(str(item_id))
-                else:
-                    not_found.append(str(item_id))
-            except ValueError:
-                invalid.append(raw_id)
+        # Jedna partia w dzienniku - /cofnij przywraca całe "1,3,5" naraz
+        with db.journal_batch():
+            for raw_id in raw_ids:
+                try:
+                    item_id = int(raw_id.strip())
+                    if delete_type == 'task':
+                        success = store.tasks.delete(item_id)
+                    else:
+                        success = store.ideas.delete(item_id)
+
+                    if success:
+                        deleted.append(str(item_id))
+                    else:
+                        not_found.append(str(item_id))
+                except ValueError:
+                    invalid.append(raw_id)
 
         # Buduj odpowiedź
         response = ""
@@ -562,7 +906,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if invalid:
             response += f"⚠️ Nieprawidłowe: {', '.join(invalid)}"
 
-        await update.message.reply_text(response.strip())
+        await reply(update, response.strip())
         context.user_data['state'] = STATE_IDLE
 
     elif state == STATE_WAITING_EDIT_TYPE:
@@ -570,96 +914,123 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if choice in ['z', 'zadanie']:
             context.user_data['edit_type'] = 'task'
             context.user_data['state'] = STATE_WAITING_EDIT_ID
-            await update.message.reply_text("🔢 Podaj numer zadania do edycji:")
+            await reply(update, "🔢 Podaj numer zadania do edycji:")
         elif choice in ['p', 'pomysl', 'pomysł']:
             context.user_data['edit_type'] = 'idea'
             context.user_data['state'] = STATE_WAITING_EDIT_ID
-            await update.message.reply_text("🔢 Podaj numer pomysłu do edycji:")
+            await reply(update, "🔢 Podaj numer pomysłu do edycji:")
         else:
-            await update.message.reply_text("⚠️ Wpisz `z` (zadanie) lub `p` (pomysł).", parse_mode="Markdown")
+            await reply(update, "⚠️ Wpisz <code>z</code> (zadanie) lub <code>p</code> (pomysł).", parse_mode="HTML")
 
     elif state == STATE_WAITING_EDIT_ID:
         try:
             item_id = int(text)
             edit_type = context.user_data.get('edit_type', 'task')
             if edit_type == 'task':
-                item = db.get_task_by_id(item_id)
+                item = store.tasks.get(item_id)
                 if item:
                     context.user_data['edit_id'] = item_id
                     context.user_data['state'] = STATE_WAITING_EDIT_CONTENT
-                    await update.message.reply_text(
-                        f"📝 Aktualna treść:\n`{item['content']}`\n\nWpisz nową treść:",
-                        parse_mode="Markdown"
+                    await reply(update, 
+                        f"📝 Aktualna treść:\n{render.code(render.clip(item.content, render.MAX_TEXT_LENGTH, False))}\n\nWpisz nową treść:",
+                        parse_mode="HTML"
                     )
                 else:
-                    await update.message.reply_text(f"❌ Nie znaleziono zadania #{item_id}.")
+                    await reply(update, f"❌ Nie znaleziono zadania #{item_id}.")
                     context.user_data['state'] = STATE_IDLE
             else:
-                item = db.get_idea_by_id(item_id)
+                item = store.ideas.get(item_id)
                 if item:
                     context.user_data['edit_id'] = item_id
                     context.user_data['state'] = STATE_WAITING_EDIT_CONTENT
-                    await update.message.reply_text(
-                        f"📝 Aktualna treść:\n`{item['content']}`\n\nWpisz nową treść:",
-                        parse_mode="Markdown"
+                    await reply(update, 
+                        f"📝 Aktualna treść:\n{render.code(render.clip(item.content, render.MAX_TEXT_LENGTH, False))}\n\nWpisz nową treść:",
+                        parse_mode="HTML"
                     )
                 else:
-                    await update.message.reply_text(f"❌ Nie znaleziono pomysłu #{item_id}.")
+                    await reply(update, f"❌ Nie znaleziono pomysłu #{item_id}.")
                     context.user_data['state'] = STATE_IDLE
         except ValueError:
-            await update.message.reply_text("⚠️ To nie jest numer.")
+            await reply(update, "⚠️ To nie jest numer.")
             context.user_data['state'] = STATE_IDLE
 
     elif state == STATE_WAITING_EDIT_CONTENT:
         edit_type = context.user_data.get('edit_type', 'task')
         edit_id = context.user_data.get('edit_id')
         if edit_type == 'task':
-            success = db.update_task(edit_id, text)
+            # `!`, `@dzień` i `~czas` w nowej treści zmieniają priorytet/termin/wysiłek
+            new_content, priority = parse_priority(text)
+            new_content, due_at = parse_due(new_content)
+            new_content, effort = parse_effort(new_content)
+            success = store.tasks.update(edit_id, new_content, priority or None, due_at, effort)
             if success:
-                await update.message.reply_text(f"✏️ Zadanie #{edit_id} zaktualizowane!")
+                await reply(update, f"✏️ Zadanie #{edit_id} zaktualizowane!")
             else:
-                await update.message.reply_text("❌ Wystąpił błąd podczas edycji.")
+                await reply(update, "❌ Wystąpił błąd podczas edycji.")
         else:
-            success = db.update_idea(edit_id, text)
+            success = store.ideas.update(edit_id, text)
             if success:
-                await update.message.reply_text(f"✏️ Pomysł #{edit_id} zaktualizowany!")
+                await reply(update, f"✏️ Pomysł #{edit_id} zaktualizowany!")
             else:
-                await update.message.reply_text("❌ Wystąpił błąd podczas edycji.")
+                await reply(update, "❌ Wystąpił błąd podczas edycji.")
         context.user_data['state'] = STATE_IDLE
 
     elif state == STATE_WAITING_REMINDER:
         _, response = save_reminder(text)
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await reply(update, response, parse_mode="HTML")
         context.user_data['state'] = STATE_IDLE
 
     else:
-        await update.message.reply_text("🤔 Nie wiem co z tym zrobić. Wybierz opcję z menu.")
+        await reply(update, "🤔 Nie wiem co z tym zrobić. Wybierz opcję z menu.")
+
+def build_list_header(category: str | None) -> str:
+    """Nagłówek /lista: filtr albo centrum dowodzenia z listą kategorii."""
+    return render.list_header(category, [] if category else store.categories())
 
 async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await security_check(update): return
     context.user_data['state'] = STATE_IDLE
 
-    # Sprawdź czy filtrujemy po kategorii
     content = extract_content(update, context)
+
+    # /lista ^5 - poddrzewo jednego zadania z postępem
+    _, root_id = parse_parent(content)
+    if root_id is not None:
+        subtree = [t for t in store.tasks.subtree(root_id) if not t.is_done or t.id == root_id]
+        if not subtree:
+            await reply(update, f"❌ Nie znaleziono zadania #{root_id}.")
+            return
+        tasks = order_task_tree(subtree)
+        context.user_data['list_category'] = None
+        response = build_list_response(f"🌳 <b>PODZADANIA #{root_id}</b>", tasks, [])
+        await reply(update, response, parse_mode="HTML",
+                    reply_markup=keyboards.build_list_keyboard(tasks, []))
+        return
+
+    # /lista wolne - tylko zadania, które można zacząć teraz
+    if content.strip().lower() == 'wolne':
+        tasks = store.tasks.list_unblocked()
+        context.user_data['list_category'] = None
+        response = build_list_response("🟢 <b>DO ZROBIENIA TERAZ</b>", tasks, [])
+        await reply(update, response, parse_mode="HTML",
+                    reply_markup=keyboards.build_list_keyboard(tasks, []))
+        return
+
+    # Sprawdź czy filtrujemy po kategorii
     category = None
     if content:
         _, category = parse_category(content)
         if not category and content.startswith('#'):
             category = content[1:].lower().strip()
 
-    tasks = db.get_active_tasks(category)
-    ideas = db.get_ideas(category)
+    tasks = order_task_tree(store.tasks.list_active(category))
+    ideas = store.ideas.list(category)
+    # Przyciski pod listą odświeżają ją w miejscu - pamiętamy aktywny filtr
+    context.user_data['list_category'] = category
 
-    if category:
-        header = f"📋 **FILTR: #{category}**"
-    else:
-        header = "📋 **CENTRUM DOWODZENIA**"
-        categories = db.get_all_categories()
-        if categories:
-            header += f"\n\n🏷️ Kategorie: {', '.join([f'`#{c}`' for c in categories])}"
-
-    response = build_list_response(header, tasks, ideas)
-    await update.message.reply_text(response, parse_mode="Markdown")
+    response = build_list_response(build_list_header(category), tasks, ideas)
+    await reply(update, response, parse_mode="HTML",
+                                    reply_markup=keyboards.build_list_keyboard(tasks, ideas))
 
 async def delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Komenda /usun - usuwa zadanie lub pomysł."""
@@ -670,50 +1041,364 @@ async def delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             item_id = int(context.args[1])
             if item_type in ['z', 'zadanie']:
-                success = db.delete_task(item_id)
+                success = store.tasks.delete(item_id)
                 msg = f"🗑️ Zadanie #{item_id} usunięte." if success else f"❌ Nie znaleziono zadania #{item_id}."
             elif item_type in ['p', 'pomysl', 'pomysł']:
-                success = db.delete_idea(item_id)
+                success = store.ideas.delete(item_id)
                 msg = f"🗑️ Pomysł #{item_id} usunięty." if success else f"❌ Nie znaleziono pomysłu #{item_id}."
             else:
-                msg = "⚠️ Użyj: `/usun z <nr>` lub `/usun p <nr>`"
-            await update.message.reply_text(msg, parse_mode="Markdown")
+                msg = "⚠️ Użyj: <code>/usun z &lt;nr&gt;</code> lub <code>/usun p &lt;nr&gt;</code>"
+            await reply(update, msg, parse_mode="HTML")
         except ValueError:
-            await update.message.reply_text("⚠️ Numer musi być cyfrą.")
+            await reply(update, "⚠️ Numer musi być cyfrą.")
         context.user_data['state'] = STATE_IDLE
     else:
-        tasks = db.get_active_tasks()
-        ideas = db.get_ideas()
-        response = build_list_response("🗑️ **CO CHCESZ USUNĄĆ?**", tasks, ideas, show_prompt=True)
+        tasks = order_task_tree(store.tasks.list_active())
+        ideas = store.ideas.list()
+        response = build_list_response("🗑️ <b>CO CHCESZ USUNĄĆ?</b>", tasks, ideas, show_prompt=True)
         context.user_data['state'] = STATE_WAITING_DELETE_TYPE
-        await update.message.reply_text(response, parse_mode="Markdown")
+        context.user_data['list_category'] = None
+        await reply(update, response, parse_mode="HTML",
+                                        reply_markup=keyboards.build_list_keyboard(tasks, ideas))
 
 async def edit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Komenda /edytuj - edytuje zadanie lub pomysł."""
     if not await security_check(update): return
 
-    tasks = db.get_active_tasks()
-    ideas = db.get_ideas()
-    response = build_list_response("✏️ **CO CHCESZ EDYTOWAĆ?**", tasks, ideas, show_prompt=True)
+    tasks = order_task_tree(store.tasks.list_active())
+    ideas = store.ideas.list()
+    response = build_list_response("✏️ <b>CO CHCESZ EDYTOWAĆ?</b>", tasks, ideas, show_prompt=True)
     context.user_data['state'] = STATE_WAITING_EDIT_TYPE
-    await update.message.reply_text(response, parse_mode="Markdown")
+    context.user_data['list_category'] = None
+    await reply(update, response, parse_mode="HTML",
+                                    reply_markup=keyboards.build_list_keyboard(tasks, ideas))
+
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Obsługuje przyciski pod listą: akcja na elemencie + edycja listy w miejscu."""
+    if not await security_check(update): return
+    query = update.callback_query
+
+    decoded = keyboards.decode(query.data or '')
+    if not decoded:
+        await query.answer("⚠️ Nieznany przycisk.")
+        return
+    action, item_id = decoded
+
+    if action == keyboards.REMINDER_DONE or action in SNOOZE_OPTIONS:
+        await handle_reminder_callback(query, action, item_id)
+        return
+
+    if action in IDEA_REVIEW_GRADES or action in (keyboards.IDEA_PROMOTE, keyboards.IDEA_ARCHIVE):
+        await handle_idea_review_callback(query, action, item_id)
+        return
+
+    if action in (keyboards.TASK_EDIT, keyboards.IDEA_EDIT):
+        is_task = action == keyboards.TASK_EDIT
+        item = store.tasks.get(item_id) if is_task else store.ideas.get(item_id)
+        if not item:
+            await query.answer("❌ Element już nie istnieje.")
+        else:
+            context.user_data['edit_type'] = 'task' if is_task else 'idea'
+            context.user_data['edit_id'] = item_id
+            context.user_data['state'] = STATE_WAITING_EDIT_CONTENT
+            await query.answer()
+            await reply(update, 
+                f"📝 Aktualna treść:\n{render.code(render.clip(item.content, render.MAX_TEXT_LENGTH, False))}\n\nWpisz nową treść:",
+                parse_mode="HTML"
+            )
+        return
+
+    if action == keyboards.TASK_DONE:
+        notice = complete_task(item_id)
+    elif action == keyboards.TASK_DELETE:
+        success = store.tasks.delete(item_id)
+        notice = f"🗑️ Zadanie #{item_id} usunięte." if success else f"❌ Nie znaleziono zadania #{item_id}."
+    elif action == keyboards.IDEA_DELETE:
+        success = store.ideas.delete(item_id)
+        notice = f"🗑️ Pomysł #{item_id} usunięty." if success else f"❌ Nie znaleziono pomysłu #{item_id}."
+    else:
+        await query.answer("⚠️ Nieznany przycisk.")
+        return
+
+    await query.answer(notice)
+    context.user_data['state'] = STATE_IDLE
+
+    # Odśwież tę samą wiadomość zamiast wysyłać nową kopię listy
+    category = context.user_data.get('list_category')
+    tasks = order_task_tree(store.tasks.list_active(category))
+    ideas = store.ideas.list(category)
+    try:
+        await outbound.send(
+            'edit_message_text', query.message.chat_id,
+            message_id=query.message.message_id,
+            # Edytowanej wiadomości nie da się podzielić - za długą listę ucinamy
+            text=render.truncate(build_list_response(build_list_header(category), tasks, ideas)),
+            parse_mode="HTML",
+            reply_markup=keyboards.build_list_keyboard(tasks, ideas)
+        )
+    except BadRequest as e:
+        # "Message is not modified" - lista się nie zmieniła (np. podwójne kliknięcie)
+        if 'not modified' not in str(e).lower():
+            raise
+
+async def depends_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /zalezy <nr> <nr_blokujacego> - zadanie czeka na inne (-nr usuwa zależność)."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+
+    usage = "⚠️ Użyj: <code>/zalezy &lt;nr&gt; &lt;nr_blokującego&gt;</code> (albo <code>-&lt;nr&gt;</code>, by usunąć zależność)"
+    if not context.args or len(context.args) != 2:
+        await reply(update, usage, parse_mode="HTML")
+        return
+    try:
+        task_id = int(context.args[0])
+        remove = context.args[1].startswith('-')
+        blocked_by = int(context.args[1].lstrip('-'))
+    except ValueError:
+        await reply(update, usage, parse_mode="HTML")
+        return
+
+    if remove:
+        if store.tasks.remove_dependency(task_id, blocked_by):
+            await reply(update, f"🔓 Zadanie #{task_id} już nie czeka na #{blocked_by}.")
+        else:
+            await reply(update, f"❌ Zadanie #{task_id} nie zależało od #{blocked_by}.")
+        return
+
+    for item_id in (task_id, blocked_by):
+        if not store.tasks.get(item_id):
+            await reply(update, f"❌ Nie znaleziono zadania #{item_id}.")
+            return
+    if store.tasks.add_dependency(task_id, blocked_by):
+        await reply(update, f"🔒 Zadanie #{task_id} czeka teraz na #{blocked_by}.")
+    else:
+        await reply(update, f"⚠️ Zależność #{task_id} → #{blocked_by} już istnieje albo utworzyłaby cykl.")
+
+async def next_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /teraz [N] - N najważniejszych zadań, które można zacząć od razu."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+
+    limit = NEXT_ACTIONS_LIMIT
+    if context.args:
+        try:
+            limit = max(1, min(int(context.args[0]), keyboards.MAX_KEYBOARD_ITEMS))
+        except ValueError:
+            await reply(update, "⚠️ Użyj: <code>/teraz</code> albo <code>/teraz &lt;ile&gt;</code>", parse_mode="HTML")
+            return
+
+    tasks = store.tasks.list_unblocked(limit=limit)
+    if not tasks:
+        await reply(update, "🏖️ Nic nie czeka na zrobienie.")
+        return
+    context.user_data['list_category'] = None
+    await reply(update, render.next_actions(tasks), parse_mode="HTML",
+                reply_markup=keyboards.build_list_keyboard(tasks, []))
+
+async def sync_text_file(context: ContextTypes.DEFAULT_TYPE):
+    """Job synchronizacji z SYNC_FILE; konflikty (wygrywa bot) zgłasza z treścią z pliku."""
+    result = text_sync.sync(parse_sync_entry)
+    if result.conflicts:
+        lines = [f"• {'zadanie' if kind == 'task' else 'pomysł'} #{row_id}: {render.escape(text)}"
+                 for kind, row_id, text in result.conflicts]
+        await send_text(MY_CHAT_ID, "⚠️ <b>Konflikt synchronizacji z plikiem</b> - zmienione też w bocie, "
+                        "zostaje wersja z bota. Z pliku:\n" + "\n".join(lines), parse_mode="HTML")
+
+async def compact_journal(context: ContextTypes.DEFAULT_TYPE):
+    """Job: przycina dziennik zmian (głębokość cofania, wiek kosza, rozmiar)."""
+    removed = db.compact_journal(trash_days=TRASH_DAYS, max_bytes=JOURNAL_MAX_MB * 2**20)
+    if removed:
+        logger.info("Dziennik zmian: usunięto %d starych wpisów", removed)
+
+async def refresh_task_scores(context: ContextTypes.DEFAULT_TYPE):
+    """Job: przelicza wynik zadań z terminem (zbliżający się termin podnosi zadanie)."""
+    changed = store.tasks.refresh_scores()
+    if changed:
+        logger.info("Przeliczono wynik %d zadań", changed)
+
+async def handle_reminder_callback(query, action: int, reminder_id: int):
+    """✅ / drzemka pod przypomnieniem: zmiana stanu + usunięcie jego przycisków z wiadomości."""
+    if action == keyboards.REMINDER_DONE:
+        success = store.reminders.complete(reminder_id)
+        notice = f"✅ Przypomnienie #{reminder_id} odhaczone." if success else "❌ Przypomnienie już nieaktywne."
+    else:
+        delay = SNOOZE_OPTIONS[action]
+        now = datetime.datetime.now()
+        if delay is None:
+            until = datetime.datetime.combine(now.date() + timedelta(days=1), dateparse.DEFAULT_TIME)
+        else:
+            until = now + delay
+        success = store.reminders.snooze(reminder_id, until)
+        notice = (f"💤 Przypomnę {until.strftime('%d.%m %H:%M')}." if success
+                  else "❌ Przypomnienie już nieaktywne.")
+    await query.answer(notice)
+
+    try:
+        await outbound.send(
+            'edit_message_reply_markup', query.message.chat_id,
+            message_id=query.message.message_id,
+            reply_markup=keyboards.without_item(query.message.reply_markup, reminder_id)
+        )
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
+
+IDEA_REVIEW_GRADES = {keyboards.IDEA_KEEP: review.KEEP, keyboards.IDEA_LATER: review.LATER}
+
+async def handle_idea_review_callback(query, action: int, idea_id: int):
+    """Przyciski pod porcją pomysłów: ocena SM-2, zamiana w zadanie albo archiwum."""
+    if action in IDEA_REVIEW_GRADES:
+        next_review = store.ideas.review(idea_id, IDEA_REVIEW_GRADES[action], datetime.datetime.now())
+        icon = "👍" if action == keyboards.IDEA_KEEP else "💤"
+        notice = (f"{icon} Pomysł #{idea_id} wróci {next_review.strftime('%d.%m.%Y')}." if next_review
+                  else "❌ Pomysł już nieaktywny.")
+    elif action == keyboards.IDEA_PROMOTE:
+        task_id = store.promote_idea(idea_id)
+        notice = f"📌 Pomysł #{idea_id} jest teraz zadaniem #{task_id}." if task_id else "❌ Pomysł już nie istnieje."
+    else:
+        success = store.ideas.archive(idea_id)
+        notice = f"🗄️ Pomysł #{idea_id} w archiwum." if success else "❌ Pomysł już nieaktywny."
+    await query.answer(notice)
+
+    try:
+        await outbound.send(
+            'edit_message_reply_markup', query.message.chat_id,
+            message_id=query.message.message_id,
+            reply_markup=keyboards.without_item(query.message.reply_markup, idea_id)
+        )
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
+
+async def handle_attachment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Głosówka / zdjęcie / dokument -> nowy pomysł (albo zadanie) z załącznikiem.
+
+    Podpis to treść (obsługuje `!`, `#tag`, `@dzień`...); `z:` na początku
+    podpisu albo wcześniejsze /zadanie tworzą zadanie. Plik pobiera się w tle.
+    """
+    if not await security_check(update): return
+    message = update.message
+    found = attachments.extract(message)
+    if not found:
+        return
+    kind, media, file_name = found
+
+    caption = (message.caption or '').strip()
+    state = context.user_data.get('state', STATE_IDLE)
+    as_task = state == STATE_WAITING_TASK
+    if caption[:2].lower() in ('z:', 'p:'):
+        as_task = caption[0].lower() == 'z'
+        caption = caption[2:].strip()
+    content = caption or (f"{attachments.KIND_LABELS[kind]}: {file_name}" if file_name
+                          else attachments.KIND_LABELS[kind])
+
+    # Wpis i załącznik to jedna partia w dzienniku - jedno /cofnij usuwa oba
+    with db.journal_batch():
+        if as_task:
+            item_id, response = save_task(content)
+        else:
+            item_id, response = save_idea(content)
+        if item_id is not None:
+            attachment_id = store.attachments.add(
+                'task' if as_task else 'idea', item_id, kind, media.file_id, media.file_unique_id,
+                file_name, getattr(media, 'mime_type', None), media.file_size
+            )
+    context.user_data['state'] = STATE_IDLE
+    if item_id is None:
+        await reply(update, response, parse_mode="HTML")
+        return
+
+    # Pobranie nie blokuje obsługi aktualizacji - leci w tle
+    context.application.create_task(blobs.prefetch(context.bot, attachment_id))
+    await reply(update, f"{response} 📎", parse_mode="HTML")
+
+async def attachments_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /zalaczniki z|p <nr> - odsyła załączniki zadania lub pomysłu."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+
+    usage = "⚠️ Użyj: <code>/zalaczniki z &lt;nr&gt;</code> lub <code>/zalaczniki p &lt;nr&gt;</code>"
+    if not context.args or len(context.args) != 2 or context.args[0].lower() not in ('z', 'p'):
+        await reply(update, usage, parse_mode="HTML")
+        return
+    try:
+        item_id = int(context.args[1])
+    except ValueError:
+        await reply(update, usage, parse_mode="HTML")
+        return
+
+    owner_type = 'task' if context.args[0].lower() == 'z' else 'idea'
+    items = store.attachments.list_for(owner_type, item_id)
+    if not items:
+        await reply(update, f"📭 Brak załączników dla #{item_id}.")
+        return
+    for a in items:
+        # file_id wystarcza do ponownego wysłania - lokalna kopia nie jest potrzebna
+        method, argument = attachments.SEND_METHODS[a['kind']]
+        await outbound.send(method, update.effective_chat.id, **{argument: a['file_id']})
 
 async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Komenda /historia - pokazuje ukończone zadania."""
     if not await security_check(update): return
     context.user_data['state'] = STATE_IDLE
 
-    completed = db.get_completed_tasks(limit=20)
+    completed = store.tasks.list_completed(limit=HISTORY_LIMIT)
 
     if not completed:
-        await update.message.reply_text("📜 Historia jest pusta. Czas coś zrobić!")
+        await reply(update, "📜 Historia jest pusta. Czas coś zrobić!")
         return
 
-    response = "📜 **HISTORIA (ostatnie 20)**\n\n"
-    for t in completed:
-        response += f"✅ ~~{t['content']}~~\n"
+    await reply(update, render.history(completed, HISTORY_LIMIT), parse_mode="HTML")
+
+async def undo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /cofnij [ile] - cofa ostatnie operacje z dziennika zmian."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+    if not journal_enabled:
+        await reply(update, "⚠️ Cofanie wymaga bazy SQLite (FOCUSBOT_STORAGE=sqlite lub writethrough).")
+        return
+    try:
+        count = int(context.args[0]) if context.args else 1
+    except ValueError:
+        await reply(update, "⚠️ Użycie: <code>/cofnij</code> lub <code>/cofnij 3</code>", parse_mode="HTML")
+        return
+    entries = db.undo_last(max(1, min(count, UNDO_MAX)))
+    if not entries:
+        await reply(update, "↩️ Nie ma czego cofnąć.")
+        return
+    await reply(update, render.undone(entries), parse_mode="HTML")
+
+async def trash_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /kosz [nr] - ostatnie usunięcia; z numerem przywraca wskazane."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+    if not journal_enabled:
+        await reply(update, "⚠️ Kosz wymaga bazy SQLite (FOCUSBOT_STORAGE=sqlite lub writethrough).")
+        return
+    if context.args:
+        try:
+            entry_id = int(context.args[0].lstrip('#'))
+        except ValueError:
+            await reply(update, "⚠️ Użycie: <code>/kosz</code> lub <code>/kosz 12</code>", parse_mode="HTML")
+            return
+        entry = db.restore_deleted(entry_id)
+        if entry is None:
+            await reply(update, f"❌ Nie ma w koszu pozycji {entry_id}.")
+            return
+        await reply(update, render.undone([entry], "Przywrócono z kosza:"), parse_mode="HTML")
+        return
+    entries = db.get_trash()
+    if not entries:
+        await reply(update, f"🗑️ Kosz jest pusty (usunięcia trzymamy {TRASH_DAYS} dni).")
+        return
+    await reply(update, render.trash(entries), parse_mode="HTML")
 
-    await update.message.reply_text(response, parse_mode="Markdown")
+async def review_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /przejrzyj - porcja pomysłów do przejrzenia od razu, bez czekania na IDEA_REVIEW_TIME."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+    if not await send_idea_review(update.effective_chat.id):
+        await reply(update, "💡 Żaden pomysł nie czeka teraz na powrót.")
 
 async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Komenda /przypomnij - ustawia przypomnienie."""
@@ -723,18 +1408,21 @@ async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if content:
         _, response = save_reminder(content)
-        await update.message.reply_text(response, parse_mode="Markdown")
+        await reply(update, response, parse_mode="HTML")
         context.user_data['state'] = STATE_IDLE
     else:
         context.user_data['state'] = STATE_WAITING_REMINDER
-        await update.message.reply_text(
+        await reply(update, 
             "⏰ Ustaw przypomnienie:\n\n"
             "Formaty:\n"
-            "• `15:00 Zadzwonić do lekarza`\n"
-            "• `za 30m Sprawdzić pranie`\n"
-            "• `za 2h Spotkanie`\n"
-            "• `za 1d Raport`",
-            parse_mode="Markdown"
+            "• <code>15:00 Zadzwonić do lekarza</code>\n"
+            "• <code>za 30m Sprawdzić pranie</code>\n"
+            "• <code>za 1h30m Spotkanie</code>\n"
+            "• <code>jutro 9:00 Raport</code>\n"
+            "• <code>w piątek o 14 Przegląd</code>\n"
+            "• <code>15.11 10:00 Dentysta</code>\n"
+            "• <code>codziennie o 7 Leki</code>",
+            parse_mode="HTML"
         )
 
 async def reminders_list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -742,20 +1430,15 @@ async def reminders_list_command(update: Update, context: ContextTypes.DEFAULT_T
     if not await security_check(update): return
     context.user_data['state'] = STATE_IDLE
 
-    reminders = db.get_active_reminders()
+    reminders = store.reminders.list_active()
 
     if not reminders:
-        await update.message.reply_text("⏰ Brak aktywnych przypomnień.")
+        await reply(update, "⏰ Brak aktywnych przypomnień.")
         return
 
-    response = "⏰ **AKTYWNE PRZYPOMNIENIA**\n\n"
-    for r in reminders:
-        remind_at = datetime.datetime.fromisoformat(r['remind_at'])
-        time_str = remind_at.strftime("%H:%M")
-        date_str = remind_at.strftime("%d.%m")
-        response += f"`{r['id']}`. {r['content']} — 🕐 {time_str} ({date_str})\n"
-
-    await update.message.reply_text(response, parse_mode="Markdown")
+    response = render.reminder_list(reminders, {db.REMINDER_NAGGING: "🔁", db.REMINDER_SNOOZED: "💤"})
+    await reply(update, response, parse_mode="HTML",
+                reply_markup=keyboards.build_reminder_keyboard(reminders))
 
 # --- Cykliczne Przypomnienia ---
 
@@ -768,55 +1451,57 @@ async def recurring_remind_command(update: Update, context: ContextTypes.DEFAULT
     if content:
         schedule_info, reminder_content = parse_recurring_schedule(content)
         if schedule_info:
+            reminder_content, priority = parse_priority(reminder_content)
             next_run = calculate_next_run(
                 schedule_info['type'],
                 schedule_info['days'],
                 schedule_info['time']
             )
-            reminder_id = db.add_recurring_reminder(
+            reminder_id = store.recurring.add(
                 reminder_content,
                 schedule_info['type'],
                 schedule_info['days'],
                 schedule_info['time'],
-                next_run
+                next_run,
+                priority
             )
-            schedule_desc = format_schedule_description(
+            schedule_desc = render.schedule_description(
                 schedule_info['type'],
                 schedule_info['days'],
                 schedule_info['time']
             )
             next_run_str = next_run.strftime("%d.%m %H:%M")
-            await update.message.reply_text(
+            await reply(update, 
                 f"🔄 Cykliczne przypomnienie #{reminder_id} utworzone!\n\n"
-                f"📝 {reminder_content}\n"
+                f"📝 {render.escape(reminder_content)}\n"
                 f"🗓️ {schedule_desc}\n"
                 f"⏭️ Następne: {next_run_str}",
-                parse_mode="Markdown"
+                parse_mode="HTML"
             )
         else:
-            await update.message.reply_text(
+            await reply(update, 
                 "⚠️ Nie rozpoznałem formatu.\n\n"
                 "Użyj:\n"
-                "• `codziennie 08:00 Poranna kawa`\n"
-                "• `pon-pt 09:00 Standup`\n"
-                "• `co tydzień pn 10:00 Weekly review`\n"
-                "• `pon,śr,pt 18:00 Ćwiczenia`\n"
-                "• `co miesiąc 1 09:00 Rachunki`",
-                parse_mode="Markdown"
+                "• <code>codziennie 08:00 Poranna kawa</code>\n"
+                "• <code>pon-pt 09:00 Standup</code>\n"
+                "• <code>co tydzień pn 10:00 Weekly review</code>\n"
+                "• <code>pon,śr,pt 18:00 Ćwiczenia</code>\n"
+                "• <code>co miesiąc 1 09:00 Rachunki</code>",
+                parse_mode="HTML"
             )
         context.user_data['state'] = STATE_IDLE
     else:
-        await update.message.reply_text(
-            "🔄 **Cykliczne przypomnienie**\n\n"
+        await reply(update, 
+            "🔄 <b>Cykliczne przypomnienie</b>\n\n"
             "Formaty:\n"
-            "• `codziennie 08:00 Poranna kawa`\n"
-            "• `pon-pt 09:00 Standup`\n"
-            "• `co tydzień pn 10:00 Weekly review`\n"
-            "• `pon,śr,pt 18:00 Ćwiczenia`\n"
-            "• `co miesiąc 1 09:00 Rachunki`\n\n"
+            "• <code>codziennie 08:00 Poranna kawa</code>\n"
+            "• <code>pon-pt 09:00 Standup</code>\n"
+            "• <code>co tydzień pn 10:00 Weekly review</code>\n"
+            "• <code>pon,śr,pt 18:00 Ćwiczenia</code>\n"
+            "• <code>co miesiąc 1 09:00 Rachunki</code>\n\n"
             "Przykład:\n"
-            "`/cyklicznie pon-pt 09:00 Daily standup`",
-            parse_mode="Markdown"
+            "<code>/cyklicznie pon-pt 09:00 Daily standup</code>",
+            parse_mode="HTML"
         )
         context.user_data['state'] = STATE_IDLE
 
@@ -825,25 +1510,13 @@ async def recurring_list_command(update: Update, context: ContextTypes.DEFAULT_T
     if not await security_check(update): return
     context.user_data['state'] = STATE_IDLE
 
-    reminders = db.get_active_recurring_reminders()
+    reminders = store.recurring.list_active()
 
     if not reminders:
-        await update.message.reply_text("🔄 Brak cyklicznych przypomnień.")
+        await reply(update, "🔄 Brak cyklicznych przypomnień.")
         return
 
-    response = "🔄 **CYKLICZNE PRZYPOMNIENIA**\n\n"
-    for r in reminders:
-        schedule_desc = format_schedule_description(
-            r['schedule_type'],
-            r['schedule_days'],
-            r['schedule_time']
-        )
-        next_run = datetime.datetime.fromisoformat(r['next_run'])
-        next_run_str = next_run.strftime("%d.%m %H:%M")
-        response += f"`{r['id']}`. {r['content']}\n    🗓️ {schedule_desc}\n    ⏭️ {next_run_str}\n\n"
-
-    response += "_Usuń: `/usun-cykl <nr>`_"
-    await update.message.reply_text(response, parse_mode="Markdown")
+    await reply(update, render.recurring_list(reminders), parse_mode="HTML")
 
 async def delete_recurring_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Komenda /usun-cykl - usuwa cykliczne przypomnienie."""
@@ -853,67 +1526,236 @@ async def delete_recurring_command(update: Update, context: ContextTypes.DEFAULT
     if context.args:
         try:
             reminder_id = int(context.args[0])
-            reminder = db.get_recurring_reminder_by_id(reminder_id)
+            reminder = store.recurring.get(reminder_id)
             if reminder:
-                db.delete_recurring_reminder(reminder_id)
-                await update.message.reply_text(
-                    f"🗑️ Usunięto cykliczne przypomnienie #{reminder_id}:\n_{reminder['content']}_",
-                    parse_mode="Markdown"
+                store.recurring.delete(reminder_id)
+                await reply(update, 
+                    f"🗑️ Usunięto cykliczne przypomnienie #{reminder_id}:\n{render.italic(render.clip(reminder.content))}",
+                    parse_mode="HTML"
                 )
             else:
-                await update.message.reply_text(f"❌ Nie znaleziono przypomnienia #{reminder_id}.")
+                await reply(update, f"❌ Nie znaleziono przypomnienia #{reminder_id}.")
         except ValueError:
-            await update.message.reply_text("⚠️ Podaj numer przypomnienia, np. `/usun-cykl 1`", parse_mode="Markdown")
+            await reply(update, "⚠️ Podaj numer przypomnienia, np. <code>/usun-cykl 1</code>", parse_mode="HTML")
     else:
-        await update.message.reply_text("⚠️ Podaj numer przypomnienia, np. `/usun-cykl 1`", parse_mode="Markdown")
-
-async def check_recurring_reminders(context: ContextTypes.DEFAULT_TYPE):
-    """Job sprawdzający i wysyłający cykliczne przypomnienia."""
-    reminders = db.get_due_recurring_reminders()
-    for r in reminders:
-        schedule_desc = format_schedule_description(
-            r['schedule_type'],
-            r['schedule_days'],
-            r['schedule_time']
+        await reply(update, "⚠️ Podaj numer przypomnienia, np. <code>/usun-cykl 1</code>", parse_mode="HTML")
+
+# --- Diagnostyka ---
+
+def format_profile_report(result: profiling.SamplingProfiler) -> str:
+    """Top funkcji bota z profilu: udział w całym czasie i w czasie pracy kodu bota."""
+    total, busy = result.total(), result.busy()
+    rows = ["całość   bot  funkcja"]
+    for label, n in result.top():
+        rows.append(f"{100 * n / total:5.1f}% {100 * n / max(busy, 1):5.1f}%  {label}")
+    return (f"⏱️ <b>Profil:</b> {result.duration:.1f} s, {total} próbek, kod bota w "
+            f"{100 * busy / max(total, 1):.1f}% próbek\n{render.pre(chr(10).join(rows))}")
+
+def format_memory_report(current: int, peak: int, stats: list) -> str:
+    """Linie kodu, które od `/pamiec start` zaalokowały najwięcej."""
+    rows = ["przyrost   bloki  miejsce"]
+    for stat in stats:
+        frame = stat.traceback[0]
+        rows.append(f"{stat.size_diff / 1024:+7.0f} KiB {stat.count_diff:+6d}  "
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}")
+    return (f"🧠 <b>tracemalloc:</b> teraz {current / 2**20:.1f} MiB, szczyt {peak / 2**20:.1f} MiB\n"
+            f"{render.pre(chr(10).join(rows))}")
+
+async def calendar_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /kalendarz - przypomnienia jako plik .ics (do importu albo subskrypcji)."""
+    if not await security_check(update): return
+    body, _ = calendar_feed.get()
+    caption = f"📅 Przypomnienia w kalendarzu: {calendar_feed.events}"
+    if CALENDAR_PORT:
+        caption += f"\nSubskrypcja: http://{CALENDAR_HOST}:{CALENDAR_PORT}{calendar_server.path}"
+    await outbound.send('send_document', update.effective_chat.id,
+                        document=body, filename=icsfeed.FILENAME, caption=caption)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /profil start|stop - próbkujący profiler CPU w działającym procesie."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+    action = context.args[0].lower() if context.args else ""
+
+    if action == 'start':
+        if profiler.running:
+            await reply(update, "⚠️ Profiler już działa. Zakończ: <code>/profil stop</code>", parse_mode="HTML")
+            return
+        profiler.start()
+        await reply(update,
+            f"⏱️ Profiler włączony ({1 / profiler.interval:.0f} próbek/s, "
+            f"sam wyłączy się po {profiler.max_seconds // 60:.0f} min).\nZakończ: <code>/profil stop</code>",
+            parse_mode="HTML"
         )
-        message = f"🔄 **PRZYPOMNIENIE** ({schedule_desc})\n\n{r['content']}"
-        await context.bot.send_message(chat_id=MY_CHAT_ID, text=message, parse_mode="Markdown")
-
-        # Oblicz następny czas uruchomienia
-        next_run = calculate_next_run(
-            r['schedule_type'],
-            r['schedule_days'],
-            r['schedule_time']
+    elif action == 'stop':
+        if not profiler.running and not profiler.samples:
+            await reply(update, "⚠️ Profiler nie działa. Włącz: <code>/profil start</code>", parse_mode="HTML")
+            return
+        profiler.stop()
+        await reply(update, format_profile_report(profiler), parse_mode="HTML")
+        await outbound.send(
+            'send_document', update.effective_chat.id,
+            document=profiler.collapsed().encode('utf-8'),
+            filename=f"profil-{datetime.datetime.now():%Y%m%d-%H%M%S}.folded",
+            caption="Collapsed stacks - flamegraph.pl / speedscope.app",
         )
-        db.update_recurring_reminder_next_run(r['id'], next_run)
+        profiler.samples.clear()
+    else:
+        await reply(update, "⚠️ Użycie: <code>/profil start</code> lub <code>/profil stop</code>", parse_mode="HTML")
+
+async def memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Komenda /pamiec [start|stop] - śledzenie alokacji (tracemalloc)."""
+    if not await security_check(update): return
+    context.user_data['state'] = STATE_IDLE
+    action = context.args[0].lower() if context.args else ""
+
+    if action == 'start':
+        memory_tracker.start()
+        await reply(update, "🧠 Śledzenie pamięci włączone (spowalnia alokacje).\n"
+                            "Raport: <code>/pamiec</code>, wyłączenie: <code>/pamiec stop</code>", parse_mode="HTML")
+    elif not memory_tracker.running:
+        await reply(update, "⚠️ Śledzenie pamięci nie działa. Włącz: <code>/pamiec start</code>", parse_mode="HTML")
+    elif action == 'stop':
+        report = format_memory_report(*memory_tracker.report())
+        memory_tracker.stop()
+        await reply(update, report + "\n🧠 Śledzenie pamięci wyłączone.", parse_mode="HTML")
+    else:
+        await reply(update, format_memory_report(*memory_tracker.report()), parse_mode="HTML")
+
+# --- Role procesów (skalowanie poziome) ---
+
+_leader_lease_lost = False
+
+async def renew_leader_lease(context: ContextTypes.DEFAULT_TYPE):
+    """Job lidera: odnawia dzierżawę; po jej utracie oddaje obsługę aktualizacji."""
+    global _leader_lease_lost
+    if not db.acquire_lease(LEADER_LEASE, WORKER_ID, LEADER_LEASE_TTL):
+        logger.error("Utracono dzierżawę '%s' - przechodzę w tryb workera", LEADER_LEASE)
+        _leader_lease_lost = True
+        context.application.stop_running()
+
+async def finish_shutdown():
+    """Koniec procesu (lider i worker): drenaż kolejki, zwolnienie rezerwacji, checkpoint WAL."""
+    # Joby czeka Application.stop; nadrabianie po starcie nie jest jobem - czekamy tutaj
+    if _catch_up_task is not None:
+        await asyncio.wait([_catch_up_task], timeout=lifecycle.remaining())
+    aborted = await outbound.drain(lifecycle.remaining())
+    if _catch_up_task is not None and not _catch_up_task.done():
+        _catch_up_task.cancel()
+    # Rezerwacje niepotwierdzone do teraz (przerwane albo zarezerwowane przed sygnałem) wracają do puli
+    released = db.release_claims(WORKER_ID)
+    busy, wal_pages, _ = db.checkpoint()
+    logger.info("Zamknięto: drenaż %.2f s, przerwane wiadomości %d, zwolnione rezerwacje %d, WAL %s",
+                lifecycle.elapsed() or 0.0, aborted, released,
+                "zajęty (checkpoint później)" if busy else f"przeniesiony ({wal_pages} stron)")
+
+async def post_shutdown(application: Application):
+    await monitor.stop()
+    await health_server.stop()
+    await calendar_server.stop()
+    await finish_shutdown()
+    # Oddaj rolę lidera od razu, zamiast czekać na wygaśnięcie dzierżawy
+    db.release_lease(LEADER_LEASE, WORKER_ID)
+
+async def run_worker(bot: Bot, until_leader: bool = False) -> bool:
+    """Pętla workera: rozsyła przypomnienia bez obsługi aktualizacji.
+
+    Workery dzielą się należnymi wierszami przez rezerwacje (claim), więc
+    można ich uruchomić N na tej samej bazie. Z `until_leader=True` pętla
+    kończy się, gdy proces przejmie dzierżawę lidera. Zwraca True, gdy
+    skończyła się sygnałem zamknięcia (po drenażu).
+    """
+    lifecycle.install()
+    async with bot:
+        outbound.start(bot)
+        while not lifecycle.requested:
+            logconfig.bind(logconfig.new_correlation_id("worker"))
+            try:
+                await deliver_reminders()
+            except Exception:
+                logger.exception("Błąd w pętli workera %s", WORKER_ID)
+            if until_leader and not lifecycle.requested and \
+                    db.acquire_lease(LEADER_LEASE, WORKER_ID, LEADER_LEASE_TTL):
+                return False
+            await lifecycle.wait(WORKER_POLL_SECONDS)
+        await finish_shutdown()
+    return True
+
+def build_application(request: BaseRequest | None = None) -> Application:
+    """Buduje aplikację z kompletem handlerów (proces-lider).
+
+    `request` podmienia warstwę HTTP bota (replay.py podaje atrapę Bot API).
+    """
+    builder = (ApplicationBuilder().token(TOKEN).application_class(logconfig.TracedApplication)
+               .post_init(post_init).post_shutdown(post_shutdown))
+    if recorder:
+        # Pula jak domyślna w ApplicationBuilder
+        request = recording.RecordingRequest(request or HTTPXRequest(connection_pool_size=256), recorder)
+    if request:
+        builder = builder.request(request)
+    app = builder.build()
+    app.recorder = recorder
+    app.health = monitor
+
+    # Przed wszystkimi handlerami: aktualizacje od obcych kończą się w bramce
+    app.add_handler(TypeHandler(Update, access_gate.handle), group=-1)
+    app.add_handler(CommandHandler('start', start))
+    app.add_handler(CommandHandler('zadanie', add_task_command))
+    app.add_handler(CommandHandler('pomysl', add_idea_command))
+    app.add_handler(CommandHandler('lista', list_command))
+    app.add_handler(CommandHandler('zrobione', done_command))
+    app.add_handler(CommandHandler('usun', delete_command))
+    app.add_handler(CommandHandler('edytuj', edit_command))
+    app.add_handler(CommandHandler('zalezy', depends_command))
+    app.add_handler(CommandHandler('teraz', next_command))
+    app.add_handler(CommandHandler('historia', history_command))
+    app.add_handler(CommandHandler('przejrzyj', review_command))
+    app.add_handler(CommandHandler('zalaczniki', attachments_command))
+    app.add_handler(CommandHandler('przypomnij', remind_command))
+    app.add_handler(CommandHandler('przypomnienia', reminders_list_command))
+    app.add_handler(CommandHandler('cyklicznie', recurring_remind_command))
+    app.add_handler(CommandHandler('cykliczne', recurring_list_command))
+    app.add_handler(CommandHandler('usun_cykl', delete_recurring_command))
+    app.add_handler(CommandHandler('kalendarz', calendar_command))
+    app.add_handler(CommandHandler('cofnij', undo_command))
+    app.add_handler(CommandHandler('kosz', trash_command))
+    app.add_handler(CommandHandler('profil', profile_command))
+    app.add_handler(CommandHandler('pamiec', memory_command))
+
+    # Przyciski inline pod listami
+    app.add_handler(CallbackQueryHandler(handle_callback))
+
+    # Obsługa polskiego /pomysł
+    app.add_handler(MessageHandler(filters.Regex(r'^/pomysł'), add_idea_command))
+    # Obsługa /usun-cykl z myślnikiem
+    app.add_handler(MessageHandler(filters.Regex(r'^/usun-cykl'), delete_recurring_command))
+
+    # Obsługa zwykłego tekstu (odpowiedzi na pytania bota)
+    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_text))
+    app.add_handler(MessageHandler(
+        filters.VOICE | filters.AUDIO | filters.PHOTO | filters.VIDEO | filters.VIDEO_NOTE | filters.Document.ALL,
+        handle_attachment
+    ))
+
+    return app
 
 if __name__ == '__main__':
     if not TOKEN or not MY_CHAT_ID:
         print("BŁĄD: Uzupełnij .env")
+    elif '--worker' in sys.argv:
+        print(f"FocusBot worker {WORKER_ID} rozsyła przypomnienia...")
+        asyncio.run(run_worker(Bot(TOKEN)))
     else:
-        print("FocusBot v7 (z przypomnieniami) nasłuchuje...")
-        app = ApplicationBuilder().token(TOKEN).post_init(post_init).build()
-
-        app.add_handler(CommandHandler('start', start))
-        app.add_handler(CommandHandler('zadanie', add_task_command))
-        app.add_handler(CommandHandler('pomysl', add_idea_command))
-        app.add_handler(CommandHandler('lista', list_command))
-        app.add_handler(CommandHandler('zrobione', done_command))
-        app.add_handler(CommandHandler('usun', delete_command))
-        app.add_handler(CommandHandler('edytuj', edit_command))
-        app.add_handler(CommandHandler('historia', history_command))
-        app.add_handler(CommandHandler('przypomnij', remind_command))
-        app.add_handler(CommandHandler('przypomnienia', reminders_list_command))
-        app.add_handler(CommandHandler('cyklicznie', recurring_remind_command))
-        app.add_handler(CommandHandler('cykliczne', recurring_list_command))
-        app.add_handler(CommandHandler('usun_cykl', delete_recurring_command))
-
-        # Obsługa polskiego /pomysł
-        app.add_handler(MessageHandler(filters.Regex(r'^/pomysł'), add_idea_command))
-        # Obsługa /usun-cykl z myślnikiem
-        app.add_handler(MessageHandler(filters.Regex(r'^/usun-cykl'), delete_recurring_command))
-
-        # Obsługa zwykłego tekstu (odpowiedzi na pytania bota)
-        app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_text))
-
-        app.run_polling()
\ No newline at end of file
+        while True:
+            if not db.acquire_lease(LEADER_LEASE, WORKER_ID, LEADER_LEASE_TTL):
+                print(f"Inny proces obsługuje aktualizacje - {WORKER_ID} działa jako worker.")
+                if asyncio.run(run_worker(Bot(TOKEN), until_leader=True)):
+                    break
+
+            print("FocusBot v7 (z przypomnieniami) nasłuchuje...")
+            _leader_lease_lost = False
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            # Sygnały obsługuje lifecycle (post_init) - z drenażem zamiast natychmiastowego stopu
+            build_application().run_polling(stop_signals=None)
+            if not _leader_lease_lost or lifecycle.requested:
+                break
@@ -1,17 +1,211 @@
+import contextvars
+import json
+import logging
 import sqlite3
-from datetime import datetime
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import models
+import review
+import scoring
+import similarity
 
 DB_NAME = "focus_bot.db"
 
+logger = logging.getLogger(__name__)
+
+# Outbox przypomnień: czas rezerwacji (lease) i backoff po nieudanej wysyłce
+CLAIM_LEASE_SECONDS = 120
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Stan przypomnienia (kolumna reminders.state):
+# PENDING -> (wysłane) NAGGING -> ... -> DONE; z PENDING/NAGGING drzemka -> SNOOZED -> NAGGING
+# is_sent = 1 tylko w stanie DONE, więc indeks (is_sent, remind_at) obejmuje wszystko, co jeszcze wróci.
+REMINDER_PENDING = 0
+REMINDER_NAGGING = 1
+REMINDER_SNOOZED = 2
+REMINDER_DONE = 3
+
+# Ile sekund czekać na blokadę zapisu, gdy bazę dzieli kilka procesów
+BUSY_TIMEOUT_SECONDS = 30
+
+# Dziennik zmian (tabela journal): obrazy wierszy sprzed każdej operacji użytkownika.
+# /cofnij sięga JOURNAL_UNDO_DEPTH ostatnich operacji; starsze wpisy zostają tylko dla
+# usunięć (kosz, JOURNAL_TRASH_DAYS dni), całość najwyżej JOURNAL_MAX_BYTES.
+# Poza dziennikiem zostaje stan, którego użytkownik nie zmienia sam i którego /cofnij nie
+# powinno ruszać: skrót pobranego załącznika (set_attachment_sha256 - wynik pobrania w tle),
+# przesunięcie terminu pokazanych pomysłów (postpone_idea_reviews - harmonogram powtórek),
+# rezerwacje i potwierdzenia wysyłki, dzierżawy workerów, dead letters i przeliczanie wyniku.
+JOURNAL_UNDO_DEPTH = 200
+JOURNAL_TRASH_DAYS = 30
+JOURNAL_MAX_BYTES = 5 * 1024 * 1024
+TRASH_OPS = ('delete_task', 'delete_idea', 'delete_reminder', 'delete_recurring')
+# Klucz główny każdej tabeli, której wiersze trafiają do dziennika
+_JOURNAL_KEYS = {
+    'tasks': ('id',), 'ideas': ('id',), 'reminders': ('id',), 'recurring_reminders': ('id',),
+    'task_closure': ('ancestor', 'descendant'), 'task_dependencies': ('task_id', 'blocked_by'),
+    'attachments': ('id',),
+}
+# Większe obrazy kompresujemy (zlib); mniejsze zostają jako JSON
+_JOURNAL_COMPRESS_BYTES = 256
+
+# Liczniki zmian (tabela change_counters) podbijane przez triggery.
+# CALENDAR_COUNTER: kolumny przypomnień widoczne w kanale iCalendar - rezerwacje
+# i ponowienia wysyłki (claim_token, claimed_until, attempts) go nie zmieniają.
+CALENDAR_COUNTER = 'calendar'
+_CALENDAR_COLUMNS = {
+    'reminders': 'content, remind_at, is_sent',
+    'recurring_reminders': 'content, schedule_type, schedule_days, schedule_time, is_active',
+}
+
+# Projekcje (models.py): pełne wiersze i tylko kolumny potrzebne listom / wysyłce.
+# Wysyłka (deliver_digest) czyta treść, licznik ponowień, harmonogram i attempts - do 'attempts'.
+_TASK = models.columns(models.Task)
+_TASK_LIST = models.columns(models.Task, upto='effort_minutes')
+_IDEA = models.columns(models.Idea)
+_IDEA_LIST = models.columns(models.Idea, upto='category')
+_REMINDER = models.columns(models.Reminder)
+_REMINDER_LIST = models.columns(models.Reminder, upto='priority')
+_REMINDER_CLAIM = models.columns(models.Reminder, upto='attempts')
+_RECURRING = models.columns(models.RecurringReminder)
+_RECURRING_LIST = models.columns(models.RecurringReminder, upto='priority')
+_RECURRING_CLAIM = models.columns(models.RecurringReminder, upto='attempts')
+
+# Słuchacze zmian: fn(table, row_ids) wołane po każdym commicie modyfikującym wiersze
+_change_listeners = []
+
+def add_change_listener(listener):
+    """Rejestruje funkcję wołaną po zmianie wierszy (np. cache write-through)."""
+    _change_listeners.append(listener)
+
+def _notify(table: str, row_ids):
+    for listener in _change_listeners:
+        listener(table, row_ids)
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_SECONDS)
     conn.row_factory = sqlite3.Row  # Pozwala odwoływać się do kolumn po nazwie
+    # Na poziomie DEBUG logujemy każde zapytanie (z identyfikatorem korelacji aktualizacji/joba)
+    if logger.isEnabledFor(logging.DEBUG):
+        conn.set_trace_callback(_log_statement)
     return conn
 
+def _log_statement(statement):
+    logger.debug("SQL: %s", statement)
+
+def _fetch(conn, model, query, params=()) -> list:
+    """Wiersze zapytania jako modele - kolumny w kolejności pól modelu, bez sqlite3.Row."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return models.build(model, cursor.execute(query, params).fetchall())
+
+def _fetch_one(conn, model, query, params=()):
+    rows = _fetch(conn, model, query, params)
+    return rows[0] if rows else None
+
+def _register_scoring(conn):
+    """Udostępnia scoring.task_score w SQL jako task_score(priority, due_at, effort_minutes, now)."""
+    conn.create_function('task_score', 4, scoring.task_score_sql, deterministic=True)
+
+def _index_similarity(c, owner_type, rows):
+    """Zapisuje sygnatury i pasma LSH dla nowych wierszy (id, content) - w transakcji wołającego."""
+    signatures, bands = [], []
+    for row_id, content in rows:
+        sig = similarity.signature(content)
+        signatures.append((owner_type, row_id, similarity.pack(sig)))
+        bands.extend((key, owner_type, row_id) for key in similarity.band_keys(sig))
+    c.executemany('INSERT INTO similarity_signatures (owner_type, owner_id, signature) VALUES (?, ?, ?)',
+                  signatures)
+    c.executemany('INSERT OR IGNORE INTO similarity_bands (band_key, owner_type, owner_id) VALUES (?, ?, ?)',
+                  bands)
+
+def _unindex_similarity(c, owner_type, ids):
+    if not ids:
+        return
+    placeholders = ','.join('?' * len(ids))
+    c.execute(f'DELETE FROM similarity_signatures WHERE owner_type = ? AND owner_id IN ({placeholders})',
+              [owner_type, *ids])
+    c.execute(f'DELETE FROM similarity_bands WHERE owner_type = ? AND owner_id IN ({placeholders})',
+              [owner_type, *ids])
+
+class _ChangeSet:
+    """Obrazy wierszy sprzed jednej operacji - z nich /cofnij odtwarza stan.
+
+    Na tabelę: kolumny, wiersze sprzed zmiany (`capture`) i klucze wierszy
+    utworzonych przez operację (`created`).
+    """
+    __slots__ = ('tables',)
+
+    def __init__(self):
+        self.tables = {}
+
+    def _table(self, table: str) -> dict:
+        return self.tables.setdefault(table, {'columns': None, 'rows': [], 'created': []})
+
+    def capture(self, c, table: str, where: str, params=()) -> list:
+        """Zapisuje wiersze `table` spełniające `where` (przed ich zmianą) i je zwraca."""
+        rows = c.execute(f'SELECT * FROM {table} WHERE {where}', params).fetchall()
+        if rows:
+            entry = self._table(table)
+            entry['columns'] = [column[0] for column in c.description]
+            entry['rows'].extend(tuple(row) for row in rows)
+        return rows
+
+    def created(self, table: str, *key):
+        self._table(table)['created'].append(key)
+        return self
+
+    def content_of(self, table: str, row_id: int) -> str | None:
+        entry = self.tables.get(table)
+        if not entry or not entry['rows']:
+            return None
+        columns = entry['columns']
+        position, content = columns.index('id'), columns.index('content')
+        return next((row[content] for row in entry['rows'] if row[position] == row_id), None)
+
+# Identyfikator partii: operacje z jednego `journal_batch()` cofa jedno /cofnij
+_journal_batch = contextvars.ContextVar('journal_batch', default=None)
+# Narzut dziennika w tym procesie (serializacja + INSERT) - /healthz
+journal_stats = {'writes': 0, 'bytes': 0, 'seconds': 0.0}
+
+@contextmanager
+def journal_batch():
+    """Operacje w bloku to dla /cofnij jedna operacja (np. usunięcie 1,3,5)."""
+    token = _journal_batch.set(uuid.uuid4().hex[:16])
+    try:
+        yield
+    finally:
+        _journal_batch.reset(token)
+
+def _journal(c, op: str, changes: _ChangeSet, summary: str | None = None):
+    """Dopisuje operację do dziennika - w transakcji wołającego."""
+    if not changes.tables:
+        return
+    start = time.perf_counter()
+    payload = json.dumps(changes.tables, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(payload) > _JOURNAL_COMPRESS_BYTES:
+        payload = zlib.compress(payload, 1)
+    c.execute('INSERT INTO journal (op, summary, batch, changes) VALUES (?, ?, ?, ?)',
+              (op, summary, _journal_batch.get(), payload))
+    journal_stats['writes'] += 1
+    journal_stats['bytes'] += len(payload)
+    journal_stats['seconds'] += time.perf_counter() - start
+
+def _load_changes(payload: bytes) -> dict:
+    # JSON zaczyna się od '{', strumień zlib nigdy
+    return json.loads(payload if payload[:1] == b'{' else zlib.decompress(payload))
+
 def init_db():
     """Tworzy tabele, jeśli nie istnieją."""
     conn = get_db_connection()
     c = conn.cursor()
+
+    # WAL: czytelnicy nie blokują pisarzy - wiele procesów workerów na jednej bazie
+    c.execute('PRAGMA journal_mode=WAL')
     
     # Tabela Zadań
     c.execute('''
@@ -36,6 +230,49 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # Kolumna już istnieje
 
+    # Migracja: podzadania - rodzic w tej samej tabeli (lista sąsiedztwa)
+    try:
+        c.execute('ALTER TABLE tasks ADD COLUMN parent_id INTEGER REFERENCES tasks(id)')
+    except sqlite3.OperationalError:
+        pass  # Kolumna już istnieje
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tasks_parent ON tasks (parent_id, is_done)')
+
+    # Migracja: termin, szacowany wysiłek i przeliczany wynik (kolejność "co teraz?")
+    for column in ('due_at TIMESTAMP', 'effort_minutes INTEGER', 'score REAL DEFAULT 0'):
+        try:
+            c.execute(f'ALTER TABLE tasks ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Kolumna już istnieje
+    # Zadania sprzed migracji: wynik z samego priorytetu
+    c.execute('UPDATE tasks SET score = ? * MIN(priority, ?) WHERE score = 0 AND priority > 0',
+              (scoring.PRIORITY_WEIGHT, scoring.MAX_PRIORITY))
+    # id DESC rozstrzyga remisy w tej samej sekundzie (jak MemoryStorage)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_tasks_score ON tasks (is_done, score DESC, created_at DESC, id DESC)')
+
+    # Tabela domknięcia: każda para (przodek, potomek) z odległością, łącznie z (id, id, 0).
+    # Poddrzewo i postęp to jedno zapytanie po indeksie zamiast rekurencji w Pythonie.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS task_closure (
+            ancestor INTEGER NOT NULL,
+            descendant INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor, descendant)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_task_closure_descendant ON task_closure (descendant, depth)')
+    # Zadania sprzed migracji: każde jest korzeniem własnego drzewa
+    c.execute('INSERT OR IGNORE INTO task_closure (ancestor, descendant, depth) SELECT id, id, 0 FROM tasks')
+
+    # Zależności: task_id czeka na blocked_by
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS task_dependencies (
+            task_id INTEGER NOT NULL,
+            blocked_by INTEGER NOT NULL,
+            PRIMARY KEY (task_id, blocked_by)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_task_dependencies_blocker ON task_dependencies (blocked_by)')
+
     # Tabela Pomysłów
     c.execute('''
         CREATE TABLE IF NOT EXISTS ideas (
@@ -52,6 +289,21 @@ def init_db():
     except sqlite3.OperationalError:
         pass  # Kolumna już istnieje
 
+    # Migracja: powroty pomysłów (review.py) - stan SM-2 i termin następnego pokazania
+    for column in ('next_review TIMESTAMP', 'review_reps INTEGER DEFAULT 0', 'review_interval INTEGER DEFAULT 0',
+                   f'review_ease REAL DEFAULT {review.DEFAULT_EASE}', 'archived INTEGER DEFAULT 0'):
+        try:
+            c.execute(f'ALTER TABLE ideas ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Kolumna już istnieje
+    # Pomysły sprzed migracji: pierwszy powrót tydzień po dodaniu (stare są więc od razu do przejrzenia)
+    c.execute(f"""
+        UPDATE ideas SET next_review = datetime(created_at, 'localtime', '+{review.FIRST_INTERVAL_DAYS} days')
+        WHERE next_review IS NULL AND archived = 0
+    """)
+    # Dzienna porcja to początek tego indeksu - bez przeglądania tabeli
+    c.execute('CREATE INDEX IF NOT EXISTS idx_ideas_next_review ON ideas (next_review) WHERE archived = 0')
+
     # Tabela Przypomnień
     c.execute('''
         CREATE TABLE IF NOT EXISTS reminders (
@@ -77,42 +329,213 @@ def init_db():
         )
     ''')
 
+    # Migracja: kolumny outboxa (claim/ack) dla obu tabel przypomnień
+    for table in ('reminders', 'recurring_reminders'):
+        for column in ('claim_token TEXT', 'claimed_until TIMESTAMP', 'attempts INTEGER DEFAULT 0',
+                       'priority INTEGER DEFAULT 0'):
+            try:
+                c.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass  # Kolumna już istnieje
+
+    # Migracja: stan przypomnienia (ponawianie do potwierdzenia, drzemka)
+    for column in ('state INTEGER DEFAULT 0', 'nag_count INTEGER DEFAULT 0'):
+        try:
+            c.execute(f'ALTER TABLE reminders ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Kolumna już istnieje
+    c.execute('UPDATE reminders SET state = ? WHERE is_sent = 1 AND state != ?', (REMINDER_DONE, REMINDER_DONE))
+
+    # Indeksy pod zapytania "co jest do wysłania"
+    c.execute('CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders (is_sent, remind_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_recurring_due ON recurring_reminders (is_active, next_run)')
+
+    # Wiadomości, których nie udało się wysłać (dead-letter kolejki wychodzącej)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            method TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Załączniki: tylko metadane - pliki leżą w magazynie adresowanym treścią (attachments.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner_type TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            file_unique_id TEXT NOT NULL,
+            file_name TEXT,
+            mime_type TEXT,
+            size INTEGER,
+            sha256 TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_attachments_owner ON attachments (owner_type, owner_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_attachments_unique ON attachments (file_unique_id)')
+
+    # Indeks podobieństwa (similarity.py): sygnatura MinHash i klucze pasm LSH każdego wpisu
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS similarity_signatures (
+            owner_type TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            signature BLOB NOT NULL,
+            PRIMARY KEY (owner_type, owner_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS similarity_bands (
+            band_key INTEGER NOT NULL,
+            owner_type TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            PRIMARY KEY (band_key, owner_type, owner_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_similarity_bands_owner ON similarity_bands (owner_type, owner_id)')
+    # Migracja: wpisy sprzed indeksu (jednorazowo - nowe są indeksowane przy zapisie)
+    for owner_type, table in (('task', 'tasks'), ('idea', 'ideas')):
+        missing = c.execute(f'''
+            SELECT id, content FROM {table}
+            WHERE id NOT IN (SELECT owner_id FROM similarity_signatures WHERE owner_type = ?)
+        ''', (owner_type,)).fetchall()
+        _index_similarity(c, owner_type, missing)
+
+    # Liczniki zmian: trigger podbija wersję w tej samej transakcji co zmiana,
+    # więc widzą ją wszystkie procesy i silniki
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    c.execute('INSERT OR IGNORE INTO change_counters (name) VALUES (?)', (CALENDAR_COUNTER,))
+    for table, columns in _CALENDAR_COLUMNS.items():
+        for event in ('INSERT', 'DELETE', f'UPDATE OF {columns}'):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.split()[0].lower()}_calendar
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE change_counters SET version = version + 1 WHERE name = '{CALENDAR_COUNTER}';
+                END
+            ''')
+
+    # Tabela dzierżaw (lease) - wybór lidera między procesami workerów
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+    ''')
+
+    # Heartbeat watchdoga (health.py) - próbny zapis, którego czas mierzymy
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS heartbeats (
+            worker_id TEXT PRIMARY KEY,
+            beat_at TIMESTAMP NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    # Synchronizacja z plikiem tekstowym (textsync.py): stan z ostatniej synchronizacji,
+    # względem którego liczymy zmiany po obu stronach
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_base (
+            kind TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            category TEXT,
+            PRIMARY KEY (kind, row_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Dziennik zmian: jedna operacja użytkownika = jeden wiersz z obrazami wierszy sprzed niej
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            summary TEXT,
+            batch TEXT,
+            changes BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
     conn.commit()
     conn.close()
 
-def add_task(content, priority=0, category=None):
+def add_task(content, priority=0, category=None, parent_id=None, due_at=None, effort_minutes=None):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('INSERT INTO tasks (content, priority, category) VALUES (?, ?, ?)', (content, priority, category))
+    task_id = _insert_task(c, content, priority, category, parent_id, due_at, effort_minutes)
+    _journal(c, 'add_task', _ChangeSet().created('tasks', task_id), content)
     conn.commit()
     conn.close()
+    _notify('tasks', [task_id])
+    return task_id
+
+def _insert_task(c, content, priority=0, category=None, parent_id=None, due_at=None, effort_minutes=None) -> int:
+    score = scoring.task_score(priority, due_at, effort_minutes, datetime.now())
+    c.execute('''
+        INSERT INTO tasks (content, priority, category, parent_id, due_at, effort_minutes, score)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (content, priority, category, parent_id, due_at, effort_minutes, score))
+    task_id = c.lastrowid
+    # Domknięcie: nowe zadanie jest potomkiem wszystkich przodków rodzica (i samego siebie)
+    c.execute('''
+        INSERT INTO task_closure (ancestor, descendant, depth)
+        SELECT ancestor, ?, depth + 1 FROM task_closure WHERE descendant = ?
+        UNION ALL SELECT ?, ?, 0
+    ''', (task_id, parent_id, task_id, task_id))
+    _index_similarity(c, 'task', [(task_id, content)])
+    return task_id
 
 def add_idea(content, category=None):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('INSERT INTO ideas (content, category) VALUES (?, ?)', (content, category))
+    idea_id = _insert_idea(c, content, category)
+    _journal(c, 'add_idea', _ChangeSet().created('ideas', idea_id), content)
     conn.commit()
     conn.close()
+    _notify('ideas', [idea_id])
+    return idea_id
+
+def _insert_idea(c, content, category=None) -> int:
+    c.execute('INSERT INTO ideas (content, category, next_review) VALUES (?, ?, ?)',
+              (content, category, review.first_review(datetime.now())))
+    idea_id = c.lastrowid
+    _index_similarity(c, 'idea', [(idea_id, content)])
+    return idea_id
 
 def get_active_tasks(category=None):
     conn = get_db_connection()
-    # Sortowanie: pilne (priority=1) na górze, potem po dacie
+    # Sortowanie: wynik (priorytet, termin, wysiłek - scoring.py), potem po dacie
+    order = 'ORDER BY score DESC, created_at DESC, id DESC'
     if category:
-        tasks = conn.execute(
-            'SELECT * FROM tasks WHERE is_done = 0 AND category = ? ORDER BY priority DESC, created_at DESC',
-            (category,)
-        ).fetchall()
+        tasks = _fetch(conn, models.Task,
+                       f'SELECT {_TASK_LIST} FROM tasks WHERE is_done = 0 AND category = ? {order}', (category,))
     else:
-        tasks = conn.execute('SELECT * FROM tasks WHERE is_done = 0 ORDER BY priority DESC, created_at DESC').fetchall()
+        tasks = _fetch(conn, models.Task, f'SELECT {_TASK_LIST} FROM tasks WHERE is_done = 0 {order}')
     conn.close()
     return tasks
 
 def get_ideas(category=None):
     conn = get_db_connection()
     if category:
-        ideas = conn.execute('SELECT * FROM ideas WHERE category = ? ORDER BY created_at DESC', (category,)).fetchall()
+        ideas = _fetch(conn, models.Idea, f'''
+            SELECT {_IDEA_LIST} FROM ideas WHERE archived = 0 AND category = ? ORDER BY created_at DESC, id DESC
+        ''', (category,))
     else:
-        ideas = conn.execute('SELECT * FROM ideas ORDER BY created_at DESC').fetchall()
+        ideas = _fetch(conn, models.Idea,
+                       f'SELECT {_IDEA_LIST} FROM ideas WHERE archived = 0 ORDER BY created_at DESC, id DESC')
     conn.close()
     return ideas
 
@@ -129,118 +552,534 @@ def get_all_categories():
     return sorted(categories)
 
 def mark_task_done(task_id):
-    """Oznacza zadanie jako wykonane."""
+    """Oznacza zadanie jako wykonane - razem z całym poddrzewem podzadań."""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('UPDATE tasks SET is_done = 1 WHERE id = ?', (task_id,))
-    rows_affected = c.rowcount
+    changes = _ChangeSet()
+    changed = _complete_task(c, task_id, changes)
+    _journal(c, 'done_task', changes, changes.content_of('tasks', task_id))
     conn.commit()
     conn.close()
-    return rows_affected > 0
+    _notify('tasks', changed)
+    return task_id in changed
+
+def _complete_task(c, task_id, changes: _ChangeSet) -> list:
+    changes.capture(c, 'tasks', 'is_done = 0 AND id IN (SELECT descendant FROM task_closure WHERE ancestor = ?)',
+                    (task_id,))
+    c.execute('''
+        UPDATE tasks SET is_done = 1
+        WHERE id IN (SELECT descendant FROM task_closure WHERE ancestor = ?)
+        RETURNING id
+    ''', (task_id,))
+    return [row['id'] for row in c.fetchall()]
 
 def delete_task(task_id):
-    """Usuwa zadanie z bazy danych."""
+    """Usuwa zadanie z bazy danych - razem z podzadaniami i ich zależnościami."""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-    rows_affected = c.rowcount
+    changes = _ChangeSet()
+    subtree, rows_affected = _delete_task(c, task_id, changes)
+    _journal(c, 'delete_task', changes, changes.content_of('tasks', task_id))
     conn.commit()
     conn.close()
+    _notify('tasks', subtree)
     return rows_affected > 0
 
+def _delete_task(c, task_id, changes: _ChangeSet) -> tuple[list, int]:
+    """(ID poddrzewa, liczba usuniętych wierszy zadań)."""
+    subtree = [row['descendant'] for row in c.execute(
+        'SELECT descendant FROM task_closure WHERE ancestor = ?', (task_id,)
+    ).fetchall()] or [task_id]
+    placeholders = ','.join('?' * len(subtree))
+    changes.capture(c, 'tasks', f'id IN ({placeholders})', subtree)
+    changes.capture(c, 'task_closure', f'descendant IN ({placeholders})', subtree)
+    changes.capture(c, 'task_dependencies', f'task_id IN ({placeholders}) OR blocked_by IN ({placeholders})',
+                    subtree + subtree)
+    changes.capture(c, 'attachments', f"owner_type = 'task' AND owner_id IN ({placeholders})", subtree)
+    c.execute(f'DELETE FROM tasks WHERE id IN ({placeholders})', subtree)
+    rows_affected = c.rowcount
+    c.execute(f'DELETE FROM task_closure WHERE descendant IN ({placeholders})', subtree)
+    c.execute(f'DELETE FROM task_dependencies WHERE task_id IN ({placeholders}) OR blocked_by IN ({placeholders})',
+              subtree + subtree)
+    c.execute(f"DELETE FROM attachments WHERE owner_type = 'task' AND owner_id IN ({placeholders})", subtree)
+    _unindex_similarity(c, 'task', subtree)
+    return subtree, rows_affected
+
 def delete_idea(idea_id):
     """Usuwa pomysł z bazy danych."""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('DELETE FROM ideas WHERE id = ?', (idea_id,))
-    rows_affected = c.rowcount
+    changes = _ChangeSet()
+    rows_affected = _delete_idea(c, idea_id, changes)
+    _journal(c, 'delete_idea', changes, changes.content_of('ideas', idea_id))
     conn.commit()
     conn.close()
+    _notify('ideas', [idea_id])
     return rows_affected > 0
 
-def update_task(task_id, new_content):
-    """Aktualizuje treść zadania."""
+def _delete_idea(c, idea_id, changes: _ChangeSet) -> int:
+    changes.capture(c, 'ideas', 'id = ?', (idea_id,))
+    changes.capture(c, 'attachments', "owner_type = 'idea' AND owner_id = ?", (idea_id,))
+    c.execute('DELETE FROM ideas WHERE id = ?', (idea_id,))
+    rows_affected = c.rowcount
+    c.execute("DELETE FROM attachments WHERE owner_type = 'idea' AND owner_id = ?", (idea_id,))
+    _unindex_similarity(c, 'idea', [idea_id])
+    return rows_affected
+
+def update_task(task_id, new_content, priority=None, due_at=None, effort_minutes=None):
+    """Aktualizuje treść zadania (oraz priorytet/termin/wysiłek, jeśli podane) i przelicza wynik."""
     conn = get_db_connection()
+    _register_scoring(conn)
     c = conn.cursor()
-    c.execute('UPDATE tasks SET content = ? WHERE id = ?', (new_content, task_id))
+    changes = _ChangeSet()
+    changes.capture(c, 'tasks', 'id = ?', (task_id,))
+    c.execute('''
+        UPDATE tasks SET content = ?,
+            priority = COALESCE(?, priority),
+            due_at = COALESCE(?, due_at),
+            effort_minutes = COALESCE(?, effort_minutes)
+        WHERE id = ?
+    ''', (new_content, priority, due_at, effort_minutes, task_id))
     rows_affected = c.rowcount
+    c.execute('UPDATE tasks SET score = task_score(priority, due_at, effort_minutes, ?) WHERE id = ?',
+              (datetime.now(), task_id))
+    if rows_affected:
+        _unindex_similarity(c, 'task', [task_id])
+        _index_similarity(c, 'task', [(task_id, new_content)])
+        _journal(c, 'update_task', changes, changes.content_of('tasks', task_id))
     conn.commit()
     conn.close()
+    _notify('tasks', [task_id])
     return rows_affected > 0
 
 def update_idea(idea_id, new_content):
     """Aktualizuje treść pomysłu."""
     conn = get_db_connection()
     c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'ideas', 'id = ?', (idea_id,))
     c.execute('UPDATE ideas SET content = ? WHERE id = ?', (new_content, idea_id))
     rows_affected = c.rowcount
+    if rows_affected:
+        _unindex_similarity(c, 'idea', [idea_id])
+        _index_similarity(c, 'idea', [(idea_id, new_content)])
+        _journal(c, 'update_idea', changes, changes.content_of('ideas', idea_id))
     conn.commit()
     conn.close()
+    _notify('ideas', [idea_id])
     return rows_affected > 0
 
+def find_similar(owner_type, content, limit=similarity.MAX_SUGGESTIONS):
+    """[(id, podobieństwo)] wpisów podobnych do `content` ('task' - tylko aktywne zadania)."""
+    sig = similarity.signature(content)
+    keys = similarity.band_keys(sig)
+    placeholders = ','.join('?' * len(keys))
+    active = ' AND s.owner_id IN (SELECT id FROM tasks WHERE is_done = 0)' if owner_type == 'task' else ''
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+        SELECT s.owner_id, s.signature FROM similarity_signatures s
+        WHERE s.owner_type = ? AND s.owner_id IN (
+            SELECT owner_id FROM similarity_bands WHERE owner_type = ? AND band_key IN ({placeholders})
+        ){active}
+    ''', [owner_type, owner_type, *keys]).fetchall()
+    conn.close()
+    return similarity.rank(sig, [(row['owner_id'], similarity.unpack(row['signature'])) for row in rows], limit)
+
 def get_completed_tasks(limit=20):
     """Pobiera ukończone zadania (historia)."""
     conn = get_db_connection()
-    tasks = conn.execute(
-        'SELECT * FROM tasks WHERE is_done = 1 ORDER BY created_at DESC LIMIT ?',
+    tasks = _fetch(conn, models.Task,
+        f'SELECT {_TASK_LIST} FROM tasks WHERE is_done = 1 ORDER BY created_at DESC, id DESC LIMIT ?',
         (limit,)
-    ).fetchall()
+    )
     conn.close()
     return tasks
 
 def get_task_by_id(task_id):
     """Pobiera pojedyncze zadanie po ID."""
     conn = get_db_connection()
-    task = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    task = _fetch_one(conn, models.Task, f'SELECT {_TASK} FROM tasks WHERE id = ?', (task_id,))
     conn.close()
     return task
 
 def get_idea_by_id(idea_id):
     """Pobiera pojedynczy pomysł po ID."""
     conn = get_db_connection()
-    idea = conn.execute('SELECT * FROM ideas WHERE id = ?', (idea_id,)).fetchone()
+    idea = _fetch_one(conn, models.Idea, f'SELECT {_IDEA} FROM ideas WHERE id = ?', (idea_id,))
     conn.close()
     return idea
 
+# --- Powroty pomysłów (review.py) ---
+
+def get_ideas_due_for_review(now: datetime, limit: int = review.BATCH_SIZE) -> list:
+    """Pomysły z minionym terminem powrotu, od najdawniej należnego - początek idx_ideas_next_review."""
+    conn = get_db_connection()
+    ideas = _fetch(conn, models.Idea, f'''
+        SELECT {_IDEA} FROM ideas WHERE archived = 0 AND next_review <= ?
+        ORDER BY next_review LIMIT ?
+    ''', (now, limit))
+    conn.close()
+    return ideas
+
+def postpone_idea_reviews(idea_ids: list, until: datetime) -> int:
+    """Przesuwa termin pokazanych pomysłów (czekają na odpowiedź) bez zmiany stanu SM-2.
+
+    Harmonogram, nie operacja użytkownika - poza dziennikiem.
+    """
+    if not idea_ids:
+        return 0
+    placeholders = ','.join('?' * len(idea_ids))
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(f'UPDATE ideas SET next_review = ? WHERE id IN ({placeholders}) AND archived = 0',
+              (until, *idea_ids))
+    rows_affected = c.rowcount
+    conn.commit()
+    conn.close()
+    _notify('ideas', list(idea_ids))
+    return rows_affected
+
+def review_idea(idea_id: int, grade: int, now: datetime) -> datetime | None:
+    """Ocena z przycisku (review.KEEP / review.LATER): nowy stan SM-2; zwraca termin następnego powrotu."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    row = c.execute('SELECT review_reps, review_interval, review_ease FROM ideas WHERE id = ? AND archived = 0',
+                    (idea_id,)).fetchone()
+    if row is None:
+        conn.close()
+        return None
+    reps, interval, ease = review.next_state(row['review_reps'], row['review_interval'], row['review_ease'], grade)
+    next_review = now + timedelta(days=interval)
+    changes = _ChangeSet()
+    changes.capture(c, 'ideas', 'id = ?', (idea_id,))
+    c.execute('''
+        UPDATE ideas SET review_reps = ?, review_interval = ?, review_ease = ?, next_review = ? WHERE id = ?
+    ''', (reps, interval, ease, next_review, idea_id))
+    _journal(c, 'review_idea', changes, changes.content_of('ideas', idea_id))
+    conn.commit()
+    conn.close()
+    _notify('ideas', [idea_id])
+    return next_review
+
+def archive_idea(idea_id: int) -> bool:
+    """Archiwum: pomysł znika z /lista, pliku synchronizacji i powrotów, ale zostaje w bazie (/cofnij)."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'ideas', 'id = ? AND archived = 0', (idea_id,))
+    c.execute('UPDATE ideas SET archived = 1, next_review = NULL WHERE id = ? AND archived = 0', (idea_id,))
+    rows_affected = c.rowcount
+    if rows_affected:
+        _journal(c, 'archive_idea', changes, changes.content_of('ideas', idea_id))
+    conn.commit()
+    conn.close()
+    _notify('ideas', [idea_id])
+    return rows_affected > 0
+
+def promote_idea(idea_id: int) -> int | None:
+    """Pomysł -> zadanie (z tą samą kategorią i załącznikami) w jednej transakcji; zwraca ID zadania."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    idea = c.execute('SELECT content, category FROM ideas WHERE id = ?', (idea_id,)).fetchone()
+    if idea is None:
+        conn.close()
+        return None
+    changes = _ChangeSet()
+    changes.capture(c, 'attachments', "owner_type = 'idea' AND owner_id = ?", (idea_id,))
+    task_id = _insert_task(c, idea['content'], category=idea['category'])
+    c.execute("UPDATE attachments SET owner_type = 'task', owner_id = ? WHERE owner_type = 'idea' AND owner_id = ?",
+              (task_id, idea_id))
+    _delete_idea(c, idea_id, changes)
+    _journal(c, 'promote_idea', changes.created('tasks', task_id), idea['content'])
+    conn.commit()
+    conn.close()
+    _notify('ideas', [idea_id])
+    _notify('tasks', [task_id])
+    return task_id
+
+# --- Podzadania i zależności ---
+
+def get_task_subtree(task_id: int) -> list:
+    """Zadanie i wszyscy jego potomkowie (z kolumną depth względem `task_id`)."""
+    conn = get_db_connection()
+    tasks = _fetch(conn, models.Task, f'''
+        SELECT {models.columns(models.Task, table='t')}, c.depth
+        FROM task_closure c JOIN tasks t ON t.id = c.descendant
+        WHERE c.ancestor = ?
+        ORDER BY c.depth, t.priority DESC, t.created_at DESC, t.id DESC
+    ''', (task_id,))
+    conn.close()
+    return tasks
+
+def get_task_progress(task_ids=None) -> dict:
+    """Postęp podzadań: {id: (wykonane, wszystkie)} dla zadań, które mają potomków."""
+    conn = get_db_connection()
+    query = '''
+        SELECT c.ancestor, SUM(t.is_done) AS done, COUNT(*) AS total
+        FROM task_closure c JOIN tasks t ON t.id = c.descendant
+        WHERE c.depth > 0{}
+        GROUP BY c.ancestor
+    '''
+    if task_ids is None:
+        rows = conn.execute(query.format('')).fetchall()
+    else:
+        task_ids = list(task_ids)
+        placeholders = ','.join('?' * len(task_ids))
+        rows = conn.execute(query.format(f' AND c.ancestor IN ({placeholders})'), task_ids).fetchall()
+    conn.close()
+    return {row['ancestor']: (row['done'], row['total']) for row in rows}
+
+def add_task_dependency(task_id: int, blocked_by: int) -> bool:
+    """`task_id` czeka na `blocked_by`. False, gdy zależność utworzyłaby cykl albo już istnieje."""
+    if task_id == blocked_by:
+        return False
+    conn = get_db_connection()
+    c = conn.cursor()
+    # Cykl: blocked_by już (pośrednio) czeka na task_id
+    cycle = c.execute('''
+        WITH RECURSIVE chain(id) AS (
+            SELECT blocked_by FROM task_dependencies WHERE task_id = ?
+            UNION
+            SELECT d.blocked_by FROM task_dependencies d JOIN chain ON d.task_id = chain.id
+        )
+        SELECT 1 FROM chain WHERE id = ? LIMIT 1
+    ''', (blocked_by, task_id)).fetchone()
+    if cycle:
+        conn.close()
+        return False
+    c.execute('INSERT OR IGNORE INTO task_dependencies (task_id, blocked_by) VALUES (?, ?)', (task_id, blocked_by))
+    added = c.rowcount > 0
+    if added:
+        _journal(c, 'add_dependency', _ChangeSet().created('task_dependencies', task_id, blocked_by),
+                 f"#{task_id} ← #{blocked_by}")
+    conn.commit()
+    conn.close()
+    if added:
+        _notify('task_dependencies', [task_id])
+    return added
+
+def remove_task_dependency(task_id: int, blocked_by: int) -> bool:
+    """Usuwa zależność między zadaniami."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'task_dependencies', 'task_id = ? AND blocked_by = ?', (task_id, blocked_by))
+    c.execute('DELETE FROM task_dependencies WHERE task_id = ? AND blocked_by = ?', (task_id, blocked_by))
+    rows_affected = c.rowcount
+    _journal(c, 'remove_dependency', changes, f"#{task_id} ← #{blocked_by}")
+    conn.commit()
+    conn.close()
+    _notify('task_dependencies', [task_id])
+    return rows_affected > 0
+
+def get_blocked_task_ids() -> set:
+    """ID aktywnych zadań czekających na co najmniej jedno niewykonane zadanie."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT DISTINCT d.task_id FROM task_dependencies d
+        JOIN tasks b ON b.id = d.blocked_by
+        JOIN tasks t ON t.id = d.task_id
+        WHERE b.is_done = 0 AND t.is_done = 0
+    ''').fetchall()
+    conn.close()
+    return {row['task_id'] for row in rows}
+
+def get_unblocked_tasks(category=None, limit=None) -> list:
+    """Następne kroki: aktywne zadania bez otwartych blokad i bez otwartych podzadań.
+
+    Kolejność z indeksu idx_tasks_score - z `limit` SQLite czyta tylko
+    początek indeksu, bez sortowania całej listy.
+    """
+    conn = get_db_connection()
+    query = f'''
+        SELECT {_TASK_LIST} FROM tasks t
+        WHERE t.is_done = 0{{}}
+          AND NOT EXISTS (
+            SELECT 1 FROM task_dependencies d JOIN tasks b ON b.id = d.blocked_by
+            WHERE d.task_id = t.id AND b.is_done = 0)
+          AND NOT EXISTS (
+            SELECT 1 FROM tasks ch WHERE ch.parent_id = t.id AND ch.is_done = 0)
+        ORDER BY t.score DESC, t.created_at DESC, t.id DESC
+        LIMIT ?
+    '''
+    limit = -1 if limit is None else limit
+    if category:
+        tasks = _fetch(conn, models.Task, query.format(' AND t.category = ?'), (category, limit))
+    else:
+        tasks = _fetch(conn, models.Task, query.format(''), (limit,))
+    conn.close()
+    return tasks
+
+def refresh_task_scores(now: datetime | None = None) -> int:
+    """Przelicza wynik aktywnych zadań z terminem (tylko one zależą od czasu).
+
+    Zapisuje wyłącznie wiersze, których wynik się zmienił; zwraca ich liczbę.
+    """
+    now = now or datetime.now()
+    conn = get_db_connection()
+    _register_scoring(conn)
+    c = conn.cursor()
+    c.execute('''
+        UPDATE tasks SET score = task_score(priority, due_at, effort_minutes, :now)
+        WHERE is_done = 0 AND due_at IS NOT NULL
+          AND score != task_score(priority, due_at, effort_minutes, :now)
+        RETURNING id
+    ''', {'now': now})
+    changed = [row['id'] for row in c.fetchall()]
+    conn.commit()
+    conn.close()
+    _notify('tasks', changed)
+    return len(changed)
+
 # --- Przypomnienia ---
 
-def add_reminder(content: str, remind_at: datetime) -> int:
+def add_reminder(content: str, remind_at: datetime, priority: int = 0) -> int:
     """Dodaje przypomnienie i zwraca jego ID."""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('INSERT INTO reminders (content, remind_at) VALUES (?, ?)', (content, remind_at))
+    c.execute('INSERT INTO reminders (content, remind_at, priority) VALUES (?, ?, ?)',
+              (content, remind_at, priority))
     reminder_id = c.lastrowid
+    _journal(c, 'add_reminder', _ChangeSet().created('reminders', reminder_id), content)
     conn.commit()
     conn.close()
+    _notify('reminders', [reminder_id])
     return reminder_id
 
-def get_pending_reminders() -> list:
-    """Pobiera przypomnienia do wysłania (czas minął, jeszcze nie wysłane)."""
-    conn = get_db_connection()
+def new_claim_token(worker_id: str) -> str:
+    """Tworzy unikalny token rezerwacji dla jednego przebiegu workera."""
+    return f"{worker_id}:{uuid.uuid4().hex[:12]}"
+
+def retry_delay(attempts: int) -> timedelta:
+    """Wykładniczy backoff: 30s, 60s, 120s... maks. RETRY_MAX_SECONDS."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** attempts, RETRY_MAX_SECONDS))
+
+def claim_due_reminders(claim_token: str, limit: int = 50,
+                        lease_seconds: int = CLAIM_LEASE_SECONDS,
+                        due_before: datetime | None = None, urgent_only: bool = False) -> list:
+    """Atomowo rezerwuje przypomnienia do wysłania.
+
+    Jedno `UPDATE ... RETURNING` - dwa workery (lub nakładające się przebiegi
+    joba) nigdy nie dostaną tego samego wiersza. Rezerwacja wygasa po
+    `lease_seconds`, więc wiersz porzucony przez padnięty proces wraca do puli.
+    `due_before` pozwala objąć wiersze należne za chwilę (digest), a
+    `urgent_only` - tylko pilne (ciche godziny).
+    """
     now = datetime.now()
-    reminders = conn.execute(
-        'SELECT * FROM reminders WHERE is_sent = 0 AND remind_at <= ? ORDER BY remind_at',
-        (now,)
-    ).fetchall()
+    conn = get_db_connection()
+    reminders = _fetch(conn, models.Reminder, f'''
+        UPDATE reminders SET claim_token = ?, claimed_until = ?
+        WHERE id IN (
+            SELECT id FROM reminders
+            WHERE is_sent = 0 AND remind_at <= ?
+              AND (claimed_until IS NULL OR claimed_until <= ?)
+              AND (? = 0 OR priority > 0)
+            ORDER BY remind_at LIMIT ?
+        )
+        RETURNING {_REMINDER_CLAIM}
+    ''', (claim_token, now + timedelta(seconds=lease_seconds), due_before or now, now,
+          int(urgent_only), limit))
+    conn.commit()
     conn.close()
+    _notify('reminders', [r.id for r in reminders])
     return reminders
 
-def mark_reminder_sent(reminder_id: int) -> bool:
-    """Oznacza przypomnienie jako wysłane."""
+def ack_reminders(reminder_ids: list, claim_token: str, nag_at: datetime) -> list:
+    """Potwierdza wysłanie zarezerwowanych przypomnień - jednym UPDATE.
+
+    Przypomnienie nie znika: przechodzi w stan NAGGING i wróci o `nag_at`,
+    dopóki użytkownik nie kliknie "zrobione" albo "drzemka". Zwraca ID
+    potwierdzonych wierszy - brakujące straciły rezerwację (wygasła, albo
+    w międzyczasie była drzemka/zrobione).
+    """
+    if not reminder_ids:
+        return []
+    placeholders = ','.join('?' * len(reminder_ids))
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+        UPDATE reminders SET state = ?, nag_count = nag_count + 1, remind_at = ?,
+            claim_token = NULL, claimed_until = NULL, attempts = 0
+        WHERE id IN ({placeholders}) AND claim_token = ?
+        RETURNING id
+    ''', (REMINDER_NAGGING, nag_at, *reminder_ids, claim_token)).fetchall()
+    conn.commit()
+    conn.close()
+    acked = [row['id'] for row in rows]
+    _notify('reminders', acked)
+    return acked
+
+def snooze_reminder(reminder_id: int, until: datetime) -> bool:
+    """Drzemka: przesuwa termin (ten sam wiersz) i unieważnia trwającą rezerwację."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'reminders', 'id = ? AND is_sent = 0', (reminder_id,))
+    c.execute('''
+        UPDATE reminders SET state = ?, remind_at = ?, claim_token = NULL, claimed_until = NULL, attempts = 0
+        WHERE id = ? AND is_sent = 0
+    ''', (REMINDER_SNOOZED, until, reminder_id))
+    rows_affected = c.rowcount
+    _journal(c, 'snooze_reminder', changes, changes.content_of('reminders', reminder_id))
+    conn.commit()
+    conn.close()
+    _notify('reminders', [reminder_id])
+    return rows_affected > 0
+
+def complete_reminder(reminder_id: int) -> bool:
+    """Użytkownik potwierdził przypomnienie - koniec ponawiania."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'reminders', 'id = ? AND is_sent = 0', (reminder_id,))
+    c.execute('''
+        UPDATE reminders SET state = ?, is_sent = 1, claim_token = NULL, claimed_until = NULL
+        WHERE id = ? AND is_sent = 0
+    ''', (REMINDER_DONE, reminder_id))
+    rows_affected = c.rowcount
+    _journal(c, 'complete_reminder', changes, changes.content_of('reminders', reminder_id))
+    conn.commit()
+    conn.close()
+    _notify('reminders', [reminder_id])
+    return rows_affected > 0
+
+def release_reminder(reminder_id: int, claim_token: str, attempts: int) -> bool:
+    """Zwalnia rezerwację po nieudanej wysyłce - ponowna próba po backoffie."""
+    return _release_claim('reminders', reminder_id, claim_token, attempts)
+
+def _release_claim(table: str, row_id: int, claim_token: str, attempts: int) -> bool:
+    retry_at = datetime.now() + retry_delay(attempts)
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('UPDATE reminders SET is_sent = 1 WHERE id = ?', (reminder_id,))
+    c.execute(f'''
+        UPDATE {table} SET claim_token = NULL, claimed_until = ?, attempts = attempts + 1
+        WHERE id = ? AND claim_token = ?
+    ''', (retry_at, row_id, claim_token))
     rows_affected = c.rowcount
     conn.commit()
     conn.close()
+    _notify(table, [row_id])
     return rows_affected > 0
 
+def get_change_counter(name: str) -> int:
+    """Bieżąca wersja licznika zmian (np. CALENDAR_COUNTER) - jeden odczyt po kluczu głównym."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT version FROM change_counters WHERE name = ?', (name,)).fetchone()
+    conn.close()
+    return row['version'] if row else 0
+
+def get_reminder_by_id(reminder_id: int):
+    """Pobiera przypomnienie po ID."""
+    conn = get_db_connection()
+    reminder = _fetch_one(conn, models.Reminder, f'SELECT {_REMINDER} FROM reminders WHERE id = ?', (reminder_id,))
+    conn.close()
+    return reminder
+
 def get_active_reminders() -> list:
-    """Pobiera aktywne (niewysłane) przypomnienia."""
+    """Pobiera aktywne (niepotwierdzone) przypomnienia - także drzemiące i ponawiane."""
     conn = get_db_connection()
-    reminders = conn.execute(
-        'SELECT * FROM reminders WHERE is_sent = 0 ORDER BY remind_at'
-    ).fetchall()
+    reminders = _fetch(conn, models.Reminder,
+        f'SELECT {_REMINDER_LIST} FROM reminders WHERE is_sent = 0 ORDER BY remind_at'
+    )
     conn.close()
     return reminders
 
@@ -248,77 +1087,567 @@ def delete_reminder(reminder_id: int) -> bool:
     """Usuwa przypomnienie."""
     conn = get_db_connection()
     c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'reminders', 'id = ?', (reminder_id,))
     c.execute('DELETE FROM reminders WHERE id = ?', (reminder_id,))
     rows_affected = c.rowcount
+    _journal(c, 'delete_reminder', changes, changes.content_of('reminders', reminder_id))
     conn.commit()
     conn.close()
+    _notify('reminders', [reminder_id])
     return rows_affected > 0
 
 # --- Cykliczne Przypomnienia ---
 
 def add_recurring_reminder(content: str, schedule_type: str, schedule_days: str | None,
-                           schedule_time: str, next_run: datetime) -> int:
+                           schedule_time: str, next_run: datetime, priority: int = 0) -> int:
     """Dodaje cykliczne przypomnienie i zwraca jego ID."""
     conn = get_db_connection()
     c = conn.cursor()
     c.execute('''
-        INSERT INTO recurring_reminders (content, schedule_type, schedule_days, schedule_time, next_run)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (content, schedule_type, schedule_days, schedule_time, next_run))
+        INSERT INTO recurring_reminders (content, schedule_type, schedule_days, schedule_time, next_run, priority)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (content, schedule_type, schedule_days, schedule_time, next_run, priority))
     reminder_id = c.lastrowid
+    _journal(c, 'add_recurring', _ChangeSet().created('recurring_reminders', reminder_id), content)
     conn.commit()
     conn.close()
+    _notify('recurring_reminders', [reminder_id])
     return reminder_id
 
 def get_active_recurring_reminders() -> list:
     """Pobiera aktywne cykliczne przypomnienia."""
     conn = get_db_connection()
-    reminders = conn.execute(
-        'SELECT * FROM recurring_reminders WHERE is_active = 1 ORDER BY next_run'
-    ).fetchall()
+    reminders = _fetch(conn, models.RecurringReminder,
+        f'SELECT {_RECURRING_LIST} FROM recurring_reminders WHERE is_active = 1 ORDER BY next_run'
+    )
     conn.close()
     return reminders
 
-def get_due_recurring_reminders() -> list:
-    """Pobiera cykliczne przypomnienia do wysłania (czas next_run minął)."""
-    conn = get_db_connection()
+def claim_due_recurring_reminders(claim_token: str, limit: int = 50,
+                                  lease_seconds: int = CLAIM_LEASE_SECONDS,
+                                  due_before: datetime | None = None, urgent_only: bool = False) -> list:
+    """Atomowo rezerwuje cykliczne przypomnienia do wysłania (jak claim_due_reminders)."""
     now = datetime.now()
-    reminders = conn.execute(
-        'SELECT * FROM recurring_reminders WHERE is_active = 1 AND next_run <= ? ORDER BY next_run',
-        (now,)
-    ).fetchall()
+    conn = get_db_connection()
+    reminders = _fetch(conn, models.RecurringReminder, f'''
+        UPDATE recurring_reminders SET claim_token = ?, claimed_until = ?
+        WHERE id IN (
+            SELECT id FROM recurring_reminders
+            WHERE is_active = 1 AND next_run <= ?
+              AND (claimed_until IS NULL OR claimed_until <= ?)
+              AND (? = 0 OR priority > 0)
+            ORDER BY next_run LIMIT ?
+        )
+        RETURNING {_RECURRING_CLAIM}
+    ''', (claim_token, now + timedelta(seconds=lease_seconds), due_before or now, now,
+          int(urgent_only), limit))
+    conn.commit()
     conn.close()
+    _notify('recurring_reminders', [r.id for r in reminders])
     return reminders
 
-def update_recurring_reminder_next_run(reminder_id: int, next_run: datetime) -> bool:
-    """Aktualizuje next_run dla cyklicznego przypomnienia."""
+def ack_recurring_reminder(reminder_id: int, claim_token: str, next_run: datetime) -> bool:
+    """Potwierdza wysłanie i w tej samej operacji przesuwa next_run."""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute('UPDATE recurring_reminders SET next_run = ? WHERE id = ?', (next_run, reminder_id))
+    c.execute('''
+        UPDATE recurring_reminders
+        SET next_run = ?, claim_token = NULL, claimed_until = NULL, attempts = 0
+        WHERE id = ? AND claim_token = ?
+    ''', (next_run, reminder_id, claim_token))
     rows_affected = c.rowcount
     conn.commit()
     conn.close()
+    _notify('recurring_reminders', [reminder_id])
     return rows_affected > 0
 
+def release_recurring_reminder(reminder_id: int, claim_token: str, attempts: int) -> bool:
+    """Zwalnia rezerwację cyklicznego przypomnienia po nieudanej wysyłce."""
+    return _release_claim('recurring_reminders', reminder_id, claim_token, attempts)
+
+def release_claims(worker_id: str) -> int:
+    """Zwalnia od razu wszystkie rezerwacje workera (zamknięcie procesu); zwraca ich liczbę.
+
+    Bez backoffu i bez zwiększania `attempts` - przypomnienie nie zawiodło,
+    tylko proces się kończy. Następny przebieg (dowolnego procesu) je wyśle.
+    """
+    prefix = f"{worker_id}:"
+    conn = get_db_connection()
+    released = {}
+    for table in ('reminders', 'recurring_reminders'):
+        rows = conn.execute(f'''
+            UPDATE {table} SET claim_token = NULL, claimed_until = NULL
+            WHERE substr(claim_token, 1, ?) = ?
+            RETURNING id
+        ''', (len(prefix), prefix)).fetchall()
+        released[table] = [row['id'] for row in rows]
+    conn.commit()
+    conn.close()
+    for table, ids in released.items():
+        if ids:
+            _notify(table, ids)
+    return sum(len(ids) for ids in released.values())
+
 def delete_recurring_reminder(reminder_id: int) -> bool:
     """Usuwa cykliczne przypomnienie."""
     conn = get_db_connection()
     c = conn.cursor()
+    changes = _ChangeSet()
+    changes.capture(c, 'recurring_reminders', 'id = ?', (reminder_id,))
     c.execute('DELETE FROM recurring_reminders WHERE id = ?', (reminder_id,))
     rows_affected = c.rowcount
+    _journal(c, 'delete_recurring', changes, changes.content_of('recurring_reminders', reminder_id))
     conn.commit()
     conn.close()
+    _notify('recurring_reminders', [reminder_id])
     return rows_affected > 0
 
 def get_recurring_reminder_by_id(reminder_id: int):
     """Pobiera cykliczne przypomnienie po ID."""
     conn = get_db_connection()
-    reminder = conn.execute(
-        'SELECT * FROM recurring_reminders WHERE id = ?', (reminder_id,)
-    ).fetchone()
+    reminder = _fetch_one(conn, models.RecurringReminder,
+        f'SELECT {_RECURRING} FROM recurring_reminders WHERE id = ?', (reminder_id,)
+    )
     conn.close()
     return reminder
 
+def get_rows(table: str, row_ids=None) -> list:
+    """Pobiera surowe wiersze tabeli (wszystkie lub o podanych ID) - do ładowania cache."""
+    conn = get_db_connection()
+    if row_ids is None:
+        rows = conn.execute(f'SELECT * FROM {table}').fetchall()
+    else:
+        row_ids = list(row_ids)
+        placeholders = ','.join('?' * len(row_ids))
+        rows = conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', row_ids).fetchall()
+    conn.close()
+    return rows
+
+# --- Załączniki ---
+
+def add_attachment(owner_type: str, owner_id: int, kind: str, file_id: str, file_unique_id: str,
+                   file_name: str | None, mime_type: str | None, size: int | None) -> int:
+    """Zapisuje metadane załącznika do zadania ('task') lub pomysłu ('idea')."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO attachments (owner_type, owner_id, kind, file_id, file_unique_id, file_name, mime_type, size)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (owner_type, owner_id, kind, file_id, file_unique_id, file_name, mime_type, size))
+    attachment_id = c.lastrowid
+    _journal(c, 'add_attachment', _ChangeSet().created('attachments', attachment_id), file_name or kind)
+    conn.commit()
+    conn.close()
+    return attachment_id
+
+def get_attachment(attachment_id: int):
+    """Pobiera załącznik po ID."""
+    conn = get_db_connection()
+    attachment = conn.execute('SELECT * FROM attachments WHERE id = ?', (attachment_id,)).fetchone()
+    conn.close()
+    return attachment
+
+def get_attachments(owner_type: str, owner_id: int) -> list:
+    """Załączniki jednego zadania/pomysłu, od najstarszego."""
+    conn = get_db_connection()
+    attachments = conn.execute(
+        'SELECT * FROM attachments WHERE owner_type = ? AND owner_id = ? ORDER BY id',
+        (owner_type, owner_id)
+    ).fetchall()
+    conn.close()
+    return attachments
+
+def count_attachments(owner_type: str, owner_ids) -> dict:
+    """{owner_id: liczba załączników} - do oznaczenia 📎 na liście."""
+    owner_ids = list(owner_ids)
+    if not owner_ids:
+        return {}
+    placeholders = ','.join('?' * len(owner_ids))
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+        SELECT owner_id, COUNT(*) AS n FROM attachments
+        WHERE owner_type = ? AND owner_id IN ({placeholders})
+        GROUP BY owner_id
+    ''', (owner_type, *owner_ids)).fetchall()
+    conn.close()
+    return {row['owner_id']: row['n'] for row in rows}
+
+def set_attachment_sha256(attachment_id: int, sha256: str) -> bool:
+    """Zapisuje skrót pobranej treści (nazwę pliku w magazynie) - stan pochodny, poza dziennikiem."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('UPDATE attachments SET sha256 = ? WHERE id = ?', (sha256, attachment_id))
+    rows_affected = c.rowcount
+    conn.commit()
+    conn.close()
+    return rows_affected > 0
+
+def find_attachment_sha256(file_unique_id: str) -> str | None:
+    """Skrót już pobranego pliku o tym samym file_unique_id (deduplikacja przed pobraniem)."""
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT sha256 FROM attachments WHERE file_unique_id = ? AND sha256 IS NOT NULL LIMIT 1',
+        (file_unique_id,)
+    ).fetchone()
+    conn.close()
+    return row['sha256'] if row else None
+
+# --- Dead letters (nieudane wysyłki) ---
+
+def add_dead_letter(chat_id: str, method: str, payload: str, error: str, attempts: int) -> int:
+    """Zapisuje wywołanie Bot API, którego nie udało się wykonać."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(
+        'INSERT INTO dead_letters (chat_id, method, payload, error, attempts) VALUES (?, ?, ?, ?, ?)',
+        (chat_id, method, payload, error, attempts)
+    )
+    letter_id = c.lastrowid
+    conn.commit()
+    conn.close()
+    return letter_id
+
+def get_dead_letters(limit: int = 20) -> list:
+    """Pobiera ostatnie nieudane wysyłki."""
+    conn = get_db_connection()
+    letters = conn.execute('SELECT * FROM dead_letters ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+    conn.close()
+    return letters
+
+# --- Dzierżawy (wybór lidera) ---
+
+def acquire_lease(name: str, holder: str, ttl_seconds: int) -> bool:
+    """Przejmuje lub odnawia dzierżawę `name` dla `holder`.
+
+    Udaje się, gdy dzierżawa nie istnieje, wygasła albo już należy do `holder`.
+    Jedno INSERT ... ON CONFLICT - atomowe między procesami.
+    """
+    now = datetime.now()
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+    ''', (name, holder, now + timedelta(seconds=ttl_seconds), now))
+    rows_affected = c.rowcount
+    conn.commit()
+    conn.close()
+    return rows_affected > 0
+
+def release_lease(name: str, holder: str) -> bool:
+    """Oddaje dzierżawę (np. przy zamknięciu procesu), by inny mógł ją przejąć od razu."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+    rows_affected = c.rowcount
+    conn.commit()
+    conn.close()
+    return rows_affected > 0
+
+def checkpoint() -> tuple:
+    """Przenosi WAL do pliku bazy i go skraca (zamknięcie procesu).
+
+    Zwraca (busy, strony w WAL, przeniesione strony); busy=1, gdy inny
+    proces akurat czyta - WAL zostaje do następnego checkpointu.
+    """
+    conn = get_db_connection()
+    result = tuple(conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone())
+    conn.close()
+    return result
+
+# --- Dziennik zmian: cofanie i kosz ---
+
+def _revert(c, changes: dict, touched: dict):
+    """Odtwarza stan sprzed operacji: zapisane wiersze wracają, utworzone znikają."""
+    for table, entry in changes.items():
+        keys = _JOURNAL_KEYS[table]
+        if entry['rows']:
+            columns = entry['columns']
+            # Od końca: wiersz zapisany w operacji dwa razy wraca do pierwszego (najstarszego) obrazu
+            c.executemany(f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) '
+                          f'VALUES ({", ".join("?" * len(columns))})', reversed(entry['rows']))
+            position = columns.index(keys[0])
+            touched.setdefault(table, set()).update(row[position] for row in entry['rows'])
+        if entry['created']:
+            c.executemany(f'DELETE FROM {table} WHERE {" AND ".join(f"{key} = ?" for key in keys)}',
+                          entry['created'])
+            touched.setdefault(table, set()).update(key[0] for key in entry['created'])
+
+def _repair_after_revert(c, touched: dict):
+    """Dane pochodne odtworzonych wierszy: indeks podobieństwa, sieroty po cofniętym dodaniu."""
+    for owner_type, table in (('task', 'tasks'), ('idea', 'ideas')):
+        ids = sorted(touched.get(table, ()))
+        if not ids:
+            continue
+        placeholders = ','.join('?' * len(ids))
+        present = c.execute(f'SELECT id, content FROM {table} WHERE id IN ({placeholders})', ids).fetchall()
+        _unindex_similarity(c, owner_type, ids)
+        _index_similarity(c, owner_type, [(row['id'], row['content']) for row in present])
+        gone = sorted(set(ids) - {row['id'] for row in present})
+        if not gone:
+            continue
+        placeholders = ','.join('?' * len(gone))
+        if owner_type == 'task':
+            c.execute(f'DELETE FROM task_closure WHERE descendant IN ({placeholders})', gone)
+            c.execute(f'DELETE FROM task_dependencies WHERE task_id IN ({placeholders}) '
+                      f'OR blocked_by IN ({placeholders})', gone + gone)
+        c.execute(f'DELETE FROM attachments WHERE owner_type = ? AND owner_id IN ({placeholders})',
+                  [owner_type, *gone])
+
+def _revert_entries(c, entries) -> dict:
+    """Cofa wpisy (od najnowszego) i usuwa je z dziennika; zwraca zmienione ID per tabela."""
+    touched = {}
+    for row in entries:
+        _revert(c, _load_changes(row['changes']), touched)
+    c.executemany('DELETE FROM journal WHERE id = ?', [(row['id'],) for row in entries])
+    _repair_after_revert(c, touched)
+    return touched
+
+def _notify_reverted(touched: dict):
+    for table in ('tasks', 'ideas', 'reminders', 'recurring_reminders', 'task_dependencies'):
+        if touched.get(table):
+            _notify(table, sorted(touched[table]))
+
+def undo_last(count: int = 1) -> list:
+    """Cofa `count` ostatnich operacji - partia z `journal_batch()` to jedna operacja.
+
+    Zwraca cofnięte wpisy (models.JournalEntry) od najnowszego.
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    groups = [row[0] for row in c.execute('''
+        SELECT COALESCE(batch, id) AS grp FROM journal GROUP BY grp ORDER BY MAX(id) DESC LIMIT ?
+    ''', (count,)).fetchall()]
+    if not groups:
+        conn.close()
+        return []
+    placeholders = ','.join('?' * len(groups))
+    entries = c.execute(f'''
+        SELECT id, op, summary, created_at, changes FROM journal
+        WHERE COALESCE(batch, id) IN ({placeholders}) ORDER BY id DESC
+    ''', groups).fetchall()
+    touched = _revert_entries(c, entries)
+    conn.commit()
+    conn.close()
+    _notify_reverted(touched)
+    return [models.JournalEntry(row['id'], row['op'], row['summary'], row['created_at']) for row in entries]
+
+def _trash_entry(row) -> models.JournalEntry:
+    changes = _load_changes(row['changes'])
+    items = []
+    for table in ('tasks', 'ideas', 'reminders', 'recurring_reminders'):
+        entry = changes.get(table)
+        if entry and entry['rows']:
+            position, content = entry['columns'].index('id'), entry['columns'].index('content')
+            items.extend((table, r[position], r[content]) for r in entry['rows'])
+    return models.JournalEntry(row['id'], row['op'], row['summary'], row['created_at'], items)
+
+def get_trash(limit: int = 20) -> list:
+    """Ostatnie usunięcia (models.JournalEntry z usuniętymi wierszami w `items`), od najnowszego."""
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+        SELECT id, op, summary, created_at, changes FROM journal
+        WHERE op IN ({','.join('?' * len(TRASH_OPS))}) ORDER BY id DESC LIMIT ?
+    ''', (*TRASH_OPS, limit)).fetchall()
+    conn.close()
+    return [_trash_entry(row) for row in rows]
+
+def restore_deleted(entry_id: int):
+    """Przywraca jedno usunięcie z kosza, poza kolejnością /cofnij; None, gdy wpisu nie ma.
+
+    Bezpieczne dla każdego usunięcia: ID są AUTOINCREMENT, więc żaden nowy
+    wiersz nie zajął miejsca usuniętych.
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    row = c.execute(f'''
+        SELECT id, op, summary, created_at, changes FROM journal
+        WHERE id = ? AND op IN ({','.join('?' * len(TRASH_OPS))})
+    ''', (entry_id, *TRASH_OPS)).fetchone()
+    if row is None:
+        conn.close()
+        return None
+    entry = _trash_entry(row)
+    touched = _revert_entries(c, [row])
+    conn.commit()
+    conn.close()
+    _notify_reverted(touched)
+    return entry
+
+def compact_journal(undo_depth: int = JOURNAL_UNDO_DEPTH, trash_days: int = JOURNAL_TRASH_DAYS,
+                    max_bytes: int = JOURNAL_MAX_BYTES) -> int:
+    """Przycina dziennik; zwraca liczbę usuniętych wpisów.
+
+    Poza `undo_depth` najnowszymi operacjami zostają tylko usunięcia (kosz) -
+    cofnięcie usunięcia nie zależy od późniejszych wpisów. Potem wiek
+    (`trash_days`) i rozmiar (`max_bytes`, od najstarszych).
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(f'''
+        DELETE FROM journal WHERE op NOT IN ({','.join('?' * len(TRASH_OPS))})
+          AND id < (SELECT MIN(id) FROM (SELECT id FROM journal ORDER BY id DESC LIMIT ?))
+    ''', (*TRASH_OPS, undo_depth))
+    removed = c.rowcount
+    c.execute("DELETE FROM journal WHERE created_at < datetime('now', ?)", (f'-{trash_days} days',))
+    removed += c.rowcount
+    c.execute('''
+        DELETE FROM journal WHERE id IN (
+            SELECT id FROM (SELECT id, SUM(LENGTH(changes)) OVER (ORDER BY id DESC) AS total FROM journal)
+            WHERE total > ?
+        )
+    ''', (max_bytes,))
+    removed += c.rowcount
+    conn.commit()
+    conn.close()
+    return removed
+
+def get_journal_stats() -> dict:
+    """Rozmiar dziennika i narzut zapisów do niego w tym procesie (/healthz)."""
+    conn = get_db_connection()
+    entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(changes)), 0) FROM journal').fetchone()
+    conn.close()
+    writes = journal_stats['writes']
+    return {
+        'entries': entries,
+        'bytes': size,
+        'writes': writes,
+        'write_us_avg': round(journal_stats['seconds'] / writes * 1e6, 1) if writes else None,
+        'entry_bytes_avg': round(journal_stats['bytes'] / writes) if writes else None,
+    }
+
+# --- Synchronizacja z plikiem tekstowym ---
+
+_SYNC_TABLES = {'task': 'tasks', 'idea': 'ideas'}
+
+def get_sync_base() -> dict:
+    """{(kind, row_id): (content, priority, category)} z ostatniej synchronizacji."""
+    conn = get_db_connection()
+    rows = conn.execute('SELECT kind, row_id, content, priority, category FROM sync_base').fetchall()
+    conn.close()
+    return {(row['kind'], row['row_id']): (row['content'], row['priority'], row['category']) for row in rows}
+
+def get_sync_values(keys) -> dict:
+    """{(kind, row_id): (content, priority, category) albo None, gdy wiersza nie ma, zadanie jest wykonane
+    albo pomysł zarchiwizowany}."""
+    keys = list(keys)
+    values = dict.fromkeys(keys)
+    conn = get_db_connection()
+    for kind, table in _SYNC_TABLES.items():
+        ids = [row_id for key_kind, row_id in keys if key_kind == kind]
+        columns = 'id, content, priority, category, is_done' if kind == 'task' else 'id, content, 0, category, archived'
+        # Partiami - limit parametrów SQLite
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row_id, content, priority, category, is_done in conn.execute(
+                    f'SELECT {columns} FROM {table} WHERE id IN ({placeholders})', chunk).fetchall():
+                if not is_done:
+                    values[(kind, row_id)] = (content, priority, category)
+    conn.close()
+    return values
+
+def get_sync_keys() -> list:
+    """Klucze (kind, row_id) wszystkich aktywnych zadań i pomysłów."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT 'task', id FROM tasks WHERE is_done = 0
+        UNION ALL SELECT 'idea', id FROM ideas WHERE archived = 0
+    ''').fetchall()
+    conn.close()
+    return [tuple(row) for row in rows]
+
+def apply_sync_changes(changes: list) -> list:
+    """Zmiany z pliku w jednej transakcji, razem z nowym stanem bazowym synchronizacji.
+
+    `changes`: krotki (op, kind, row_id, content, priority, category), op to
+    'add' (row_id = None), 'update', 'done' albo 'delete'. Zwraca ID nowych
+    wierszy w kolejności operacji 'add'.
+    """
+    conn = get_db_connection()
+    _register_scoring(conn)
+    c = conn.cursor()
+    now = datetime.now()
+    added, changed = [], {'tasks': [], 'ideas': []}
+    base_upserts, base_deletes = [], []
+    journal = _ChangeSet()
+    for op, kind, row_id, content, priority, category in changes:
+        table = _SYNC_TABLES[kind]
+        if op == 'add':
+            row_id = (_insert_task(c, content, priority, category) if kind == 'task'
+                      else _insert_idea(c, content, category))
+            added.append(row_id)
+            journal.created(table, row_id)
+            changed[table].append(row_id)
+            base_upserts.append((kind, row_id, content, priority, category))
+        elif op == 'update':
+            journal.capture(c, table, 'id = ?', (row_id,))
+            if kind == 'task':
+                c.execute('''
+                    UPDATE tasks SET content = ?, priority = ?, category = ?,
+                        score = task_score(?, due_at, effort_minutes, ?)
+                    WHERE id = ?
+                ''', (content, priority, category, priority, now, row_id))
+            else:
+                c.execute('UPDATE ideas SET content = ?, category = ? WHERE id = ?', (content, category, row_id))
+            if c.rowcount:
+                _unindex_similarity(c, kind, [row_id])
+                _index_similarity(c, kind, [(row_id, content)])
+                base_upserts.append((kind, row_id, content, priority, category))
+            changed[table].append(row_id)
+        else:
+            if op == 'done' and kind == 'task':
+                ids = _complete_task(c, row_id, journal)
+            elif kind == 'task':
+                ids = _delete_task(c, row_id, journal)[0]
+            else:
+                _delete_idea(c, row_id, journal)
+                ids = [row_id]
+            changed[table].extend(ids)
+            base_deletes.extend((kind, i) for i in ids)
+    c.executemany('''
+        INSERT INTO sync_base (kind, row_id, content, priority, category) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (kind, row_id) DO UPDATE SET
+            content = excluded.content, priority = excluded.priority, category = excluded.category
+    ''', base_upserts)
+    c.executemany('DELETE FROM sync_base WHERE kind = ? AND row_id = ?', base_deletes)
+    _journal(c, 'sync', journal, f"{len(changes)} zmian z pliku")
+    conn.commit()
+    conn.close()
+    for table, ids in changed.items():
+        if ids:
+            _notify(table, ids)
+    return added
+
+def save_sync_base(values: dict):
+    """Zapisuje stan bazowy dla kluczy po zapisie pliku; wartość None usuwa klucz."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.executemany('''
+        INSERT INTO sync_base (kind, row_id, content, priority, category) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (kind, row_id) DO UPDATE SET
+            content = excluded.content, priority = excluded.priority, category = excluded.category
+    ''', [(*key, *value) for key, value in values.items() if value is not None])
+    c.executemany('DELETE FROM sync_base WHERE kind = ? AND row_id = ?',
+                  [key for key, value in values.items() if value is None])
+    conn.commit()
+    conn.close()
+
+def write_heartbeat(worker_id: str) -> bool:
+    """Zapisuje, że proces żyje - mała transakcja zapisu, której czas mierzy watchdog."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO heartbeats (worker_id, beat_at) VALUES (?, ?)
+        ON CONFLICT (worker_id) DO UPDATE SET beat_at = excluded.beat_at
+    ''', (worker_id, datetime.now()))
+    rows_affected = c.rowcount
+    conn.commit()
+    conn.close()
+    return rows_affected > 0
+
 # Inicjalizacja przy imporcie (bezpieczne, jeśli plik jest zaimportowany)
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,292 @@
+"""Parser polskich wyrażeń czasu dla przypomnień.
+
+Rozumie m.in.:
+- '15:00 Zadzwonić', 'o 14 Spotkanie', 'rano Leki'
+- 'za 30m ...', 'za 1h30m ...', 'za 2 godziny ...', 'za tydzień ...'
+- 'jutro 9:00 ...', 'pojutrze o 8 ...', 'w piątek o 14 ...', '15.11 10:00 ...'
+- 'codziennie o 7 ...', 'co piątek 16:00 ...', 'w każdy wtorek o 9 ...'
+
+Gramatyka działa na tokenach (słowach), nie na jednym dużym regexie:
+każdy token jest klasyfikowany słownikiem albo krótkim, zakotwiczonym
+wzorcem bez zagnieżdżonych kwantyfikatorów, a analizowanych jest co
+najwyżej MAX_SPEC_TOKENS pierwszych słów - czas parsowania jest liniowy
+i ograniczony niezależnie od wejścia.
+
+Wynik analizy (bez zależności od bieżącej chwili) jest cache'owany po
+znormalizowanym początku tekstu, więc powtarzające się frazy ('jutro 9:00')
+kosztują jedno wyszukiwanie w słowniku; datę bezwzględną liczy `_resolve`.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import NamedTuple
+
+WEEKDAY_MAP = {
+    'pn': 0, 'pon': 0, 'poniedziałek': 0, 'poniedzialek': 0,
+    'wt': 1, 'wto': 1, 'wtorek': 1,
+    'śr': 2, 'sr': 2, 'sro': 2, 'środa': 2, 'sroda': 2, 'środę': 2, 'srode': 2,
+    'cz': 3, 'czw': 3, 'czwartek': 3,
+    'pt': 4, 'pia': 4, 'piątek': 4, 'piatek': 4,
+    'sb': 5, 'sob': 5, 'sobota': 5, 'sobotę': 5, 'sobote': 5,
+    'nd': 6, 'nie': 6, 'niedziela': 6, 'niedzielę': 6, 'niedziele': 6,
+}
+
+# Ile słów z początku tekstu może należeć do wyrażenia czasu
+MAX_SPEC_TOKENS = 6
+# Dłuższe tokeny nie pasują do żadnej reguły - nie trafiają nawet do regexów
+MAX_TOKEN_LENGTH = 24
+# Godzina dla dat bez godziny ('jutro Raport')
+DEFAULT_TIME = time(9, 0)
+CACHE_SIZE = 4096
+
+_RELATIVE_DAYS = {'dziś': 0, 'dzis': 0, 'dzisiaj': 0, 'jutro': 1, 'pojutrze': 2}
+_DAYTIME_WORDS = {'rano': time(8, 0), 'południe': time(12, 0), 'poludnie': time(12, 0),
+                  'wieczorem': time(20, 0)}
+_EVERY_WORDS = {'każdy', 'kazdy', 'każdą', 'kazda', 'każda'}
+
+# Jednostki czasu (w minutach) w formie słownej: 'za 2 godziny', 'za tydzień'
+_UNIT_WORDS = {
+    'm': 1, 'min': 1, 'minut': 1, 'minuta': 1, 'minuty': 1, 'minutę': 1, 'minute': 1,
+    'h': 60, 'g': 60, 'godz': 60, 'godzin': 60, 'godzina': 60, 'godziny': 60, 'godzinę': 60, 'godzine': 60,
+    'd': 1440, 'dn': 1440, 'dni': 1440, 'dzień': 1440, 'dzien': 1440, 'dnia': 1440,
+    'tydzień': 10080, 'tydzien': 10080, 'tygodnie': 10080, 'tygodni': 10080, 'tyg': 10080,
+}
+# Forma zwarta: '30m', '1h30m', '2d', '1tyg' - każdy człon zaczyna się cyfrą, brak backtrackingu
+_COMPACT_PART = re.compile(r'(\d{1,4})(min|tyg|dni|dn|m|h|g|d)')
+_CLOCK = re.compile(r'^(\d{1,2}):(\d{2})$')
+_HOUR = re.compile(r'^(\d{1,2})$')
+_DAY_MONTH = re.compile(r'^(\d{1,2})[./](\d{1,2})(?:[./](\d{4})?)?$')
+_TOKEN = re.compile(r'\S+')
+
+class ParsedTime(NamedTuple):
+    when: datetime
+    recurrence: dict | None  # {'type': 'daily' | 'weekly', 'days': str | None, 'time': 'HH:MM'}
+    content: str
+
+def _compact_minutes(token: str) -> int | None:
+    """'1h30m' -> 90; None, jeśli token nie jest w całości zapisem długości."""
+    total, pos = 0, 0
+    for match in _COMPACT_PART.finditer(token):
+        if match.start() != pos:
+            return None
+        total += int(match.group(1)) * _UNIT_WORDS[match.group(2)]
+        pos = match.end()
+    return total if pos == len(token) and total else None
+
+def _clock(token: str, allow_bare_hour: bool) -> time | None:
+    match = _CLOCK.match(token)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+    else:
+        match = _HOUR.match(token) if allow_bare_hour else None
+        if not match:
+            return None
+        hour, minute = int(match.group(1)), 0
+    if 0 <= hour <= 23 and 0 <= minute <= 59:
+        return time(hour, minute)
+    return None
+
+def _parse_duration(tokens: tuple, i: int) -> tuple[int, int] | None:
+    """Po 'za': zwraca (minuty, nowa pozycja) albo None."""
+    if i >= len(tokens):
+        return None
+    minutes = _compact_minutes(tokens[i])
+    if minutes:
+        return minutes, i + 1
+    if tokens[i] in _UNIT_WORDS:  # 'za godzinę', 'za tydzień'
+        return _UNIT_WORDS[tokens[i]], i + 1
+    if tokens[i].isdigit() and i + 1 < len(tokens) and tokens[i + 1] in _UNIT_WORDS:
+        return int(tokens[i]) * _UNIT_WORDS[tokens[i + 1]], i + 2
+    return None
+
+def _parse_date(tokens: tuple, i: int):
+    """Zwraca ((rodzaj, wartość), nowa pozycja) albo None."""
+    token = tokens[i]
+    if token in _RELATIVE_DAYS:
+        return ('days', _RELATIVE_DAYS[token]), i + 1
+    if token in ('w', 'we') and i + 1 < len(tokens) and tokens[i + 1] in WEEKDAY_MAP:
+        return ('weekday', WEEKDAY_MAP[tokens[i + 1]]), i + 2
+    match = _DAY_MONTH.match(token)
+    if match:
+        day, month = int(match.group(1)), int(match.group(2))
+        year = int(match.group(3)) if match.group(3) else None
+        if 1 <= month <= 12 and 1 <= day <= 31:
+            return ('date', (year, month, day)), i + 1
+    return None
+
+def _parse_time(tokens: tuple, i: int):
+    """Zwraca (time, nowa pozycja) albo None. Sama liczba ('14') tylko po 'o'."""
+    token = tokens[i]
+    if token in _DAYTIME_WORDS:
+        return _DAYTIME_WORDS[token], i + 1
+    if token == 'w' and i + 1 < len(tokens) and tokens[i + 1] in ('południe', 'poludnie'):
+        return _DAYTIME_WORDS[tokens[i + 1]], i + 2
+    if token in ('o', 'na') and i + 1 < len(tokens):
+        clock = _clock(tokens[i + 1], allow_bare_hour=True)
+        if clock:
+            return clock, i + 2
+        return None
+    clock = _clock(token, allow_bare_hour=False)
+    if clock:
+        return clock, i + 1
+    return None
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_spec(tokens: tuple):
+    """Analiza składniowa początku tekstu - niezależna od bieżącej chwili.
+
+    Zwraca (liczba zużytych tokenów, spec) albo None. `spec` to krotka
+    (minuty_względne, data, godzina, powtarzanie) - hashowalna, do cache.
+    """
+    if any(len(token) > MAX_TOKEN_LENGTH for token in tokens):
+        tokens = tokens[:next(k for k, t in enumerate(tokens) if len(t) > MAX_TOKEN_LENGTH)]
+    i = 0
+    n = len(tokens)
+    if n == 0:
+        return None
+
+    # Względne: 'za 1h30m', 'za 2 godziny'
+    if tokens[0] == 'za':
+        duration = _parse_duration(tokens, 1)
+        if duration:
+            minutes, i = duration
+            return i, (minutes, None, None, None)
+        return None
+
+    recurrence = None
+    if tokens[0] == 'codziennie':
+        recurrence, i = ('daily', None), 1
+    elif tokens[0] == 'co' and n > 1 and tokens[1] in WEEKDAY_MAP:
+        recurrence, i = ('weekly', WEEKDAY_MAP[tokens[1]]), 2
+    elif tokens[0] in ('w', 'we') and n > 2 and tokens[1] in _EVERY_WORDS and tokens[2] in WEEKDAY_MAP:
+        recurrence, i = ('weekly', WEEKDAY_MAP[tokens[2]]), 3
+
+    day_spec, clock = None, None
+    # Data i godzina w dowolnej kolejności, każda najwyżej raz
+    for _ in range(2):
+        if i >= n:
+            break
+        if day_spec is None and recurrence is None:
+            parsed = _parse_date(tokens, i)
+            if parsed:
+                day_spec, i = parsed
+                continue
+        if clock is None:
+            parsed = _parse_time(tokens, i)
+            if parsed:
+                clock, i = parsed
+                continue
+        break
+
+    if recurrence is None and day_spec is None and clock is None:
+        return None
+    return i, (None, day_spec, clock, recurrence)
+
+def _resolve(spec: tuple, now: datetime) -> tuple[datetime, dict | None] | None:
+    """Zamienia spec na konkretny termin względem `now`."""
+    minutes, day_spec, clock, recurrence = spec
+    if minutes is not None:
+        return now + timedelta(minutes=minutes), None
+
+    if recurrence is not None:
+        kind, weekday = recurrence
+        clock = clock or DEFAULT_TIME
+        day_spec = ('weekday', weekday) if kind == 'weekly' else None
+        rule = {
+            'type': kind,
+            'days': str(weekday) if kind == 'weekly' else None,
+            'time': clock.strftime('%H:%M'),
+        }
+    else:
+        rule = None
+
+    if day_spec is None:
+        # Sama godzina: dziś, a jeśli już minęła - jutro
+        target = datetime.combine(now.date(), clock)
+        if target <= now:
+            target += timedelta(days=1)
+        return target, rule
+
+    kind, value = day_spec
+    clock = clock or DEFAULT_TIME
+    if kind == 'days':
+        target = datetime.combine(now.date() + timedelta(days=value), clock)
+    elif kind == 'weekday':
+        days_ahead = (value - now.weekday()) % 7
+        target = datetime.combine(now.date() + timedelta(days=days_ahead), clock)
+        if target <= now:
+            target += timedelta(days=7)
+    else:
+        year, month, day = value
+        try:
+            target = datetime.combine(date(year or now.year, month, day), clock)
+            if year is None and target <= now:
+                target = datetime.combine(date(now.year + 1, month, day), clock)
+        except ValueError:
+            return None  # np. 31.02
+    if target <= now:
+        return None
+    return target, rule
+
+def parse(text: str, now: datetime | None = None) -> ParsedTime | None:
+    """Parsuje wyrażenie czasu z początku tekstu; reszta to treść przypomnienia.
+
+    Zwraca None, gdy tekst nie zaczyna się od rozpoznawalnego terminu,
+    termin już minął albo brakuje treści.
+    """
+    now = now or datetime.now()
+    spans = []
+    for match in _TOKEN.finditer(text):
+        spans.append(match)
+        if len(spans) > MAX_SPEC_TOKENS:
+            break
+    tokens = tuple(m.group(0).lower() for m in spans[:MAX_SPEC_TOKENS])
+
+    parsed = _parse_spec(tokens)
+    if not parsed:
+        return None
+    consumed, spec = parsed
+    if consumed >= len(spans):
+        return None  # brak treści
+    content = text[spans[consumed].start():].strip()
+
+    resolved = _resolve(spec, now)
+    if not resolved:
+        return None
+    when, recurrence = resolved
+    return ParsedTime(when, recurrence, content)
+
+def parse_duration(token: str) -> int | None:
+    """'30m', '1h30m', '2d' -> liczba minut; None dla innych tokenów."""
+    if len(token) > MAX_TOKEN_LENGTH:
+        return None
+    return _compact_minutes(token.lower())
+
+def parse_day(token: str, today: date | None = None) -> date | None:
+    """'dziś', 'jutro', 'pt', 'piątek', '15.11' -> najbliższa taka data (dziś lub później)."""
+    token = token.lower()
+    today = today or date.today()
+    if len(token) > MAX_TOKEN_LENGTH:
+        return None
+    if token in WEEKDAY_MAP:
+        return today + timedelta(days=(WEEKDAY_MAP[token] - today.weekday()) % 7)
+    parsed = _parse_date((token,), 0)
+    if not parsed:
+        return None
+    (kind, value), _ = parsed
+    if kind == 'days':
+        return today + timedelta(days=value)
+    if kind == 'date':
+        year, month, day = value
+        try:
+            target = date(year or today.year, month, day)
+            if year is None and target < today:
+                target = date(today.year + 1, month, day)
+        except ValueError:
+            return None
+        return target
+    return None
+
+def cache_info():
+    """Statystyki cache gramatyki (trafienia / chybienia)."""
+    return _parse_spec.cache_info()
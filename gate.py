@@ -0,0 +1,128 @@
+"""Bramka dostępu: odrzuca aktualizacje od obcych, zanim trafią do handlerów.
+
+Działa jako TypeHandler w grupie -1 (przed wszystkimi handlerami bota).
+Obcą aktualizację kończy przez ApplicationHandlerStop - nie dochodzi do
+routingu handle_text, do bazy ani do kolejki wychodzącej w handlerach.
+
+- Negatywny cache: stan każdego obcego nadawcy w OrderedDict (LRU do
+  `max_senders`), więc kolejne wiadomości od niego to jedno wyszukanie.
+- Token bucket na nadawcę: każda aktualizacja zużywa żeton (`burst` na
+  start, jeden nowy co `refill_seconds`). Bez żetonu aktualizacja znika
+  bez śladu poza licznikiem - zalew nie zapycha też logów.
+- Odpowiedź "brak dostępu" najwyżej raz na `reply_window` s na nadawcę i
+  najwyżej `replies_per_minute` łącznie. Wysyłka idzie w tle, nie
+  wstrzymuje obsługi kolejnych aktualizacji (np. właściciela).
+- Liczniki (`stats`) trafiają do /healthz.
+"""
+import heapq
+import logging
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from sender import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SENDER_BURST = 5             # tyle aktualizacji od obcego przechodzi przez bramkę z logiem
+SENDER_REFILL_SECONDS = 60   # potem jedna na tyle sekund
+REPLY_WINDOW_SECONDS = 3600  # odpowiedź "brak dostępu" najwyżej raz na okno na nadawcę
+REPLIES_PER_MINUTE = 20      # ... i najwyżej tyle na minutę od wszystkich obcych razem
+MAX_SENDERS = 10_000         # rozmiar negatywnego cache
+TOP_SENDERS = 5
+
+DENIED_TEXT = "⛔ Brak dostępu. To jest prywatny bot."
+DENIED_ANSWER = "⛔ Brak dostępu."
+
+ALLOW, DROP, REPLY = 'allow', 'drop', 'reply'
+
+@dataclass(slots=True)
+class Sender:
+    bucket: TokenBucket
+    last_reply: float | None = None
+    updates: int = 0
+
+class Gate:
+    """Przepuszcza tylko aktualizacje od `owner_id`; `reply(update, text)` wysyła odmowę."""
+
+    def __init__(self, owner_id, reply, reply_window: float = REPLY_WINDOW_SECONDS,
+                 replies_per_minute: int = REPLIES_PER_MINUTE, burst: int = SENDER_BURST,
+                 refill_seconds: float = SENDER_REFILL_SECONDS, max_senders: int = MAX_SENDERS):
+        self.owner_id = int(owner_id) if owner_id else None
+        self.reply = reply
+        self.reply_window = reply_window
+        self.replies_per_minute = replies_per_minute
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self.max_senders = max_senders
+        self.senders = OrderedDict()  # user_id -> Sender, od najdawniej widzianego
+        self.counters = Counter()
+        self.reply_bucket = TokenBucket(replies_per_minute / 60, replies_per_minute)
+
+    def classify(self, update: Update) -> str:
+        """ALLOW (właściciel), REPLY (odmowa z odpowiedzią) albo DROP (odmowa po cichu)."""
+        user = update.effective_user
+        if user is None:
+            # Np. post na kanale - żaden handler bota tego nie obsługuje
+            self.counters['anonymous'] += 1
+            return DROP
+        if user.id == self.owner_id:
+            self.counters['allowed'] += 1
+            return ALLOW
+        sender = self.senders.get(user.id)
+        if sender is None:
+            sender = self.senders[user.id] = Sender(TokenBucket(1 / self.refill_seconds, self.burst))
+            if len(self.senders) > self.max_senders:
+                self.senders.popitem(last=False)
+                self.counters['evicted'] += 1
+        else:
+            self.senders.move_to_end(user.id)
+        sender.updates += 1
+        if not sender.bucket.try_acquire():
+            self.counters['throttled'] += 1
+            return DROP
+        self.counters['denied'] += 1
+        logger.warning("Odrzucono aktualizację od nieuprawnionego nadawcy %s", user.id, extra={
+            'username': user.username,
+        })
+        now = time.monotonic()
+        if sender.last_reply is not None and now - sender.last_reply < self.reply_window:
+            return DROP
+        if not self.reply_bucket.try_acquire():
+            self.counters['replies_suppressed'] += 1
+            return DROP
+        sender.last_reply = now
+        self.counters['replied'] += 1
+        return REPLY
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Callback TypeHandlera w grupie -1: właściciel przechodzi dalej, reszta kończy się tutaj."""
+        action = self.classify(update)
+        if action == ALLOW:
+            return
+        if action == REPLY:
+            context.application.create_task(self._deny(update), update=update, name="gate-deny")
+        raise ApplicationHandlerStop
+
+    async def _deny(self, update: Update):
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(DENIED_ANSWER)
+            elif update.effective_message:
+                await self.reply(update, DENIED_TEXT)
+        except TelegramError as e:
+            logger.info("Nie udało się odpowiedzieć obcemu nadawcy: %s", e)
+
+    def stats(self) -> dict:
+        """Liczniki dla /healthz, z nadawcami o największej liczbie aktualizacji."""
+        top = heapq.nlargest(TOP_SENDERS, self.senders.items(), key=lambda item: item[1].updates)
+        return {
+            **{name: self.counters[name] for name in
+               ('allowed', 'denied', 'throttled', 'replied', 'replies_suppressed', 'anonymous', 'evicted')},
+            'senders': len(self.senders),
+            'top_senders': {str(user_id): sender.updates for user_id, sender in top},
+        }
@@ -0,0 +1,277 @@
+"""Watchdog bota: joby, opóźnienie obsługi aktualizacji, czas zapisu do SQLite.
+
+- `Monitor.track` opakowuje callback joba z post_init i zapisuje początek,
+  koniec i wynik każdego przebiegu. APScheduler nie uruchamia joba, dopóki
+  poprzedni przebieg trwa (max_instances=1). Zawieszone send_message w
+  check_reminders zatrzymałoby więc przypomnienia na zawsze. Przebieg
+  dłuższy niż `job_timeout` watchdog przerywa (re-arm), a następne
+  tyknięcie rusza normalnie. Rezerwacje przerwanego przebiegu wygasają
+  po CLAIM_LEASE_SECONDS.
+- Opóźnienie aktualizacji: od `message.date` do początku obsługi
+  (TracedApplication.process_update).
+- Zapis do SQLite: każdy przebieg watchdoga mierzy próbny zapis (`probe`)
+  w wątku, więc zablokowana baza nie zatrzymuje pętli bota.
+- Watchdog to osobne zadanie asyncio, nie job - działa też wtedy, gdy
+  kolejka jobów stoi. Nowy problem to jeden alert, powrót do normy drugi.
+- `HealthServer`: GET /healthz -> JSON, 200 gdy wszystko w normie, 503 gdy nie.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import wraps
+
+import httpserver
+
+logger = logging.getLogger(__name__)
+
+CHECK_SECONDS = 15           # co ile watchdog sprawdza stan
+STALE_FACTOR = 3             # job bez udanego przebiegu przez tyle interwałów jest "stary"
+MAX_FAILURES = 3             # tyle nieudanych przebiegów z rzędu to problem
+LAG_WINDOW_SECONDS = 300     # okno, z którego liczymy opóźnienie aktualizacji
+SAMPLES = 200                # ile ostatnich pomiarów trzymamy (p95 w /healthz)
+PROBE_TIMEOUT_SECONDS = 30
+ALERT_TIMEOUT_SECONDS = 10
+
+def _percentile(values, q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+@dataclass(slots=True)
+class JobStatus:
+    name: str
+    interval: float
+    stale_after: float
+    registered: float
+    last_start: float | None = None
+    last_ok: float | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    running_since: float | None = None
+    task: asyncio.Task | None = None
+    runs: int = 0
+    failures: int = 0  # nieudane przebiegi z rzędu
+    rearmed: int = 0
+
+class Monitor:
+    """Stan zdrowia procesu; `start` uruchamia watchdog z funkcją alertu."""
+
+    def __init__(self, probe, pending=None, max_lag: float = 60, max_write_ms: float = 500,
+                 job_timeout: float = 120, check_seconds: float = CHECK_SECONDS):
+        self.probe = probe
+        self.pending = pending
+        self.max_lag = max_lag
+        self.max_write_ms = max_write_ms
+        self.job_timeout = job_timeout
+        self.check_seconds = check_seconds
+        self.jobs = {}
+        self.lags = deque(maxlen=SAMPLES)  # (monotonic, opóźnienie w s)
+        self.write_ms = deque(maxlen=SAMPLES)
+        self.write_error = None
+        self._probe, self._probe_start = None, 0.0
+        self.loop_lag_ms = 0.0
+        self.updates = 0
+        self.failing = {}  # klucz problemu -> opis, o którym już był alert
+        self.sections = {}  # nazwa -> funkcja zwracająca dodatkową sekcję /healthz
+        self.started = time.monotonic()
+        self._task = None
+
+    # --- Pomiary ---
+
+    def track(self, callback, interval: float, stale_after: float | None = None):
+        """Opakowuje callback joba powtarzanego co `interval` s (nazwa joba = nazwa callbacku)."""
+        status = JobStatus(callback.__name__, interval, stale_after or interval * STALE_FACTOR, time.monotonic())
+        self.jobs[status.name] = status
+
+        @wraps(callback)
+        async def wrapper(context):
+            status.runs += 1
+            status.last_start = status.running_since = time.monotonic()
+            status.task = asyncio.current_task()
+            try:
+                result = await callback(context)
+            except asyncio.CancelledError:
+                status.failures += 1
+                status.last_error = "przerwany przez watchdog"
+                raise
+            except Exception as e:
+                status.failures += 1
+                status.last_error = repr(e)
+                raise
+            else:
+                status.last_ok = time.monotonic()
+                status.failures, status.last_error = 0, None
+                return result
+            finally:
+                status.last_duration = time.monotonic() - status.last_start
+                status.running_since = status.task = None
+        return wrapper
+
+    def record_update(self, update, started: float):
+        """Opóźnienie aktualizacji: `started` (time.time() początku obsługi) - data wiadomości."""
+        self.updates += 1
+        message = update.message
+        if message is not None and message.date is not None:
+            self.lags.append((time.monotonic(), max(0.0, started - message.date.timestamp())))
+
+    async def measure_write(self):
+        # Wątku z zablokowanym zapisem nie da się przerwać - nowy próbny zapis
+        # dopiero po zakończeniu poprzedniego, inaczej wątki by się mnożyły
+        if self._probe is not None and not self._probe.done():
+            self.write_error = f"próbny zapis trwa {time.perf_counter() - self._probe_start:.0f} s"
+            return
+        self._probe_start = start = time.perf_counter()
+        self._probe = asyncio.get_running_loop().run_in_executor(None, self.probe)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._probe), PROBE_TIMEOUT_SECONDS)
+        except Exception as e:
+            self.write_error = repr(e)
+            logger.warning("Próbny zapis do SQLite nie powiódł się: %r", e)
+            return
+        self.write_error = None
+        self.write_ms.append((time.perf_counter() - start) * 1000)
+
+    # --- Ocena ---
+
+    def rearm(self) -> list[str]:
+        """Przerywa przebiegi jobów dłuższe niż `job_timeout`; zwraca ich nazwy."""
+        now, rearmed = time.monotonic(), []
+        for status in self.jobs.values():
+            if status.task is not None and now - status.running_since > self.job_timeout:
+                logger.warning("Job %s trwa %.0f s - przerywam", status.name, now - status.running_since)
+                status.task.cancel()
+                status.task = None
+                status.rearmed += 1
+                rearmed.append(status.name)
+        return rearmed
+
+    def recent_lag(self) -> float | None:
+        since = time.monotonic() - LAG_WINDOW_SECONDS
+        return max((lag for at, lag in self.lags if at >= since), default=None)
+
+    def problems(self) -> dict:
+        """Klucz -> opis wszystkiego, co przekracza progi."""
+        now, found = time.monotonic(), {}
+        for status in self.jobs.values():
+            if status.running_since is not None and now - status.running_since > self.job_timeout:
+                found[f"job:{status.name}"] = (f"job {status.name} zawieszony od "
+                                               f"{now - status.running_since:.0f} s (przerwany)")
+            elif now - (status.last_ok or status.registered) > status.stale_after:
+                found[f"job:{status.name}"] = (f"job {status.name} bez udanego przebiegu od "
+                                               f"{now - (status.last_ok or status.registered):.0f} s")
+            elif status.failures >= MAX_FAILURES:
+                found[f"job:{status.name}"] = f"job {status.name}: {status.failures} błędy z rzędu"
+        lag = self.recent_lag()
+        if lag is not None and lag > self.max_lag:
+            found['lag'] = f"opóźnienie obsługi aktualizacji {lag:.0f} s (próg {self.max_lag:.0f} s)"
+        if self.write_error:
+            found['sqlite'] = f"zapis do SQLite nie działa: {self.write_error}"
+        elif self.write_ms and self.write_ms[-1] > self.max_write_ms:
+            found['sqlite'] = f"zapis do SQLite trwa {self.write_ms[-1]:.0f} ms (próg {self.max_write_ms:.0f} ms)"
+        return found
+
+    def snapshot(self) -> dict:
+        """Stan dla /healthz."""
+        now = time.monotonic()
+        problems = self.problems()
+        write_ms = list(self.write_ms)
+        return {
+            'status': 'fail' if problems else 'ok',
+            'problems': list(problems.values()),
+            'uptime_s': round(now - self.started),
+            'jobs': {
+                status.name: {
+                    'interval_s': status.interval,
+                    'last_ok_s_ago': round(now - status.last_ok, 1) if status.last_ok else None,
+                    'last_duration_ms': round(status.last_duration * 1000, 1) if status.last_duration else None,
+                    'running_s': round(now - status.running_since, 1) if status.running_since else None,
+                    'runs': status.runs,
+                    'failures': status.failures,
+                    'last_error': status.last_error,
+                    'rearmed': status.rearmed,
+                }
+                for status in self.jobs.values()
+            },
+            'updates': {
+                'processed': self.updates,
+                'lag_s_max_recent': self.recent_lag(),
+                'lag_s_p95': _percentile([lag for _, lag in self.lags], 0.95),
+            },
+            'sqlite': {
+                'write_ms_last': round(write_ms[-1], 2) if write_ms else None,
+                'write_ms_p95': round(_percentile(write_ms, 0.95), 2) if write_ms else None,
+                'error': self.write_error,
+            },
+            'loop_lag_ms': round(self.loop_lag_ms, 1),
+            'outbound_pending': self.pending() if self.pending else None,
+            **{name: section() for name, section in self.sections.items()},
+        }
+
+    # --- Watchdog ---
+
+    def start(self, alert):
+        """Uruchamia watchdog; `alert(text)` (coroutine) dostaje nowe problemy i powroty do normy."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(alert), name="health-watchdog")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def check(self, alert):
+        """Jeden przebieg: pomiar zapisu, re-arm zawieszonych jobów, alerty o zmianach."""
+        await self.measure_write()
+        self.rearm()
+        problems = self.problems()
+        new = [text for key, text in problems.items() if key not in self.failing]
+        recovered = [text for key, text in self.failing.items() if key not in problems]
+        self.failing = problems
+        for text in new:
+            logger.warning("Health: %s", text)
+        if new:
+            await self._alert(alert, "⚠️ FocusBot: " + "\n⚠️ ".join(new))
+        if recovered:
+            await self._alert(alert, "✅ FocusBot wrócił do normy: " + "; ".join(recovered))
+
+    async def _alert(self, alert, text: str):
+        try:
+            await asyncio.wait_for(alert(text), ALERT_TIMEOUT_SECONDS)
+        except Exception:
+            logger.exception("Nie udało się wysłać alertu watchdoga")
+
+    async def _run(self, alert):
+        expected = time.monotonic()
+        while True:
+            expected += self.check_seconds
+            await asyncio.sleep(max(0.0, expected - time.monotonic()))
+            # Spóźnienie pobudki = jak długo pętla zdarzeń była zablokowana
+            self.loop_lag_ms = max(0.0, time.monotonic() - expected) * 1000
+            expected = max(expected, time.monotonic())
+            try:
+                await self.check(alert)
+            except Exception:
+                logger.exception("Błąd w przebiegu watchdoga")
+
+class HealthServer(httpserver.LocalServer):
+    """GET /healthz: JSON ze stanem; 200 w normie, 503 przy przekroczonym progu."""
+    name = "Health"
+    log_level = logging.DEBUG  # sondy przychodzą co kilka sekund
+
+    def __init__(self, monitor: Monitor, path: str = '/healthz'):
+        super().__init__(path)
+        self.monitor = monitor
+
+    def render(self, headers: dict) -> tuple[int, dict, bytes]:
+        state = self.monitor.snapshot()
+        body = json.dumps(state, ensure_ascii=False, indent=2).encode('utf-8')
+        return (200 if state['status'] == 'ok' else 503,
+                {'Content-Type': 'application/json; charset=utf-8', 'Cache-Control': 'no-store'}, body)
@@ -0,0 +1,91 @@
+"""Minimalny serwer HTTP/1.1 dla lokalnych endpointów bota (kanał iCalendar, /healthz).
+
+Jedno żądanie na połączenie, tylko GET/HEAD, na asyncio w pętli bota -
+bez dodatkowych zależności. Podklasa ustawia `path` i implementuje
+`render` (status, nagłówki, treść); 404/405/400, HEAD i logowanie są tutaj.
+"""
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+import logconfig
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT_SECONDS = 10
+MAX_REQUEST_BYTES = 8192
+
+_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+class LocalServer:
+    """Serwuje jeden zasób pod `path` (GET/HEAD)."""
+    name = "HTTP"
+    log_level = logging.INFO
+
+    def __init__(self, path: str):
+        self.path = path
+        self._server = None
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_REQUEST_BYTES)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def render(self, headers: dict) -> tuple[int, dict, bytes]:
+        """(status, nagłówki, treść) zasobu - nagłówki żądania małymi literami."""
+        raise NotImplementedError
+
+    def respond(self, method: str, target: str, headers: dict) -> tuple[int, dict, bytes]:
+        """(status, nagłówki, treść) dla żądania - nagłówki żądania małymi literami."""
+        if urlsplit(target).path != self.path:
+            return 404, {}, b''
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+        return self.render(headers)
+
+    async def _handle(self, reader, writer):
+        logconfig.bind(logconfig.new_correlation_id("http"))
+        start = time.perf_counter()
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_TIMEOUT_SECONDS)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) != 3:
+            status, headers, body, method, target = 400, {}, b'', '', ''
+        else:
+            method, target, _ = parts
+            request_headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                if value:
+                    request_headers[name.strip().lower()] = value.strip()
+            try:
+                status, headers, body = self.respond(method, target, request_headers)
+            except Exception:
+                logger.exception("Błąd obsługi żądania (%s)", self.name)
+                status, headers, body = 500, {}, b''
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Internal Server Error')}",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        # Bez ścieżki w logu - może zawierać sekret (CALENDAR_TOKEN)
+        logger.log(self.log_level, "%s: %s -> %d", self.name, method, status, extra={
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+        })
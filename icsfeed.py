@@ -0,0 +1,183 @@
+"""Kanał iCalendar (RFC 5545) z przypomnień: /kalendarz i lokalny serwer HTTP.
+
+- Aktywne przypomnienia jednorazowe (te z /przypomnienia) -> VEVENT
+  o `remind_at`; cykliczne -> VEVENT z RRULE zbudowaną z
+  schedule_type/schedule_days/schedule_time, od pierwszego terminu po
+  utworzeniu.
+- Czas "pływający" (bez strefy), tak jak w bazie - kalendarz pokazuje go
+  w swojej strefie lokalnej.
+- `FeedCache` trzyma gotowy dokument i składa go od nowa tylko wtedy, gdy
+  zmieni się `store.calendar_version()` (w SQLite licznik podbijają
+  triggery). Odpytanie bez zmian to jeden odczyt licznika, a z
+  If-None-Match serwer odpowiada 304 bez treści.
+- `CalendarServer`: kanał przez lokalny serwer HTTP (httpserver.py) w pętli
+  bota - bez dodatkowych zależności.
+"""
+import calendar
+import gzip
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import httpserver
+
+PRODID = "-//FocusBot//Przypomnienia//PL"
+CALENDAR_NAME = "FocusBot"
+FILENAME = "focusbot.ics"
+EVENT_MINUTES = 15           # długość wydarzenia w kalendarzu
+REFRESH_MINUTES = 15         # sugerowany odstęp odpytywania (REFRESH-INTERVAL)
+MAX_LINE_OCTETS = 75         # RFC 5545 3.1 - dłuższe linie są zawijane
+
+BYDAY = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+# --- Format ---
+
+def escape_text(text: str) -> str:
+    """Wartość TEXT (RFC 5545 3.3.11): \\ ; , i nowe linie."""
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\n').replace('\r', '\n').replace('\n', '\\n'))
+
+def fold(line: str) -> str:
+    """Zawija linię co 75 oktetów UTF-8, nie rozcinając znaku wielobajtowego."""
+    data = line.encode('utf-8')
+    if len(data) <= MAX_LINE_OCTETS:
+        return line
+    parts, start, limit = [], 0, MAX_LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode('utf-8'))
+        start, limit = end, MAX_LINE_OCTETS - 1  # linia kontynuacji zaczyna się od spacji
+    return '\r\n '.join(parts)
+
+def _local(value: datetime) -> str:
+    return value.strftime('%Y%m%dT%H%M%S')
+
+def _utc(value: datetime) -> str:
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+def _parse(value) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+# --- Harmonogramy ---
+
+def rrule(schedule_type: str, days: str | None) -> str:
+    """RRULE odpowiadająca harmonogramowi z `dateparse` / `bot.calculate_next_run`."""
+    if schedule_type == 'daily':
+        return 'FREQ=DAILY'
+    if schedule_type in ('weekdays', 'weekly', 'custom_days'):
+        return 'FREQ=WEEKLY;BYDAY=' + ','.join(BYDAY[int(d)] for d in days.split(','))
+    if schedule_type == 'monthly':
+        day = int(days)
+        if day <= 28:
+            return f'FREQ=MONTHLY;BYMONTHDAY={day}'
+        # Krótszy miesiąc: bot wysyła ostatniego dnia - ostatni istniejący z 28..day
+        return f"FREQ=MONTHLY;BYMONTHDAY={','.join(map(str, range(28, day + 1)))};BYSETPOS=-1"
+    raise ValueError(f"Nieznany typ harmonogramu: {schedule_type!r}")
+
+def _matches(schedule_type: str, days: str | None, day) -> bool:
+    if schedule_type == 'daily':
+        return True
+    if schedule_type == 'monthly':
+        return day.day == min(int(days), calendar.monthrange(day.year, day.month)[1])
+    return day.weekday() in {int(d) for d in days.split(',')}
+
+def first_occurrence(schedule_type: str, days: str | None, time_str: str, after: datetime) -> datetime:
+    """Pierwszy termin serii nie wcześniejszy niż `after` - DTSTART musi należeć do RRULE."""
+    hour, minute = map(int, time_str.split(':'))
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate < after:
+        candidate += timedelta(days=1)
+    for _ in range(62):  # najdłuższa przerwa: miesiąc
+        if _matches(schedule_type, days, candidate):
+            return candidate
+        candidate += timedelta(days=1)
+    raise ValueError(f"Harmonogram bez terminu: {schedule_type!r} {days!r}")
+
+def _series_start(reminder) -> datetime:
+    """Początek serii: pierwszy termin po utworzeniu (created_at jest w UTC), inaczej next_run."""
+    created_at = _parse(reminder.created_at)
+    if created_at is None:
+        return _parse(reminder.next_run)
+    local = created_at.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return first_occurrence(reminder.schedule_type, reminder.schedule_days, reminder.schedule_time, local)
+
+# --- Dokument ---
+
+def build(reminders: list, recurring: list, now: datetime | None = None) -> bytes:
+    """Dokument VCALENDAR (CRLF, UTF-8) z przypomnień jednorazowych i cyklicznych."""
+    stamp = _utc(now or datetime.now(timezone.utc))
+    duration = f'DURATION:PT{EVENT_MINUTES}M'
+    lines = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{CALENDAR_NAME}', f'REFRESH-INTERVAL;VALUE=DURATION:PT{REFRESH_MINUTES}M',
+    ]
+    for r in reminders:
+        lines += [
+            'BEGIN:VEVENT', f'UID:reminder-{r.id}@focusbot', f'DTSTAMP:{stamp}',
+            f'DTSTART:{_local(_parse(r.remind_at))}', duration, f'SUMMARY:{escape_text(r.content)}',
+            'END:VEVENT',
+        ]
+    for r in recurring:
+        lines += [
+            'BEGIN:VEVENT', f'UID:recurring-{r.id}@focusbot', f'DTSTAMP:{stamp}',
+            f'DTSTART:{_local(_series_start(r))}', duration,
+            f'RRULE:{rrule(r.schedule_type, r.schedule_days)}', f'SUMMARY:{escape_text(r.content)}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(map(fold, lines)) + '\r\n').encode('utf-8')
+
+class FeedCache:
+    """Gotowy dokument (i jego wersja gzip) przeliczany tylko po zmianie licznika."""
+
+    def __init__(self, store):
+        self.store = store
+        self.version = None
+        self.body = b''
+        self.gzipped = b''
+        self.etag = ''
+        self.events = 0
+        self.generations = 0  # ile razy dokument był składany (diagnostyka)
+
+    def get(self) -> tuple[bytes, str]:
+        """(dokument, ETag) - składany na nowo tylko wtedy, gdy przypomnienia się zmieniły."""
+        version = self.store.calendar_version()
+        if version != self.version:
+            reminders, recurring = self.store.reminders.list_active(), self.store.recurring.list_active()
+            self.body = build(reminders, recurring)
+            self.gzipped = gzip.compress(self.body, mtime=0)
+            self.etag = f'"{hashlib.sha1(self.body).hexdigest()[:16]}"'
+            self.events = len(reminders) + len(recurring)
+            self.version = version
+            self.generations += 1
+        return self.body, self.etag
+
+# --- HTTP ---
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Porównanie słabe (RFC 9110 13.1.2): W/"x" pasuje do "x"
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+class CalendarServer(httpserver.LocalServer):
+    """Serwuje kanał pod `path` (GET/HEAD) z ETag/If-None-Match i gzip."""
+    name = "Kanał iCalendar"
+
+    def __init__(self, feed: FeedCache, path: str):
+        super().__init__(path)
+        self.feed = feed
+
+    def render(self, headers: dict) -> tuple[int, dict, bytes]:
+        body, etag = self.feed.get()
+        response_headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if _etag_matches(headers.get('if-none-match', ''), etag):
+            return 304, response_headers, b''
+        response_headers['Content-Type'] = 'text/calendar; charset=utf-8'
+        response_headers['Content-Disposition'] = f'inline; filename="{FILENAME}"'
+        if 'gzip' in headers.get('accept-encoding', ''):
+            body = self.feed.gzipped
+            response_headers['Content-Encoding'] = 'gzip'
+        return 200, response_headers, body
@@ -0,0 +1,99 @@
+"""Klawiatury inline i kompaktowe kodowanie callback_data.
+
+Telegram pozwala na maks. 64 bajty callback_data. Zamiast tekstu w stylu
+"delete_task:123" pakujemy (akcja, id) do 5 bajtów (`struct` '>BI') i
+kodujemy base64 bez dopełnienia - 7 znaków na przycisk, niezależnie od id.
+"""
+import base64
+import binascii
+import struct
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Kody akcji (1 bajt). Nowe akcje dopisujemy na końcu - nigdy nie zmieniamy istniejących.
+TASK_DONE = 1
+TASK_DELETE = 2
+TASK_EDIT = 3
+IDEA_DELETE = 4
+IDEA_EDIT = 5
+REMINDER_DONE = 6
+REMINDER_SNOOZE_10M = 7
+REMINDER_SNOOZE_1H = 8
+REMINDER_SNOOZE_TOMORROW = 9
+IDEA_KEEP = 10
+IDEA_LATER = 11
+IDEA_PROMOTE = 12
+IDEA_ARCHIVE = 13
+
+_PAYLOAD = struct.Struct('>BI')
+
+# Telegram odrzuca klawiatury z ponad 100 przyciskami (3 na zadanie)
+MAX_KEYBOARD_ITEMS = 30
+# 4 przyciski na przypomnienie
+MAX_REMINDER_ROWS = 25
+
+def encode(action: int, item_id: int) -> str:
+    """(akcja, id) -> 7-znakowy callback_data."""
+    return base64.urlsafe_b64encode(_PAYLOAD.pack(action, item_id)).rstrip(b'=').decode('ascii')
+
+def decode(data: str) -> tuple[int, int] | None:
+    """callback_data -> (akcja, id); None dla danych spoza naszego formatu."""
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) != _PAYLOAD.size:
+        return None
+    return _PAYLOAD.unpack(raw)
+
+def build_list_keyboard(tasks: list, ideas: list) -> InlineKeyboardMarkup | None:
+    """Przyciski ✅/🗑️/✏️ przy każdym zadaniu i ✏️/🗑️ przy każdym pomyśle."""
+    rows = []
+    for t in tasks[:MAX_KEYBOARD_ITEMS]:
+        rows.append([
+            InlineKeyboardButton(f"✅ z{t.id}", callback_data=encode(TASK_DONE, t.id)),
+            InlineKeyboardButton("🗑️", callback_data=encode(TASK_DELETE, t.id)),
+            InlineKeyboardButton("✏️", callback_data=encode(TASK_EDIT, t.id)),
+        ])
+    for i in ideas[:max(0, MAX_KEYBOARD_ITEMS - len(rows))]:
+        rows.append([
+            InlineKeyboardButton(f"✏️ p{i.id}", callback_data=encode(IDEA_EDIT, i.id)),
+            InlineKeyboardButton("🗑️", callback_data=encode(IDEA_DELETE, i.id)),
+        ])
+    return InlineKeyboardMarkup(rows) if rows else None
+
+def build_reminder_keyboard(reminders: list) -> InlineKeyboardMarkup | None:
+    """Przyciski ✅ / drzemka 10 min / 1 h / jutro przy każdym przypomnieniu."""
+    rows = []
+    for r in reminders[:MAX_REMINDER_ROWS]:
+        rows.append([
+            InlineKeyboardButton(f"✅ #{r.id}", callback_data=encode(REMINDER_DONE, r.id)),
+            InlineKeyboardButton("💤 10m", callback_data=encode(REMINDER_SNOOZE_10M, r.id)),
+            InlineKeyboardButton("💤 1h", callback_data=encode(REMINDER_SNOOZE_1H, r.id)),
+            InlineKeyboardButton("💤 jutro", callback_data=encode(REMINDER_SNOOZE_TOMORROW, r.id)),
+        ])
+    return InlineKeyboardMarkup(rows) if rows else None
+
+def build_review_keyboard(ideas: list) -> InlineKeyboardMarkup | None:
+    """Przyciski 👍 zostaw / 💤 nie teraz / 📌 do zadań / 🗄️ archiwum przy każdym pomyśle z porcji."""
+    rows = []
+    for i in ideas[:MAX_REMINDER_ROWS]:
+        rows.append([
+            InlineKeyboardButton(f"👍 p{i.id}", callback_data=encode(IDEA_KEEP, i.id)),
+            InlineKeyboardButton("💤", callback_data=encode(IDEA_LATER, i.id)),
+            InlineKeyboardButton("📌 zadanie", callback_data=encode(IDEA_PROMOTE, i.id)),
+            InlineKeyboardButton("🗄️", callback_data=encode(IDEA_ARCHIVE, i.id)),
+        ])
+    return InlineKeyboardMarkup(rows) if rows else None
+
+def without_item(markup: InlineKeyboardMarkup | None, item_id: int) -> InlineKeyboardMarkup | None:
+    """Kopia klawiatury bez wierszy dotyczących elementu `item_id`."""
+    if markup is None:
+        return None
+    rows = []
+    for row in markup.inline_keyboard:
+        decoded = decode(row[0].callback_data or '') if row else None
+        if decoded and decoded[1] == item_id:
+            continue
+        rows.append(list(row))
+    return InlineKeyboardMarkup(rows) if rows else None
@@ -0,0 +1,167 @@
+"""Logi w formacie JSON (jedna linia = jeden wpis) z identyfikatorem korelacji.
+
+- Każda aktualizacja i każde uruchomienie joba dostaje `correlation_id`
+  (zmienna kontekstowa), dołączany do wszystkich logów z tej ścieżki:
+  handler, zapytania SQL (DEBUG), wysyłki przez kolejkę wychodzącą.
+- Handlery wywołane w pętli zdarzeń tylko wkładają rekord do kolejki
+  (`QueueHandler`); formatowanie i zapis robi osobny wątek
+  (`QueueListener`), więc wolny dysk nie blokuje bota.
+- Hałaśliwe loggery bibliotek (httpx loguje każde zapytanie long-pollingu,
+  apscheduler każde uruchomienie joba) są próbkowane: przechodzi co N-ty
+  wpis INFO, ostrzeżenia i błędy zawsze.
+- Plik logu rotowany po rozmiarze (`RotatingFileHandler`).
+"""
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+# Loggery bibliotek, z których zapisujemy tylko co N-ty wpis INFO
+SAMPLED_LOGGERS = ('httpx', 'apscheduler')
+# Token bota występuje w URL-ach Bot API (https://api.telegram.org/bot<token>/...)
+_TOKEN_RE = re.compile(r'bot\d+:[A-Za-z0-9_-]+')
+# Atrybuty każdego LogRecord - wszystko poza nimi pochodzi z `extra=` i trafia do JSON-a
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'correlation_id'}
+
+def new_correlation_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+def bind(value: str):
+    """Ustawia identyfikator korelacji dla bieżącego zadania asyncio (i jego potomków)."""
+    return correlation_id.set(value)
+
+def traced_job(callback):
+    """Opakowuje callback joba tak, by każde uruchomienie miało własny identyfikator."""
+    @wraps(callback)
+    async def wrapper(context):
+        bind(new_correlation_id(f"job-{callback.__name__}"))
+        return await callback(context)
+    return wrapper
+
+class TracedApplication(Application):
+    """Application, która obsługę każdej aktualizacji (wszystkie grupy handlerów)
+    wykonuje z identyfikatorem `upd-<update_id>` i loguje jej czas.
+
+    Z ustawionym `recorder` (recording.Recorder) aktualizacja trafia też do nagrania,
+    a z `health` (health.Monitor) - jej opóźnienie do watchdoga.
+    """
+    recorder = None
+    health = None
+
+    async def process_update(self, update):
+        if not isinstance(update, Update):
+            return await super().process_update(update)
+        token = bind(f"upd-{update.update_id}")
+        started, start = time.time(), time.perf_counter()
+        if self.health is not None:
+            self.health.record_update(update, started)
+        try:
+            return await super().process_update(update)
+        finally:
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            logger.info("Obsłużono aktualizację %s", update.update_id, extra={
+                'chat_id': update.effective_chat.id if update.effective_chat else None,
+                'duration_ms': duration_ms,
+            })
+            if self.recorder is not None:
+                self.recorder.record_update(update, started, duration_ms)
+            correlation_id.reset(token)
+
+class CorrelationFilter(logging.Filter):
+    """Dopisuje `correlation_id` do rekordu - w wątku, który loguje (kontekst znika po kolejce)."""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Z loggerów `names` (i ich potomków) przepuszcza co `every`-ty rekord poniżej WARNING."""
+
+    def __init__(self, names, every: int):
+        super().__init__()
+        self.prefixes = tuple(names)
+        self.every = max(1, every)
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not record.name.startswith(self.prefixes):
+            return True
+        counter = self._counters.setdefault(record.name, itertools.count())
+        return next(counter) % self.every == 0
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': _TOKEN_RE.sub('bot<token>', record.getMessage()),
+        }
+        if getattr(record, 'correlation_id', None):
+            entry['cid'] = record.correlation_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, który nie formatuje wiadomości w wątku wołającym.
+
+    Standardowy `prepare` skleja komunikat przez formatter; my tylko
+    podstawiamy argumenty (mogą być zmiennymi obiektami) i zamieniamy
+    wyjątek na tekst - resztę robi JsonFormatter w wątku listenera.
+    """
+
+    def prepare(self, record):
+        # Bez kopii rekordu (jak w QueueHandler) - root ma tylko ten jeden handler
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup(level: str = 'INFO', log_file: str | None = None, max_bytes: int = 10 * 1024 * 1024,
+          backups: int = 5, sample_every: int = 100) -> logging.handlers.QueueListener:
+    """Konfiguruje logowanie: JSON na stderr albo do rotowanego pliku, przez kolejkę."""
+    if log_file:
+        target = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                                      encoding='utf-8')
+    else:
+        target = logging.StreamHandler()
+    target.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    # Na handlerze, nie na loggerach: filtr loggera nie działa dla rekordów z loggerów potomnych
+    handler.addFilter(SamplingFilter(SAMPLED_LOGGERS, sample_every))
+    handler.addFilter(CorrelationFilter())
+    listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return listener
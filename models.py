@@ -0,0 +1,96 @@
+"""Modele wierszy: zadania, pomysły i przypomnienia.
+
+Dataclassy ze `__slots__` - bez słownika na każdą instancję, dostęp do
+pól przez atrybut. Zapytania w database.py wybierają tylko potrzebne
+kolumny, zawsze w kolejności pól modelu (`columns(Model, upto=...)`),
+więc wiersz powstaje wprost z krotki SQLite: `Model(*row)`. Pola spoza
+projekcji zostają przy wartościach domyślnych.
+
+Kolejność pól = od najczęściej potrzebnych; pełny wiersz (cache,
+pojedynczy odczyt) to wszystkie pola. `row['content']` działa jak dla
+sqlite3.Row i słowników silnika w pamięci.
+"""
+from dataclasses import dataclass, field, fields
+from itertools import starmap
+
+class _Row:
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+@dataclass(slots=True)
+class Task(_Row):
+    id: int
+    content: str
+    priority: int = 0
+    category: str | None = None
+    parent_id: int | None = None
+    due_at: str | None = None
+    effort_minutes: int | None = None
+    is_done: int = 0
+    score: float = 0
+    created_at: str | None = None
+    depth: int = 0  # tylko w poddrzewie (względem korzenia), nie jest kolumną tabeli
+
+@dataclass(slots=True)
+class Idea(_Row):
+    id: int
+    content: str
+    category: str | None = None
+    created_at: str | None = None
+    next_review: str | None = None  # powroty pomysłów (review.py)
+    review_reps: int = 0
+    review_interval: int = 0
+    review_ease: float = 2.5
+    archived: int = 0
+
+@dataclass(slots=True)
+class Reminder(_Row):
+    id: int
+    content: str
+    remind_at: str | None = None
+    state: int = 0
+    nag_count: int = 0
+    attempts: int = 0
+    priority: int = 0
+    is_sent: int = 0
+    claim_token: str | None = None
+    claimed_until: str | None = None
+    created_at: str | None = None
+
+@dataclass(slots=True)
+class RecurringReminder(_Row):
+    id: int
+    content: str
+    schedule_type: str = ''
+    schedule_days: str | None = None
+    schedule_time: str = ''
+    next_run: str | None = None
+    created_at: str | None = None  # początek serii w kanale iCalendar (icsfeed.py)
+    attempts: int = 0
+    priority: int = 0
+    is_active: int = 1
+    claim_token: str | None = None
+    claimed_until: str | None = None
+
+@dataclass(slots=True)
+class JournalEntry(_Row):
+    """Operacja z dziennika zmian (tabela journal); w koszu z listą usuniętych wierszy."""
+    id: int
+    op: str
+    summary: str | None = None
+    created_at: str | None = None
+    items: list = field(default_factory=list)  # [(tabela, id, treść)]
+
+def columns(model, upto: str | None = None, table: str = '') -> str:
+    """Lista kolumn SQL: pola modelu do `upto` włącznie (wszystkie, gdy None), opcjonalnie z aliasem tabeli."""
+    names = [f.name for f in fields(model) if f.name != 'depth']
+    if upto is not None:
+        names = names[:names.index(upto) + 1]
+    prefix = f"{table}." if table else ''
+    return ', '.join(prefix + name for name in names)
+
+def build(model, rows) -> list:
+    """Krotki z zapytania (kolumny z `columns`) -> lista modeli."""
+    return list(starmap(model, rows))
@@ -0,0 +1,126 @@
+"""Profilowanie działającego bota na żądanie (/profil, /pamiec).
+
+- `SamplingProfiler`: osobny wątek co `interval` sekund odczytuje stos
+  wątku pętli zdarzeń (`sys._current_frames`) i zlicza identyczne stosy.
+  Wynik: top funkcji bota (handlery, database.py, storage.py...) i plik
+  w formacie "collapsed stacks" (flamegraph.pl, speedscope, inferno).
+- `MemoryTracker`: `tracemalloc` z migawką bazową przy starcie; raport
+  pokazuje linie kodu, które od tego momentu zaalokowały najwięcej.
+
+Gdy nic nie jest włączone, nie działa żaden wątek ani hook - zerowy narzut.
+"""
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005     # 200 próbek/s
+MAX_SECONDS = 600            # zapomniany profiler sam się zatrzymuje
+TOP_N = 15
+TRACEMALLOC_FRAMES = 10
+
+# Moduły bota - po nich przypisujemy czas do handlerów i funkcji bazy
+APP_MODULES = {
+    'bot', 'database', 'storage', 'sender', 'scoring', 'similarity', 'attachments', 'dateparse',
+    'keyboards', 'logconfig', 'recording', 'models', 'render', 'icsfeed', 'httpserver', 'health',
+    'textsync', 'gate', 'shutdown', 'review',
+}
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+class SamplingProfiler:
+    def __init__(self, interval: float = DEFAULT_INTERVAL, max_seconds: float = MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = Counter()  # stos (od najbardziej zewnętrznej ramki) -> liczba próbek
+        self.started_at = None
+        self.duration = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id: int | None = None):
+        """Zaczyna próbkowanie wątku `thread_id` (domyślnie bieżącego - pętli zdarzeń)."""
+        if self.running:
+            return
+        self.samples = Counter()
+        self.started_at = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(thread_id or threading.get_ident(),),
+                                        name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, thread_id: int):
+        deadline = self.started_at + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+        self.duration = time.monotonic() - self.started_at
+
+    def total(self) -> int:
+        return sum(self.samples.values())
+
+    def busy(self) -> int:
+        """Próbki, w których wykonywał się kod bota (reszta to głównie czekanie pętli na I/O)."""
+        return sum(n for stack, n in self.samples.items() if any(_is_app(label) for label in stack))
+
+    def top(self, limit: int = TOP_N) -> list:
+        """[(funkcja, próbki włącznie z wywołanymi)] dla funkcji z modułów bota."""
+        inclusive = Counter()
+        for stack, n in self.samples.items():
+            for label in {label for label in stack if _is_app(label)}:
+                inclusive[label] += n
+        return inclusive.most_common(limit)
+
+    def collapsed(self) -> str:
+        """Format "ramka;ramka;ramka liczba" - wejście flamegraph.pl / speedscope."""
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in self.samples.most_common())
+
+def _is_app(label: str) -> bool:
+    return label.split(':', 1)[0] in APP_MODULES
+
+class MemoryTracker:
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self._baseline = None
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not self.running:
+            tracemalloc.start(self.frames)
+        self._baseline = tracemalloc.take_snapshot()
+
+    def stop(self):
+        tracemalloc.stop()
+        self._baseline = None
+
+    def report(self, limit: int = TOP_N) -> tuple[int, int, list]:
+        """(bieżąca pamięć, szczyt, [StatisticDiff]) - najwięcej zaalokowane od startu."""
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        stats = snapshot.compare_to(self._baseline.filter_traces(filters), 'lineno')
+        current, peak = tracemalloc.get_traced_memory()
+        return current, peak, stats[:limit]
@@ -0,0 +1,105 @@
+"""Nagrywanie ruchu bota do pliku JSON-lines - do odtworzenia przez replay.py.
+
+Włączane zmienną FOCUSBOT_RECORD=<plik>. Zapisujemy:
+- przychodzące aktualizacje (pełny JSON `Update`) z czasem nadejścia
+  i czasem obsługi,
+- wywołania Bot API (metoda, parametry, sukces, czas) z identyfikatorem
+  korelacji - po nim replay wie, które wywołania były odpowiedzią na
+  którą aktualizację.
+
+Plik jest tylko dopisywany (jedna linia = jeden zwarty wpis JSON). Przy
+zakładaniu nowego pliku obok zapisujemy migawkę bazy (<plik>.db), żeby
+replay startował od tego samego stanu.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from telegram.request import BaseRequest
+
+import logconfig
+
+FORMAT_VERSION = 1
+
+def snapshot_path(path: str) -> str:
+    """Ścieżka migawki bazy zapisanej obok nagrania."""
+    return path + '.db'
+
+class Recorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        if self.is_new:
+            self._write({'k': 'start', 't': time.time(), 'v': FORMAT_VERSION})
+
+    def snapshot(self, db_path: str):
+        """Migawka bazy dla nowego nagrania (API backup - spójna także w trybie WAL)."""
+        if not self.is_new:
+            return
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(snapshot_path(self.path))
+        source.backup(target)
+        target.close()
+        source.close()
+
+    def _write(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def record_update(self, update, started: float, duration_ms: float):
+        self._write({'k': 'u', 't': started, 'cid': logconfig.correlation_id.get(), 'ms': duration_ms,
+                     'u': update.to_dict()})
+
+    def record_call(self, method: str, params: dict, ok: bool, started: float, duration_ms: float):
+        self._write({'k': 'c', 't': started, 'cid': logconfig.correlation_id.get(), 'm': method,
+                     'p': params, 'ok': ok, 'ms': duration_ms})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def read(path: str):
+    """Wpisy nagrania po kolei (słowniki); uszkodzona ostatnia linia jest pomijana."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+class RecordingRequest(BaseRequest):
+    """Warstwa HTTP bota, która zapisuje każde wywołanie Bot API do nagrania."""
+
+    def __init__(self, inner: BaseRequest, recorder: Recorder):
+        self._inner = inner
+        self._recorder = recorder
+
+    @property
+    def read_timeout(self):
+        return self._inner.read_timeout
+
+    async def initialize(self):
+        await self._inner.initialize()
+
+    async def shutdown(self):
+        await self._inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        started, start = time.time(), time.perf_counter()
+        ok = False
+        try:
+            code, payload = await self._inner.do_request(url, method, request_data, read_timeout, write_timeout,
+                                                         connect_timeout, pool_timeout)
+            ok = 200 <= code < 300
+            return code, payload
+        finally:
+            self._recorder.record_call(url.rsplit('/', 1)[-1], request_data.parameters if request_data else {},
+                                       ok, started, round((time.perf_counter() - start) * 1000, 2))
@@ -0,0 +1,365 @@
+"""Składanie wiadomości bota: escapowanie, szablony odpowiedzi, podział na części.
+
+Odpowiedzi idą w trybie HTML (`PARSE_MODE`). Treść od użytkownika -
+zadania, pomysły, przypomnienia, kategorie - zawsze przechodzi przez
+`escape`/`bold`/`code`..., więc `_`, `*`, `<` czy backtick w zadaniu nie
+tworzą encji i Telegram nie odrzuca wiadomości (w jobie przypomnień
+odrzucona wiadomość to niedostarczone przypomnienia).
+
+Długość: Telegram przyjmuje MAX_MESSAGE_LENGTH znaków UTF-16 po
+zinterpretowaniu encji. Szablony składają wiadomość z linii, a encje
+nigdy nie przechodzą przez koniec linii: treść elementu listy jest
+skracana do MAX_ITEM_LENGTH i spłaszczana do jednej linii. `split`
+dzieli więc wiadomość między liniami i każda część jest poprawna.
+"""
+import datetime
+import re
+
+import scoring
+
+MAX_MESSAGE_LENGTH = 4096
+MAX_ITEM_LENGTH = 300    # treść elementu listy
+MAX_TEXT_LENGTH = 3500   # pojedyncza treść w wiadomości (podgląd do edycji, przypomnienie)
+ELLIPSIS = "…"
+
+DAY_NAMES = ['Pn', 'Wt', 'Śr', 'Cz', 'Pt', 'Sb', 'Nd']
+
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+# MarkdownV2: znak poprzedzony "\" albo znacznik encji
+_MARKDOWN_V2_RE = re.compile(r'\\(.)|[*_~`|]', re.DOTALL)
+
+class Markup:
+    """Znaczniki i escapowanie jednego trybu parse_mode.
+
+    `bold`, `italic`, `strike`, `code`, `pre` przyjmują surowy tekst
+    i same go escapują; `plain` odwraca znaczniki (widoczny tekst).
+    Escapowanie to łańcuch `str.replace` - przy kilku znakach szybszy
+    od `str.translate` ze słownikiem.
+    """
+
+    def __init__(self, parse_mode: str, escapes: list, code_escapes: list, tags: dict, plain):
+        self.parse_mode = parse_mode
+        self._escapes = escapes
+        self._code_escapes = code_escapes
+        # '<b>{}</b>' -> ('<b>', '</b>'): sklejanie jest tańsze od str.format
+        self._bold, self._italic, self._strike, self._code, self._pre = (
+            tuple(tags[name].split('{}')) for name in ('bold', 'italic', 'strike', 'code', 'pre'))
+        self._plain = plain
+
+    @staticmethod
+    def _replace(text, pairs: list) -> str:
+        text = str(text)
+        for old, new in pairs:
+            if old in text:
+                text = text.replace(old, new)
+        return text
+
+    def escape(self, text) -> str:
+        return self._replace(text, self._escapes)
+
+    def bold(self, text) -> str:
+        return f"{self._bold[0]}{self._replace(text, self._escapes)}{self._bold[1]}"
+
+    def italic(self, text) -> str:
+        return f"{self._italic[0]}{self._replace(text, self._escapes)}{self._italic[1]}"
+
+    def strike(self, text) -> str:
+        return f"{self._strike[0]}{self._replace(text, self._escapes)}{self._strike[1]}"
+
+    def code(self, text) -> str:
+        return f"{self._code[0]}{self._replace(text, self._code_escapes)}{self._code[1]}"
+
+    def pre(self, text) -> str:
+        return f"{self._pre[0]}{self._replace(text, self._code_escapes)}{self._pre[1]}"
+
+    def plain(self, markup: str) -> str:
+        """Widoczny tekst wiadomości - do liczenia długości po stronie Telegrama."""
+        return self._plain(markup)
+
+# "&" pierwszy przy escapowaniu, ostatni przy odwracaniu - inaczej podwójna zamiana
+_HTML_ESCAPES = [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')]
+_HTML_UNESCAPES = [(new, old) for old, new in reversed(_HTML_ESCAPES)]
+
+def _html_plain(markup: str) -> str:
+    if '<' in markup:
+        markup = _HTML_TAG_RE.sub('', markup)
+    return Markup._replace(markup, _HTML_UNESCAPES) if '&' in markup else markup
+
+HTML = Markup(
+    'HTML', _HTML_ESCAPES, _HTML_ESCAPES,
+    {'bold': '<b>{}</b>', 'italic': '<i>{}</i>', 'strike': '<s>{}</s>',
+     'code': '<code>{}</code>', 'pre': '<pre>{}</pre>'},
+    _html_plain,
+)
+# "\\" pierwszy - escapowanie dokłada kolejne backslashe
+MARKDOWN_V2 = Markup(
+    'MarkdownV2', [(ch, '\\' + ch) for ch in '\\_*[]()~`>#+-=|{}.!'], [(ch, '\\' + ch) for ch in '\\`'],
+    {'bold': '*{}*', 'italic': '_{}_', 'strike': '~{}~', 'code': '`{}`', 'pre': '```\n{}\n```'},
+    lambda markup: _MARKDOWN_V2_RE.sub(lambda match: match.group(1) or '', markup),
+)
+
+# Tryb odpowiedzi bota - szablony poniżej używają jego znaczników
+MARKUP = HTML
+PARSE_MODE = MARKUP.parse_mode
+escape, bold, italic, strike = MARKUP.escape, MARKUP.bold, MARKUP.italic, MARKUP.strike
+code, pre = MARKUP.code, MARKUP.pre
+
+# --- Długość ---
+
+def utf16_len(text: str) -> int:
+    """Długość tak, jak liczy ją Telegram (jednostki UTF-16 - emoji to 2)."""
+    return len(text.encode('utf-16-le')) // 2
+
+def clip(text: str, limit: int = MAX_ITEM_LENGTH, single_line: bool = True) -> str:
+    """Skraca surową treść (przed escapowaniem); `single_line` - łamania linii na spacje."""
+    if single_line and '\n' in text:
+        text = ' '.join(text.split())
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rstrip() + ELLIPSIS
+
+def split(text: str, limit: int = MAX_MESSAGE_LENGTH, markup: Markup = MARKUP) -> list:
+    """Dzieli wiadomość na części mieszczące się w limicie - tylko między liniami.
+
+    Linia dłuższa od limitu (nie powstaje w szablonach) jest wysyłana jako
+    zwykły tekst pocięty na kawałki - bez znaczników, ale zawsze poprawna.
+    """
+    if utf16_len(text) <= limit:
+        return [text]
+    step = limit // 2  # tyle znaków to na pewno najwyżej `limit` jednostek UTF-16
+    chunks, current, size = [], [], 0
+    for line in text.split('\n'):
+        plain = markup.plain(line)
+        length = utf16_len(plain) + 1
+        if length > limit:
+            pieces = [(markup.escape(plain[i:i + step]), utf16_len(plain[i:i + step]) + 1)
+                      for i in range(0, len(plain), step)]
+        else:
+            pieces = [(line, length)]
+        for piece, length in pieces:
+            if current and size + length > limit:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += length
+    if current:
+        chunks.append('\n'.join(current))
+    # Telegram odrzuca puste wiadomości - część z samych pustych linii pomijamy
+    return [chunk.strip('\n') for chunk in chunks if chunk.strip()]
+
+def truncate(text: str, limit: int = MAX_MESSAGE_LENGTH, markup: Markup = MARKUP) -> str:
+    """Pierwsza część wiadomości z "…" - gdy nie da się wysłać kilku (edycja wiadomości)."""
+    chunks = split(text, limit - 2, markup)
+    return chunks[0] if len(chunks) == 1 else f"{chunks[0]}\n{ELLIPSIS}"
+
+# --- Elementy ---
+
+def task_schedule(due_at, effort_minutes) -> str:
+    """' 📅 15.11 ~1h30m' - termin i wysiłek zadania (pusty tekst, gdy brak)."""
+    suffix = ""
+    if due_at:
+        if isinstance(due_at, str):
+            due_at = datetime.datetime.fromisoformat(due_at)
+        overdue = "❗" if due_at < datetime.datetime.now() else ""
+        suffix += f" {overdue}📅 {due_at.strftime('%d.%m')}"
+    if effort_minutes:
+        hours, minutes = divmod(effort_minutes, 60)
+        suffix += " ~" + (f"{hours}h" if hours else "") + (f"{minutes}m" if minutes else "")
+    return suffix
+
+def schedule_description(schedule_type: str, days: str | None, time_str: str) -> str:
+    """Opis harmonogramu cyklicznego przypomnienia (zwykły tekst)."""
+    if schedule_type == 'daily':
+        return f"codziennie o {time_str}"
+    elif schedule_type == 'weekdays':
+        day_indices = [int(d) for d in days.split(',')]
+        if day_indices == [0, 1, 2, 3, 4]:
+            return f"Pn-Pt o {time_str}"
+        day_str = ', '.join(DAY_NAMES[d] for d in day_indices)
+        return f"{day_str} o {time_str}"
+    elif schedule_type == 'weekly':
+        day_idx = int(days)
+        return f"co tydzień ({DAY_NAMES[day_idx]}) o {time_str}"
+    elif schedule_type == 'custom_days':
+        day_indices = [int(d) for d in days.split(',')]
+        day_str = ', '.join(DAY_NAMES[d] for d in day_indices)
+        return f"{day_str} o {time_str}"
+    elif schedule_type == 'monthly':
+        return f"co miesiąc ({days}.) o {time_str}"
+    return time_str
+
+def category_tag(category: str | None) -> str:
+    """' #praca' jako kod (pusty tekst bez kategorii)."""
+    return f" {code(clip('#' + category))}" if category else ""
+
+def attachment_suffix(count: int | None) -> str:
+    """' 📎' / ' 📎3' - element ma załączniki."""
+    if not count:
+        return ""
+    return " 📎" if count == 1 else f" 📎{count}"
+
+def task_line(task, depth: int = 0, progress: tuple | None = None, blocked: bool = False,
+              clips: int | None = None) -> str:
+    """Zadanie w jednej linii: priorytet, kategoria, termin, postęp podzadań, miejsce w drzewie."""
+    suffix = category_tag(task.category)
+    if task.due_at or task.effort_minutes:
+        suffix += task_schedule(task.due_at, task.effort_minutes)
+    if progress:
+        done, total = progress
+        suffix += f" ({done}/{total}, {done * 100 // total}%)"
+    suffix += attachment_suffix(clips)
+    indent = "    " * (depth - 1) + "↳ " if depth else ""
+    lock = "🔒 " if blocked else ""
+    content = clip(task.content)
+    if task.priority:
+        return (f"{indent}{lock}{'🔴' * min(task.priority, scoring.MAX_PRIORITY)} "
+                f"{code(task.id)}. {bold(content)}{suffix}")
+    return f"{indent}{lock}{code(task.id)}. {escape(content)}{suffix}"
+
+def idea_line(idea, clips: int | None = None) -> str:
+    return f"{code(idea.id)}. {escape(clip(idea.content))}{category_tag(idea.category)}{attachment_suffix(clips)}"
+
+def nag_suffix(reminder) -> str:
+    """' (🔁 2)' dla przypomnienia wysyłanego ponownie, bo nie zostało potwierdzone."""
+    return f" (🔁 {reminder.nag_count})" if reminder.nag_count else ""
+
+# --- Wiadomości ---
+
+def list_header(category: str | None, categories: list) -> str:
+    """Nagłówek /lista: filtr albo centrum dowodzenia z listą kategorii."""
+    if category:
+        return f"📋 {bold(clip(f'FILTR: #{category}'))}"
+    header = f"📋 {bold('CENTRUM DOWODZENIA')}"
+    if categories:
+        header += f"\n\n🏷️ Kategorie: {', '.join(code(clip('#' + c)) for c in categories)}"
+    return header
+
+def task_list(header: str, tasks: list, ideas: list, progress: dict, blocked: set,
+              task_clips: dict, idea_clips: dict, prompt: str | None = None) -> str:
+    """Lista zadań (drzewo w kolejności z order_task_tree) i pomysłów pod nagłówkiem `header` (HTML)."""
+    lines = [header, "", f"📌 {bold('ZADANIA:')}"]
+    if tasks:
+        depths = {}
+        for t in tasks:
+            depths[t.id] = depths[t.parent_id] + 1 if t.parent_id in depths else 0
+            lines.append(task_line(t, depths[t.id], progress.get(t.id), t.id in blocked, task_clips.get(t.id)))
+    else:
+        lines.append("(pusto)")
+    lines += ["", f"💡 {bold('POMYSŁY:')}"]
+    if ideas:
+        lines.extend(idea_line(i, idea_clips.get(i.id)) for i in ideas)
+    else:
+        lines.append("(pusto)")
+    if prompt:
+        lines += ["", prompt]
+    return "\n".join(lines)
+
+def next_actions(tasks: list) -> str:
+    """/teraz - najważniejsze zadania do zrobienia od razu."""
+    return "\n".join([f"🎯 {bold('TERAZ')}", "", *map(task_line, tasks)])
+
+def briefing(tasks: list) -> str:
+    """Poranny raport z aktywnymi zadaniami."""
+    if not tasks:
+        return "☀️ Dzień dobry! Czysta karta na dziś."
+    return "\n".join([f"☀️ {bold('PORANNY RAPORT')}", "", f"Masz {len(tasks)} zadań:", *map(task_line, tasks),
+                      "", f"Użyj {code('/zrobione <nr>')}, aby odhaczyć."])
+
+def reminder_digest(reminders: list, recurring: list) -> str:
+    """Jedna wiadomość dla wszystkich przypomnień z okna digestu."""
+    if len(reminders) + len(recurring) == 1:
+        if reminders:
+            r = reminders[0]
+            return f"⏰ {bold('PRZYPOMNIENIE')}{nag_suffix(r)}\n\n{escape(clip(r.content, MAX_TEXT_LENGTH, False))}"
+        r = recurring[0]
+        schedule_desc = schedule_description(r.schedule_type, r.schedule_days, r.schedule_time)
+        return (f"🔄 {bold('PRZYPOMNIENIE')} ({escape(schedule_desc)})\n\n"
+                f"{escape(clip(r.content, MAX_TEXT_LENGTH, False))}")
+
+    lines = [f"📬 {bold(f'PRZYPOMNIENIA ({len(reminders) + len(recurring)})')}", ""]
+    for r in reminders:
+        lines.append(f"⏰ {code(r.id)}. {escape(clip(r.content))}{nag_suffix(r)}")
+    for r in recurring:
+        schedule_desc = schedule_description(r.schedule_type, r.schedule_days, r.schedule_time)
+        lines.append(f"🔄 {escape(clip(r.content))} {italic(f'({schedule_desc})')}")
+    return "\n".join(lines)
+
+def reminder_list(reminders: list, state_icons: dict) -> str:
+    """/przypomnienia - aktywne przypomnienia z godziną i stanem (ikona z `state_icons`)."""
+    lines = [f"⏰ {bold('AKTYWNE PRZYPOMNIENIA')}", ""]
+    for r in reminders:
+        remind_at = datetime.datetime.fromisoformat(r.remind_at)
+        icon = state_icons.get(r.state, "🕐")
+        lines.append(f"{code(r.id)}. {escape(clip(r.content))} — {icon} "
+                     f"{remind_at.strftime('%H:%M')} ({remind_at.strftime('%d.%m')})")
+    return "\n".join(lines)
+
+def recurring_list(reminders: list) -> str:
+    """/cykliczne - harmonogram i następny termin każdego cyklicznego przypomnienia."""
+    lines = [f"🔄 {bold('CYKLICZNE PRZYPOMNIENIA')}", ""]
+    for r in reminders:
+        schedule_desc = schedule_description(r.schedule_type, r.schedule_days, r.schedule_time)
+        next_run = datetime.datetime.fromisoformat(r.next_run)
+        lines += [f"{code(r.id)}. {escape(clip(r.content))}", f"    🗓️ {escape(schedule_desc)}",
+                  f"    ⏭️ {next_run.strftime('%d.%m %H:%M')}", ""]
+    lines.append(f"Usuń: {code('/usun-cykl <nr>')}")
+    return "\n".join(lines)
+
+def history(tasks: list, limit: int) -> str:
+    """/historia - ostatnie ukończone zadania."""
+    return "\n".join([f"📜 {bold(f'HISTORIA (ostatnie {limit})')}", "",
+                      *(f"✅ {strike(clip(t.content))}" for t in tasks)])
+
+def idea_review(ideas: list) -> str:
+    """Dzienna porcja pomysłów do przejrzenia (review.py), z datą dodania."""
+    lines = [f"💡 {bold(f'POMYSŁY DO PRZEJRZENIA ({len(ideas)})')}", ""]
+    for idea in ideas:
+        added = f" — {italic(f'z {_utc_date(idea.created_at)}')}" if idea.created_at else ""
+        lines.append(f"{idea_line(idea)}{added}")
+    lines += ["", italic("👍 zostaw • 💤 nie teraz • 📌 do zadań • 🗄️ archiwum")]
+    return "\n".join(lines)
+
+def _utc_date(created_at: str) -> str:
+    # CURRENT_TIMESTAMP w SQLite jest w UTC
+    moment = datetime.datetime.fromisoformat(created_at).replace(tzinfo=datetime.timezone.utc).astimezone()
+    return moment.strftime('%d.%m.%Y')
+
+# Operacje dziennika zmian (database.py) w /cofnij i /kosz
+JOURNAL_OPS = {
+    'add_task': "dodanie zadania", 'add_idea': "dodanie pomysłu", 'done_task': "wykonanie zadania",
+    'delete_task': "usunięcie zadania", 'delete_idea': "usunięcie pomysłu",
+    'update_task': "edycja zadania", 'update_idea': "edycja pomysłu",
+    'add_dependency': "dodanie zależności", 'remove_dependency': "usunięcie zależności",
+    'add_reminder': "dodanie przypomnienia", 'snooze_reminder': "drzemka przypomnienia",
+    'complete_reminder': "potwierdzenie przypomnienia", 'delete_reminder': "usunięcie przypomnienia",
+    'add_recurring': "dodanie cyklicznego przypomnienia", 'delete_recurring': "usunięcie cyklicznego przypomnienia",
+    'add_attachment': "dodanie załącznika", 'sync': "synchronizacja z plikiem",
+    'review_idea': "ocena pomysłu", 'archive_idea': "archiwizacja pomysłu", 'promote_idea': "pomysł → zadanie",
+}
+_TRASH_ICONS = {'tasks': "📌", 'ideas': "💡", 'reminders': "⏰", 'recurring_reminders': "🔄"}
+
+def _journal_time(created_at: str) -> str:
+    # CURRENT_TIMESTAMP w SQLite jest w UTC
+    moment = datetime.datetime.fromisoformat(created_at).replace(tzinfo=datetime.timezone.utc).astimezone()
+    return moment.strftime('%d.%m %H:%M')
+
+def undone(entries: list, title: str = "Cofnięto:") -> str:
+    """/cofnij i /kosz <nr> - cofnięte operacje (models.JournalEntry), od najnowszej."""
+    lines = [f"↩️ {bold(title)}"]
+    for e in entries:
+        summary = f": {escape(clip(e.summary))}" if e.summary else ""
+        lines.append(f"• {JOURNAL_OPS.get(e.op, e.op)}{summary}")
+    return "\n".join(lines)
+
+def trash(entries: list) -> str:
+    """/kosz - ostatnie usunięcia z numerem wpisu do przywrócenia."""
+    lines = [f"🗑️ {bold('KOSZ')}", ""]
+    for e in entries:
+        if not e.items:
+            continue
+        table, row_id, content = e.items[0]
+        more = f" {italic(f'(+{len(e.items) - 1} podzad.)')}" if len(e.items) > 1 else ""
+        lines.append(f"{code(e.id)}. {_TRASH_ICONS.get(table, '•')} #{row_id} {escape(clip(content))}{more}"
+                     f" — {_journal_time(e.created_at)}")
+    lines += ["", f"Przywróć: {code('/kosz <nr>')} • Cofnij ostatnie: {code('/cofnij [ile]')}"]
+    return "\n".join(lines)
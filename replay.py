@@ -0,0 +1,214 @@
+"""Odtwarzanie nagranego ruchu (FOCUSBOT_RECORD) offline.
+
+    python replay.py nagranie.jsonl [--db focus_bot.db] [--speed 1] [--chat-id ID]
+
+- Baza: kopia robocza migawki nagrania (<nagranie>.db) albo bazy z --db;
+  oryginał nie jest zmieniany.
+- Aktualizacje przechodzą przez te same handlery co w `python bot.py`
+  (`bot.build_application`), a Bot API zastępuje atrapa (`StubRequest`),
+  która odpowiada sukcesem i zbiera wywołania.
+- --speed 1 zachowuje odstępy z nagrania (2 = dwa razy szybciej);
+  0 (domyślnie) - tak szybko, jak się da, bez limitów kolejki wychodzącej.
+- Na koniec: różnice wywołań Bot API (nagranie vs odtworzenie) dla każdej
+  aktualizacji i profil opóźnień per komenda. Kod wyjścia 1, gdy są różnice.
+
+Joby (przypomnienia, poranny raport) nie są uruchamiane - odtwarzamy tylko
+aktualizacje. Odpowiedzi zależne od bieżącej daty mogą się różnić.
+"""
+import argparse
+import asyncio
+import difflib
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+import logconfig
+import recording
+
+MEDIA_KEYS = ('voice', 'audio', 'photo', 'video', 'video_note', 'document')
+UNLIMITED_RATE = 1e9
+
+class StubRequest(BaseRequest):
+    """Atrapa Bot API: zapisuje wywołania (per identyfikator korelacji) i odpowiada sukcesem."""
+
+    def __init__(self):
+        self.calls = defaultdict(list)
+        self._message_ids = itertools.count(1_000_000)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        name = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[logconfig.correlation_id.get()].append({'m': name, 'p': params})
+        if name == 'getFile':
+            # Pliki nie są dostępne offline - BlobStore zaloguje błąd pobrania
+            body = {'ok': False, 'error_code': 400, 'description': "Bad Request: file is not available in replay"}
+            return 400, json.dumps(body).encode()
+        return 200, json.dumps({'ok': True, 'result': self._result(name, params)}).encode()
+
+    def _result(self, name: str, params: dict):
+        if name == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'FocusBot', 'username': 'focusbot_replay'}
+        if name.startswith(('send', 'edit')):
+            message = {
+                'message_id': params.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            }
+            if 'text' in params:
+                message['text'] = params['text']
+            return message
+        return True
+
+def update_kind(data: dict) -> str:
+    """Etykieta do profilu opóźnień: komenda, 'callback', 'attachment' albo 'text'."""
+    if data.get('callback_query'):
+        return 'callback'
+    message = data.get('message') or data.get('edited_message') or {}
+    text = message.get('text') or ''
+    if text.startswith('/'):
+        return text.split()[0].split('@')[0]
+    if any(key in message for key in MEDIA_KEYS):
+        return 'attachment'
+    return 'text' if text else 'other'
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+def copy_database(source: str, target: str):
+    """Kopia przez API backup SQLite - spójna także dla bazy w trybie WAL."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    src.backup(dst)
+    dst.close()
+    src.close()
+
+def _normalize(calls: list) -> list:
+    return [json.dumps({'m': c['m'], 'p': c['p']}, ensure_ascii=False, sort_keys=True) for c in calls]
+
+async def replay(app, updates: list, speed: float) -> list:
+    """Przepuszcza aktualizacje przez aplikację; zwraca [(wpis nagrania, czas obsługi w ms)]."""
+    results = []
+    first, wall_start = updates[0]['t'], time.perf_counter()
+    for entry in updates:
+        if speed:
+            delay = (entry['t'] - first) / speed - (time.perf_counter() - wall_start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.de_json(entry['u'], app.bot)
+        start = time.perf_counter()
+        await app.process_update(update)
+        results.append((entry, (time.perf_counter() - start) * 1000))
+    # Zadania w tle (np. pobieranie załączników) też mogą wysyłać wywołania
+    pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    if pending:
+        await asyncio.wait(pending, timeout=5)
+    return results
+
+def report(entries: list, results: list, stub: StubRequest, max_diffs: int) -> int:
+    """Wypisuje różnice i profil opóźnień; zwraca liczbę aktualizacji z różnicami."""
+    recorded = defaultdict(list)
+    for entry in entries:
+        # Nieudane próby (ponowione przez kolejkę wychodzącą) pomijamy
+        if entry['k'] == 'c' and entry['ok']:
+            recorded[entry['cid']].append(entry)
+
+    differing = 0
+    for entry, _ in results:
+        expected, actual = _normalize(recorded.get(entry['cid'], [])), _normalize(stub.calls.get(entry['cid'], []))
+        if expected == actual:
+            continue
+        differing += 1
+        if differing <= max_diffs:
+            print(f"--- {entry['cid']} ({update_kind(entry['u'])}) ---")
+            for line in difflib.unified_diff(expected, actual, 'nagranie', 'odtworzenie', lineterm='', n=1):
+                print(line)
+    print(f"\nZgodne odpowiedzi: {len(results) - differing}/{len(results)}")
+
+    by_kind = defaultdict(lambda: ([], []))
+    for entry, ms in results:
+        replayed, original = by_kind[update_kind(entry['u'])]
+        replayed.append(ms)
+        original.append(entry['ms'])
+    print(f"\n{'Opóźnienia [ms]':<20}{'n':>6}{'p50':>9}{'p95':>9}{'max':>9}{'p50 nagr.':>11}")
+    for kind, (replayed, original) in sorted(by_kind.items(), key=lambda item: -len(item[1][0])):
+        print(f"{kind:<20}{len(replayed):>6}{percentile(replayed, 0.5):>9.1f}{percentile(replayed, 0.95):>9.1f}"
+              f"{max(replayed):>9.1f}{percentile(original, 0.5):>11.1f}")
+    return differing
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Odtwarza nagranie FOCUSBOT_RECORD na kopii bazy.")
+    parser.add_argument('recording', help="plik nagrania (JSON-lines)")
+    parser.add_argument('--db', help="baza startowa (domyślnie migawka <nagranie>.db)")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="1 = tempo z nagrania, 2 = dwa razy szybciej, 0 = maksymalna prędkość (domyślnie)")
+    parser.add_argument('--chat-id', help="MY_CHAT_ID (domyślnie nadawca pierwszej aktualizacji)")
+    parser.add_argument('--max-diffs', type=int, default=20, help="ile różnic wypisać")
+    args = parser.parse_args()
+
+    entries = list(recording.read(args.recording))
+    updates = sorted((e for e in entries if e['k'] == 'u'), key=lambda e: e['t'])
+    if not updates:
+        print("Nagranie nie zawiera aktualizacji.")
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix='focusbot-replay-')
+    scratch = os.path.join(workdir, 'focus_bot.db')
+    source = args.db or recording.snapshot_path(args.recording)
+    if os.path.exists(source):
+        copy_database(source, scratch)
+    else:
+        print(f"Brak {source} - start od pustej bazy.")
+
+    first = Update.de_json(updates[0]['u'], None)
+    chat_id = args.chat_id or (str(first.effective_user.id) if first.effective_user else "0")
+    # Przed importem bot.py: konfiguracja czytana jest przy imporcie (load_dotenv nie nadpisuje zmiennych)
+    os.environ['MY_CHAT_ID'] = chat_id
+    os.environ['FOCUSBOT_RECORD'] = ""
+    os.environ['ATTACHMENTS_DIR'] = os.path.join(workdir, 'attachments')
+    os.environ.setdefault('TELEGRAM_TOKEN', "0:replay")
+    os.environ.setdefault('LOG_LEVEL', "WARNING")
+    import database as db
+    db.DB_NAME = scratch
+    import bot
+
+    async def run():
+        stub = StubRequest()
+        app = bot.build_application(request=stub)
+        await app.initialize()
+        bot.outbound.start(app.bot)
+        if not args.speed:
+            bot.outbound.set_rate_limits(UNLIMITED_RATE, UNLIMITED_RATE, UNLIMITED_RATE)
+        start = time.perf_counter()
+        results = await replay(app, updates, args.speed)
+        elapsed = time.perf_counter() - start
+        await app.shutdown()
+        span = updates[-1]['t'] - updates[0]['t']
+        print(f"Odtworzono {len(results)} aktualizacji w {elapsed:.2f} s (nagranie obejmuje {span:.0f} s), "
+              f"baza robocza: {scratch}\n")
+        return report(entries, results, stub, args.max_diffs)
+
+    return 1 if asyncio.run(run()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
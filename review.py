@@ -0,0 +1,46 @@
+"""Powroty pomysłów: interwały w stylu SM-2 (SuperMemo 2).
+
+Każdy pomysł ma stan powtórek: liczba udanych powrotów (`reps`), bieżący
+interwał w dniach i łatwość (`ease`, 2.5 na start, min. 1.3). Termin
+następnego pokazania leży w kolumnie `ideas.next_review` (indeks
+częściowy bez zarchiwizowanych), więc dzienna porcja to odczyt początku
+indeksu - O(k log n), bez przeglądania tabeli. Silnik w pamięci trzyma
+te same terminy w kopcu (storage.HeapIndex).
+
+Ocena z przycisku pod porcją:
+- 👍 zostaw (KEEP, q=4): interwał rośnie - 7 dni, 21 dni, potem razy `ease`,
+- 💤 nie teraz (LATER, q=2): powroty od nowa (7 dni), `ease` spada o 0.32,
+  więc kolejne interwały rosną wolniej,
+- do zadań / archiwum kończą powroty.
+Pomysł pokazany bez odpowiedzi wraca po PENDING_DAYS bez zmiany stanu.
+"""
+from datetime import datetime, timedelta
+
+FIRST_INTERVAL_DAYS = 7    # I(1): nowy pomysł wraca po tygodniu
+SECOND_INTERVAL_DAYS = 21  # I(2)
+MAX_INTERVAL_DAYS = 365
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+PENDING_DAYS = 3           # pokazany i bez odpowiedzi - wraca po tylu dniach
+BATCH_SIZE = 3             # pomysłów w dziennej porcji
+
+KEEP = 4
+LATER = 2
+
+def first_review(now: datetime) -> datetime:
+    """Termin pierwszego powrotu nowego pomysłu."""
+    return now + timedelta(days=FIRST_INTERVAL_DAYS)
+
+def next_state(reps: int, interval: int, ease: float, grade: int) -> tuple[int, int, float]:
+    """SM-2: (reps, interval w dniach, ease) po ocenie `grade` (0-5, >= 3 to udany powrót)."""
+    ease = max(MIN_EASE, round(ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02), 2))
+    if grade < 3:
+        return 0, FIRST_INTERVAL_DAYS, ease
+    reps += 1
+    if reps == 1:
+        interval = FIRST_INTERVAL_DAYS
+    elif reps == 2:
+        interval = SECOND_INTERVAL_DAYS
+    else:
+        interval = min(MAX_INTERVAL_DAYS, round(interval * ease))
+    return reps, interval, ease
@@ -0,0 +1,44 @@
+"""Punktacja zadań: priorytet, termin i szacowany wysiłek w jednej liczbie.
+
+Wynik trzymamy w kolumnie `tasks.score` (z indeksem), więc "co teraz?"
+to odczyt początku indeksu zamiast sortowania całej listy. Wynik zależy
+od czasu tylko przez termin - job co REFRESH_INTERVAL_SECONDS przelicza
+wyłącznie zadania z terminem.
+"""
+from datetime import datetime
+
+PRIORITY_WEIGHT = 10.0     # ! = 10, !! = 20, !!! = 30
+MAX_PRIORITY = 3
+DUE_WEIGHT = 40.0          # termin teraz (lub po terminie) = 40, za dobę = 20, za tydzień ~ 5.7
+DUE_SCALE_HOURS = 24.0
+OVERDUE_PER_DAY = 2.0      # każdy dzień zwłoki dokłada trochę, maks. OVERDUE_MAX
+OVERDUE_MAX = 10.0
+QUICK_WIN_WEIGHT = 5.0     # krótkie zadania lekko w górę: 15 min = 3.3, 1 h = 1.7
+QUICK_WIN_MINUTES = 30.0
+
+REFRESH_INTERVAL_SECONDS = 15 * 60
+
+def _as_datetime(value) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def task_score(priority: int, due_at, effort_minutes: int | None, now: datetime) -> float:
+    """Punkty zadania - im więcej, tym wyżej na liście.
+
+    Zaokrąglone do 0.1, żeby okresowe przeliczanie zapisywało tylko realne zmiany.
+    """
+    score = PRIORITY_WEIGHT * min(priority or 0, MAX_PRIORITY)
+    due_at = _as_datetime(due_at)
+    if due_at is not None:
+        hours_left = (due_at - now).total_seconds() / 3600
+        score += DUE_WEIGHT / (1 + max(0.0, hours_left) / DUE_SCALE_HOURS)
+        if hours_left < 0:
+            score += min(OVERDUE_MAX, OVERDUE_PER_DAY * -hours_left / 24)
+    if effort_minutes:
+        score += QUICK_WIN_WEIGHT * QUICK_WIN_MINUTES / (QUICK_WIN_MINUTES + effort_minutes)
+    return round(score, 1)
+
+def task_score_sql(priority, due_at, effort_minutes, now):
+    """Wersja dla `sqlite3.create_function` - `now` przychodzi jako tekst."""
+    return task_score(priority, due_at, effort_minutes, _as_datetime(now))
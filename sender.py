@@ -0,0 +1,227 @@
+"""Kolejka wiadomości wychodzących: kolejność per czat, limity, ponowienia.
+
+Wszystkie handlery i joby wysyłają przez `OutboundQueue.send(...)`:
+- każdy czat ma własną kolejkę obsługiwaną po kolei (zachowana kolejność),
+- limity jak w Telegramie: ~30 wiadomości/s globalnie, ~1/s na czat
+  (z małym zapasem na serię),
+- `RetryAfter` wstrzymuje całą wysyłkę na wskazany czas (flood control
+  dotyczy całego bota),
+- błędy sieci: ponowienia z wykładniczym backoffem i jitterem,
+- wiadomość, której nie udało się dostarczyć, trafia do tabeli
+  `dead_letters`, a wywołujący dostaje wyjątek,
+- przy zamykaniu procesu `drain` czeka na opróżnienie kolejek, a po
+  terminie przerywa resztę (wywołujący dostają `Aborted`).
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+import database as db
+import logconfig
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30          # wiadomości na sekundę dla całego bota
+PER_CHAT_RATE = 1.0       # wiadomości na sekundę w jednym czacie
+PER_CHAT_BURST = 3        # ile wiadomości czat może dostać "od razu"
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_CHAT_BUCKETS = 1000   # powyżej tej liczby usuwamy wiadra bezczynnych czatów
+
+class DeliveryFailed(TelegramError):
+    """Wiadomość nie wyszła mimo ponowień (zapisana w dead_letters)."""
+
+class Aborted(TelegramError):
+    """Wysyłka przerwana przy zamykaniu procesu - wiadomość nie wyszła albo nie wiadomo, czy wyszła."""
+
+class TokenBucket:
+    """Wiadro żetonów: średnio `rate`/s, seria do `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def try_acquire(self) -> bool:
+        """Bierze żeton, jeśli jest - bez czekania."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+def backoff_delay(attempt: int) -> float:
+    """Wykładniczy backoff z jitterem (0.5x-1.5x), maks. BACKOFF_MAX_SECONDS."""
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def _serialize(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False,
+                      default=lambda o: o.to_dict() if hasattr(o, 'to_dict') else str(o))
+
+class OutboundQueue:
+    def __init__(self):
+        self.bot = None
+        self._queues = {}
+        self._workers = {}
+        self._chat_buckets = {}
+        self._global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._per_chat_limits = (PER_CHAT_RATE, PER_CHAT_BURST)
+        self._paused_until = 0.0
+        self.closed = False
+
+    def start(self, bot):
+        """Podpina bota (po jego inicjalizacji) - od teraz kolejka może wysyłać."""
+        self.bot = bot
+        self.closed = False
+
+    def set_rate_limits(self, global_rate: float, per_chat_rate: float, per_chat_burst: float):
+        """Zmienia limity wysyłki (replay.py odtwarza ruch z maksymalną prędkością)."""
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._per_chat_limits = (per_chat_rate, per_chat_burst)
+        self._chat_buckets = {}
+
+    def pending(self) -> int:
+        """Liczba wiadomości czekających w kolejkach wszystkich czatów."""
+        return sum(len(q) for q in self._queues.values())
+
+    async def send(self, method: str, chat_id, **kwargs):
+        """Kolejkuje wywołanie Bot API (np. 'send_message') i czeka na wynik."""
+        if self.bot is None:
+            raise RuntimeError("OutboundQueue.start(bot) nie zostało wywołane")
+        if self.closed:
+            raise Aborted(f"{method} do {chat_id}: kolejka wychodząca zamknięta")
+        future = asyncio.get_running_loop().create_future()
+        # Worker czatu działa we własnym zadaniu - identyfikator korelacji niesiemy razem z wiadomością
+        entry = (method, kwargs, future, logconfig.correlation_id.get(), time.perf_counter())
+        self._queues.setdefault(chat_id, deque()).append(entry)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._drain_chat(chat_id))
+        return await future
+
+    async def drain(self, timeout: float) -> int:
+        """Czeka do `timeout` s na opróżnienie kolejek, potem przerywa resztę (`abort`).
+
+        Zwraca liczbę przerwanych wiadomości.
+        """
+        deadline = time.monotonic() + timeout
+        while self._workers and (left := deadline - time.monotonic()) > 0:
+            await asyncio.wait(list(self._workers.values()), timeout=left)
+        return self.abort()
+
+    def abort(self) -> int:
+        """Zamyka kolejkę: oczekujący (także wiadomość w trakcie wysyłki) dostają Aborted."""
+        self.closed = True
+        aborted = 0
+        for chat_id, queue in self._queues.items():
+            for _, _, future, _, _ in queue:
+                if not future.done():
+                    future.set_exception(Aborted(f"Wysyłka do {chat_id} przerwana przy zamykaniu"))
+                    aborted += 1
+            queue.clear()
+        for worker in self._workers.values():
+            worker.cancel()
+        if aborted:
+            logger.warning("Przerwano %d niewysłanych wiadomości", aborted)
+        return aborted
+
+    async def _drain_chat(self, chat_id):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                method, kwargs, future, correlation_id, queued_at = queue[0]
+                logconfig.bind(correlation_id)
+                try:
+                    result = await self._deliver(chat_id, method, kwargs)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    logger.info("Wysłano %s do %s", method, chat_id, extra={
+                        'duration_ms': round((time.perf_counter() - queued_at) * 1000, 2),
+                    })
+                    if not future.done():
+                        future.set_result(result)
+                queue.popleft()
+        finally:
+            del self._workers[chat_id]
+            if not queue:
+                del self._queues[chat_id]
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_full()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(*self._per_chat_limits)
+        return bucket
+
+    async def _deliver(self, chat_id, method: str, kwargs: dict):
+        bucket = self._chat_bucket(chat_id)
+        for attempt in range(MAX_ATTEMPTS):
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                return await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                delay = _retry_after_seconds(e)
+                logger.warning("Flood control: wstrzymuję wysyłkę na %.1fs", delay)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                last_error = e
+            except BadRequest as e:
+                # Błąd treści/żądania - ponowienie nic nie da
+                if 'not modified' not in str(e).lower():
+                    self._dead_letter(chat_id, method, kwargs, e, attempt + 1)
+                raise
+            except NetworkError as e:
+                delay = backoff_delay(attempt)
+                logger.warning("Błąd sieci przy %s (próba %d/%d), ponowienie za %.1fs: %s",
+                               method, attempt + 1, MAX_ATTEMPTS, delay, e)
+                last_error = e
+                if attempt + 1 < MAX_ATTEMPTS:
+                    await asyncio.sleep(delay)
+            except TelegramError as e:
+                # Forbidden (zablokowany bot) itp. - nie ponawiamy
+                self._dead_letter(chat_id, method, kwargs, e, attempt + 1)
+                raise
+
+        self._dead_letter(chat_id, method, kwargs, last_error, MAX_ATTEMPTS)
+        raise DeliveryFailed(f"{method} do {chat_id} nieudane po {MAX_ATTEMPTS} próbach: {last_error}")
+
+    def _dead_letter(self, chat_id, method: str, kwargs: dict, error: Exception, attempts: int):
+        logger.error("Dead letter: %s do %s po %d próbach: %s", method, chat_id, attempts, error)
+        try:
+            db.add_dead_letter(str(chat_id), method, _serialize(kwargs), repr(error), attempts)
+        except Exception:
+            logger.exception("Nie udało się zapisać dead letter")
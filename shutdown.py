@@ -0,0 +1,99 @@
+"""Łagodne zamknięcie procesu (SIGTERM/SIGINT) z limitem czasu.
+
+Kolejność (bot.py: lider w post_init/post_shutdown, worker w run_worker):
+1. Sygnał ustawia `requested`: nowe digesty przypomnień nie są już
+   rezerwowane, pętla workera kończy się, a lider przestaje pobierać
+   aktualizacje (Application.stop_running) - już pobrane obsługuje do końca.
+2. Drenaż: trwające joby i kolejka wychodząca mają czas do terminu
+   (`timeout` od sygnału). Wysyłka zakończona przed terminem jest
+   potwierdzana (ack) jak zwykle, więc przypomnienie nie zostaje wysłane
+   i niepotwierdzone.
+3. Po terminie `on_deadline` przerywa kolejkę wychodzącą (sender.Aborted),
+   a rezerwacje procesu są zwalniane od razu (database.release_claims) -
+   następny proces wyśle je w pierwszym przebiegu, bez czekania na
+   wygaśnięcie po CLAIM_LEASE_SECONDS.
+4. Checkpoint WAL i oddanie dzierżawy lidera.
+
+Drugi sygnał skraca drenaż do zera.
+"""
+import asyncio
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_SECONDS = 8  # poniżej domyślnych 10 s, po których `docker stop` wysyła SIGKILL
+SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+class Shutdown:
+    """Stan zamykania procesu; `on_deadline()` przerywa to, co nie zdążyło się skończyć."""
+
+    def __init__(self, on_deadline, timeout: float = TIMEOUT_SECONDS):
+        self.on_deadline = on_deadline
+        self.timeout = timeout
+        self.requested_at = None  # time.monotonic() pierwszego sygnału
+        self.expired = False
+        self._on_request = None
+        self._event = None
+        self._timer = None
+
+    @property
+    def requested(self) -> bool:
+        return self.requested_at is not None
+
+    def install(self, on_request=None) -> bool:
+        """Podpina SIGINT/SIGTERM w bieżącej pętli; False, gdy pętla tego nie umie (Windows)."""
+        loop = asyncio.get_running_loop()
+        # Lider po utracie dzierżawy wraca jako worker w nowej pętli - zdarzenie per pętla
+        self._event = asyncio.Event()
+        if self.requested:
+            self._event.set()
+        self._on_request = on_request
+        try:
+            for sig in SIGNALS:
+                loop.add_signal_handler(sig, self.request, sig)
+        except NotImplementedError:
+            return False
+        return True
+
+    def request(self, sig: signal.Signals = signal.SIGTERM):
+        """Początek zamykania (handler sygnału); kolejny sygnał kończy drenaż od razu."""
+        if self.requested:
+            logger.warning("Ponowny sygnał %s - przerywam drenaż", sig.name)
+            self._expire()
+            return
+        self.requested_at = time.monotonic()
+        logger.info("Sygnał %s - zamykanie, drenaż do %.0f s", sig.name, self.timeout)
+        if self._event is not None:
+            self._event.set()
+        self._timer = asyncio.get_running_loop().call_later(self.timeout, self._expire)
+        if self._on_request is not None:
+            self._on_request()
+
+    def _expire(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if not self.expired:
+            self.expired = True
+            logger.warning("Minął czas drenażu (%.0f s) - przerywam wysyłkę", self.timeout)
+            self.on_deadline()
+
+    def remaining(self) -> float:
+        """Sekundy do terminu drenażu (pełny limit, gdy zamknięcie nie przyszło z sygnału)."""
+        if self.expired:
+            return 0.0
+        if not self.requested:
+            return self.timeout
+        return max(0.0, self.timeout - (time.monotonic() - self.requested_at))
+
+    def elapsed(self) -> float | None:
+        return time.monotonic() - self.requested_at if self.requested else None
+
+    async def wait(self, timeout: float) -> bool:
+        """Śpi do `timeout` s albo do sygnału; True, gdy przyszedł sygnał."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.requested
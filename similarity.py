@@ -0,0 +1,109 @@
+"""Wykrywanie podobnych wpisów: MinHash + LSH na n-gramach znaków.
+
+"Kupić mleko" i "kupic mleko!" po normalizacji (małe litery, bez
+polskich znaków i interpunkcji) mają te same 3-gramy. Sygnatura MinHash
+(NUM_HASHES liczb) przybliża podobieństwo Jaccarda zbiorów 3-gramów, a
+podział sygnatury na BANDS pasm daje klucze do indeksu: wpisy mające
+choć jedno wspólne pasmo są kandydatami, które dopiero porównujemy.
+Sprawdzenie nowego wpisu to więc kilka odczytów z indeksu, niezależnie
+od liczby zapisanych wpisów.
+
+Sygnatury i klucze pasm leżą w SQLite (database.py) i są aktualizowane
+razem z treścią - indeksu nie odbudowujemy przy starcie. `LSHIndex` to
+ta sama struktura w pamięci dla silnika `memory`.
+"""
+import operator
+import random
+import re
+import struct
+import unicodedata
+import zlib
+
+SHINGLE_SIZE = 3
+NUM_HASHES = 64
+BANDS = 16                 # 16 pasm po 4 wartości - kandydat już od podobieństwa ~0.5
+ROWS = NUM_HASHES // BANDS
+SIMILARITY_THRESHOLD = 0.6
+MAX_SUGGESTIONS = 3
+
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+# Stałe ziarno: sygnatury są zapisywane w bazie, więc funkcje haszujące nie mogą się zmieniać
+_rng = random.Random(20260101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+_SIGNATURE = struct.Struct(f'>{NUM_HASHES}I')
+_BAND = struct.Struct(f'>{ROWS}I')
+
+_POLISH = str.maketrans({'ł': 'l', 'Ł': 'l'})  # ł nie rozkłada się przez NFKD
+
+def normalize(text: str) -> str:
+    """Małe litery, bez znaków diakrytycznych i interpunkcji, pojedyncze spacje."""
+    text = unicodedata.normalize('NFKD', text.translate(_POLISH).lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^\w]+', ' ', text).split())
+
+def shingles(text: str) -> set:
+    """Hasze (crc32) n-gramów znaków znormalizowanego tekstu."""
+    text = f" {normalize(text)} "
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode()) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def signature(text: str) -> tuple:
+    """Sygnatura MinHash: minimum każdej z NUM_HASHES permutacji po n-gramach."""
+    hashes = shingles(text)
+    return tuple(min([(a * x + b) % _PRIME for x in hashes]) & _MASK for a, b in _PERMUTATIONS)
+
+def band_keys(sig: tuple) -> list:
+    """Klucze pasm do indeksu LSH - numer pasma w górnych bitach, żeby pasma się nie mieszały."""
+    return [(band << 32) | zlib.crc32(_BAND.pack(*sig[band * ROWS:(band + 1) * ROWS]))
+            for band in range(BANDS)]
+
+def estimate(sig_a: tuple, sig_b: tuple) -> float:
+    """Przybliżone podobieństwo Jaccarda: odsetek zgodnych pozycji sygnatur."""
+    return sum(map(operator.eq, sig_a, sig_b)) / NUM_HASHES
+
+def pack(sig: tuple) -> bytes:
+    return _SIGNATURE.pack(*sig)
+
+def unpack(blob: bytes) -> tuple:
+    return _SIGNATURE.unpack(blob)
+
+def rank(sig: tuple, candidates, limit: int = MAX_SUGGESTIONS,
+         threshold: float = SIMILARITY_THRESHOLD) -> list:
+    """[(id, podobieństwo)] kandydatów (id, sygnatura) powyżej progu, od najbardziej podobnych."""
+    scored = [(row_id, estimate(sig, other)) for row_id, other in candidates]
+    scored = [(row_id, score) for row_id, score in scored if score >= threshold]
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
+
+class LSHIndex:
+    """Indeks LSH w pamięci: klucz pasma -> zbiór ID, ID -> sygnatura."""
+
+    def __init__(self):
+        self.signatures = {}
+        self.buckets = {}
+
+    def add(self, row_id: int, text: str):
+        self.remove(row_id)
+        sig = signature(text)
+        self.signatures[row_id] = sig
+        for key in band_keys(sig):
+            self.buckets.setdefault(key, set()).add(row_id)
+
+    def remove(self, row_id: int):
+        sig = self.signatures.pop(row_id, None)
+        if sig is None:
+            return
+        for key in band_keys(sig):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(row_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def candidates(self, sig: tuple) -> set:
+        found = set()
+        for key in band_keys(sig):
+            found |= self.buckets.get(key, set())
+        return found
@@ -0,0 +1,972 @@
+"""Warstwa przechowywania danych: repozytoria dla zadań, pomysłów i przypomnień.
+
+Trzy silniki o tym samym interfejsie:
+- `SqliteStorage`      - domyślny, deleguje do funkcji z `database.py`,
+- `MemoryStorage`      - czysto w pamięci, z posortowanymi indeksami pod
+                         gorące zapytania (testy, benchmarki),
+- `WriteThroughStorage` - odczyty z pamięci, zapisy przez SQLite; cache
+                         odświeżany przez `database.add_change_listener`.
+
+Wybór silnika: zmienna środowiskowa FOCUSBOT_STORAGE (sqlite | memory | writethrough).
+Write-through zakłada jeden proces - zmiany zapisane przez inne procesy
+(`bot.py --worker`) nie trafiają do jego cache.
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from heapq import heapify, heappop, heappush
+from datetime import datetime, timedelta, timezone
+
+import database as db
+import models
+import review
+import scoring
+import similarity
+
+# --- Interfejs ---
+
+class TaskRepository(ABC):
+    @abstractmethod
+    def add(self, content: str, priority: int = 0, category: str | None = None,
+            parent_id: int | None = None, due_at: datetime | None = None,
+            effort_minutes: int | None = None) -> int: ...
+    @abstractmethod
+    def list_active(self, category: str | None = None) -> list: ...
+    @abstractmethod
+    def list_completed(self, limit: int = 20) -> list: ...
+    @abstractmethod
+    def get(self, task_id: int): ...
+    @abstractmethod
+    def mark_done(self, task_id: int) -> bool: ...
+    @abstractmethod
+    def update(self, task_id: int, content: str, priority: int | None = None,
+               due_at: datetime | None = None, effort_minutes: int | None = None) -> bool: ...
+    @abstractmethod
+    def delete(self, task_id: int) -> bool: ...
+    @abstractmethod
+    def subtree(self, task_id: int) -> list: ...
+    @abstractmethod
+    def progress(self, task_ids=None) -> dict: ...
+    @abstractmethod
+    def add_dependency(self, task_id: int, blocked_by: int) -> bool: ...
+    @abstractmethod
+    def remove_dependency(self, task_id: int, blocked_by: int) -> bool: ...
+    @abstractmethod
+    def blocked_ids(self) -> set: ...
+    @abstractmethod
+    def list_unblocked(self, category: str | None = None, limit: int | None = None) -> list: ...
+    @abstractmethod
+    def refresh_scores(self, now: datetime | None = None) -> int: ...
+    @abstractmethod
+    def similar(self, content: str, limit: int = similarity.MAX_SUGGESTIONS) -> list: ...
+
+class IdeaRepository(ABC):
+    @abstractmethod
+    def add(self, content: str, category: str | None = None) -> int: ...
+    @abstractmethod
+    def list(self, category: str | None = None) -> list: ...
+    @abstractmethod
+    def get(self, idea_id: int): ...
+    @abstractmethod
+    def update(self, idea_id: int, content: str) -> bool: ...
+    @abstractmethod
+    def delete(self, idea_id: int) -> bool: ...
+    @abstractmethod
+    def similar(self, content: str, limit: int = similarity.MAX_SUGGESTIONS) -> list: ...
+    @abstractmethod
+    def due_for_review(self, now: datetime, limit: int = review.BATCH_SIZE) -> list: ...
+    @abstractmethod
+    def postpone_reviews(self, idea_ids: list, until: datetime) -> int: ...
+    @abstractmethod
+    def review(self, idea_id: int, grade: int, now: datetime) -> datetime | None: ...
+    @abstractmethod
+    def archive(self, idea_id: int) -> bool: ...
+
+class ReminderRepository(ABC):
+    @abstractmethod
+    def add(self, content: str, remind_at: datetime, priority: int = 0) -> int: ...
+    @abstractmethod
+    def list_active(self) -> list: ...
+    @abstractmethod
+    def claim_due(self, claim_token: str, limit: int = 50,
+                  lease_seconds: int = db.CLAIM_LEASE_SECONDS,
+                  due_before: datetime | None = None, urgent_only: bool = False) -> list: ...
+    @abstractmethod
+    def ack(self, reminder_ids: list, claim_token: str, nag_at: datetime) -> list: ...
+    @abstractmethod
+    def release(self, reminder_id: int, claim_token: str, attempts: int) -> bool: ...
+    @abstractmethod
+    def get(self, reminder_id: int): ...
+    @abstractmethod
+    def snooze(self, reminder_id: int, until: datetime) -> bool: ...
+    @abstractmethod
+    def complete(self, reminder_id: int) -> bool: ...
+    @abstractmethod
+    def delete(self, reminder_id: int) -> bool: ...
+
+class RecurringReminderRepository(ABC):
+    @abstractmethod
+    def add(self, content: str, schedule_type: str, schedule_days: str | None,
+            schedule_time: str, next_run: datetime, priority: int = 0) -> int: ...
+    @abstractmethod
+    def list_active(self) -> list: ...
+    @abstractmethod
+    def get(self, reminder_id: int): ...
+    @abstractmethod
+    def claim_due(self, claim_token: str, limit: int = 50,
+                  lease_seconds: int = db.CLAIM_LEASE_SECONDS,
+                  due_before: datetime | None = None, urgent_only: bool = False) -> list: ...
+    @abstractmethod
+    def ack(self, reminder_id: int, claim_token: str, next_run: datetime) -> bool: ...
+    @abstractmethod
+    def release(self, reminder_id: int, claim_token: str, attempts: int) -> bool: ...
+    @abstractmethod
+    def delete(self, reminder_id: int) -> bool: ...
+
+class AttachmentRepository(ABC):
+    @abstractmethod
+    def add(self, owner_type: str, owner_id: int, kind: str, file_id: str, file_unique_id: str,
+            file_name: str | None = None, mime_type: str | None = None, size: int | None = None) -> int: ...
+    @abstractmethod
+    def get(self, attachment_id: int): ...
+    @abstractmethod
+    def list_for(self, owner_type: str, owner_id: int) -> list: ...
+    @abstractmethod
+    def counts(self, owner_type: str, owner_ids) -> dict: ...
+    @abstractmethod
+    def set_sha256(self, attachment_id: int, sha256: str) -> bool: ...
+    @abstractmethod
+    def find_sha256(self, file_unique_id: str) -> str | None: ...
+
+class Storage(ABC):
+    """Komplet repozytoriów jednego silnika."""
+    tasks: TaskRepository
+    ideas: IdeaRepository
+    reminders: ReminderRepository
+    recurring: RecurringReminderRepository
+    attachments: AttachmentRepository
+
+    @abstractmethod
+    def categories(self) -> list:
+        """Unikalne kategorie zadań i pomysłów, posortowane."""
+
+    @abstractmethod
+    def calendar_version(self) -> int:
+        """Wersja przypomnień (jednorazowych i cyklicznych) - rośnie przy każdej zmianie kanału iCalendar."""
+
+    @abstractmethod
+    def promote_idea(self, idea_id: int) -> int | None:
+        """Zamienia pomysł w zadanie (kategoria i załączniki przechodzą); zwraca ID zadania."""
+
+# --- SQLite ---
+
+class SqliteTaskRepository(TaskRepository):
+    def add(self, content, priority=0, category=None, parent_id=None, due_at=None, effort_minutes=None):
+        return db.add_task(content, priority, category, parent_id, due_at, effort_minutes)
+
+    def list_active(self, category=None):
+        return db.get_active_tasks(category)
+
+    def list_completed(self, limit=20):
+        return db.get_completed_tasks(limit)
+
+    def get(self, task_id):
+        return db.get_task_by_id(task_id)
+
+    def mark_done(self, task_id):
+        return db.mark_task_done(task_id)
+
+    def update(self, task_id, content, priority=None, due_at=None, effort_minutes=None):
+        return db.update_task(task_id, content, priority, due_at, effort_minutes)
+
+    def delete(self, task_id):
+        return db.delete_task(task_id)
+
+    def subtree(self, task_id):
+        return db.get_task_subtree(task_id)
+
+    def progress(self, task_ids=None):
+        return db.get_task_progress(task_ids)
+
+    def add_dependency(self, task_id, blocked_by):
+        return db.add_task_dependency(task_id, blocked_by)
+
+    def remove_dependency(self, task_id, blocked_by):
+        return db.remove_task_dependency(task_id, blocked_by)
+
+    def blocked_ids(self):
+        return db.get_blocked_task_ids()
+
+    def list_unblocked(self, category=None, limit=None):
+        return db.get_unblocked_tasks(category, limit)
+
+    def refresh_scores(self, now=None):
+        return db.refresh_task_scores(now)
+
+    def similar(self, content, limit=similarity.MAX_SUGGESTIONS):
+        return db.find_similar('task', content, limit)
+
+class SqliteIdeaRepository(IdeaRepository):
+    def add(self, content, category=None):
+        return db.add_idea(content, category)
+
+    def list(self, category=None):
+        return db.get_ideas(category)
+
+    def get(self, idea_id):
+        return db.get_idea_by_id(idea_id)
+
+    def update(self, idea_id, content):
+        return db.update_idea(idea_id, content)
+
+    def delete(self, idea_id):
+        return db.delete_idea(idea_id)
+
+    def similar(self, content, limit=similarity.MAX_SUGGESTIONS):
+        return db.find_similar('idea', content, limit)
+
+    def due_for_review(self, now, limit=review.BATCH_SIZE):
+        return db.get_ideas_due_for_review(now, limit)
+
+    def postpone_reviews(self, idea_ids, until):
+        return db.postpone_idea_reviews(idea_ids, until)
+
+    def review(self, idea_id, grade, now):
+        return db.review_idea(idea_id, grade, now)
+
+    def archive(self, idea_id):
+        return db.archive_idea(idea_id)
+
+class SqliteReminderRepository(ReminderRepository):
+    def add(self, content, remind_at, priority=0):
+        return db.add_reminder(content, remind_at, priority)
+
+    def list_active(self):
+        return db.get_active_reminders()
+
+    def claim_due(self, claim_token, limit=50, lease_seconds=db.CLAIM_LEASE_SECONDS,
+                  due_before=None, urgent_only=False):
+        return db.claim_due_reminders(claim_token, limit, lease_seconds, due_before, urgent_only)
+
+    def ack(self, reminder_ids, claim_token, nag_at):
+        return db.ack_reminders(reminder_ids, claim_token, nag_at)
+
+    def release(self, reminder_id, claim_token, attempts):
+        return db.release_reminder(reminder_id, claim_token, attempts)
+
+    def get(self, reminder_id):
+        return db.get_reminder_by_id(reminder_id)
+
+    def snooze(self, reminder_id, until):
+        return db.snooze_reminder(reminder_id, until)
+
+    def complete(self, reminder_id):
+        return db.complete_reminder(reminder_id)
+
+    def delete(self, reminder_id):
+        return db.delete_reminder(reminder_id)
+
+class SqliteRecurringReminderRepository(RecurringReminderRepository):
+    def add(self, content, schedule_type, schedule_days, schedule_time, next_run, priority=0):
+        return db.add_recurring_reminder(content, schedule_type, schedule_days, schedule_time, next_run, priority)
+
+    def list_active(self):
+        return db.get_active_recurring_reminders()
+
+    def get(self, reminder_id):
+        return db.get_recurring_reminder_by_id(reminder_id)
+
+    def claim_due(self, claim_token, limit=50, lease_seconds=db.CLAIM_LEASE_SECONDS,
+                  due_before=None, urgent_only=False):
+        return db.claim_due_recurring_reminders(claim_token, limit, lease_seconds, due_before, urgent_only)
+
+    def ack(self, reminder_id, claim_token, next_run):
+        return db.ack_recurring_reminder(reminder_id, claim_token, next_run)
+
+    def release(self, reminder_id, claim_token, attempts):
+        return db.release_recurring_reminder(reminder_id, claim_token, attempts)
+
+    def delete(self, reminder_id):
+        return db.delete_recurring_reminder(reminder_id)
+
+class SqliteAttachmentRepository(AttachmentRepository):
+    def add(self, owner_type, owner_id, kind, file_id, file_unique_id, file_name=None, mime_type=None, size=None):
+        return db.add_attachment(owner_type, owner_id, kind, file_id, file_unique_id, file_name, mime_type, size)
+
+    def get(self, attachment_id):
+        return db.get_attachment(attachment_id)
+
+    def list_for(self, owner_type, owner_id):
+        return db.get_attachments(owner_type, owner_id)
+
+    def counts(self, owner_type, owner_ids):
+        return db.count_attachments(owner_type, owner_ids)
+
+    def set_sha256(self, attachment_id, sha256):
+        return db.set_attachment_sha256(attachment_id, sha256)
+
+    def find_sha256(self, file_unique_id):
+        return db.find_attachment_sha256(file_unique_id)
+
+class SqliteStorage(Storage):
+    def __init__(self):
+        db.init_db()
+        self.tasks = SqliteTaskRepository()
+        self.ideas = SqliteIdeaRepository()
+        self.reminders = SqliteReminderRepository()
+        self.recurring = SqliteRecurringReminderRepository()
+        self.attachments = SqliteAttachmentRepository()
+
+    def categories(self):
+        return db.get_all_categories()
+
+    def calendar_version(self):
+        return db.get_change_counter(db.CALENDAR_COUNTER)
+
+    def promote_idea(self, idea_id):
+        return db.promote_idea(idea_id)
+
+# --- Pamięć ---
+
+def _ts(value: datetime) -> str:
+    """Zapisuje datetime tak jak adapter sqlite3 (isoformat z ' '), by porównania tekstowe się zgadzały."""
+    return value.isoformat(" ")
+
+def _utc_now_ts() -> str:
+    """Odpowiednik CURRENT_TIMESTAMP z SQLite (UTC, bez ułamków sekund)."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+class SortedIndex:
+    """Posortowana lista (klucz, id) - wyszukiwanie O(log n) przez bisect.
+
+    Indeks obejmuje tylko wiersze spełniające `predicate` (np. is_done = 0),
+    więc gorące zapytania nie przeglądają całej tabeli.
+    """
+
+    def __init__(self, key, predicate=lambda row: True):
+        self._key = key
+        self._predicate = predicate
+        self._entries = []
+
+    def add(self, row):
+        if self._predicate(row):
+            insort(self._entries, (self._key(row), row['id']))
+
+    def discard(self, row):
+        if not self._predicate(row):
+            return
+        entry = (self._key(row), row['id'])
+        i = bisect_right(self._entries, entry) - 1
+        if i >= 0 and self._entries[i] == entry:
+            del self._entries[i]
+
+    def ids(self):
+        return [row_id for _, row_id in self._entries]
+
+    def ids_equal(self, key):
+        """ID wierszy o kluczu równym `key` (np. dzieci jednego rodzica)."""
+        start = bisect_left(self._entries, (key, float('-inf')))
+        end = bisect_right(self._entries, (key, float('inf')))
+        return [row_id for _, row_id in self._entries[start:end]]
+
+    def ids_upto(self, bound):
+        """ID wierszy o kluczu <= bound (klucz musi zaczynać się od wartości porównywanej)."""
+        end = bisect_right(self._entries, (bound, float('inf')))
+        return [row_id for _, row_id in self._entries[:end]]
+
+class HeapIndex:
+    """Kopiec (klucz, id) z leniwym usuwaniem - najmniejsze klucze w O(k log n).
+
+    `discard` tylko zapomina wpis; nieaktualne pozycje kopca są pomijane
+    przy odczycie, a gdy stanowią większość, kopiec budujemy od nowa.
+    """
+
+    def __init__(self, key, predicate=lambda row: True):
+        self._key = key
+        self._predicate = predicate
+        self._heap = []
+        self._live = {}  # id -> aktualny klucz
+
+    def add(self, row):
+        if self._predicate(row):
+            entry = (self._key(row), row['id'])
+            self._live[row['id']] = entry[0]
+            heappush(self._heap, entry)
+
+    def discard(self, row):
+        self._live.pop(row['id'], None)
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [(key, row_id) for row_id, key in self._live.items()]
+            heapify(self._heap)
+
+    def smallest_upto(self, bound, limit: int) -> list:
+        """ID najwyżej `limit` wierszy o kluczu <= bound, rosnąco.
+
+        Przejście po kopcu jak po drzewie (bez zdejmowania): kandydaci w
+        małym pomocniczym kopcu, więc koszt zależy od `limit`, nie od n.
+        """
+        heap, live, found = self._heap, self._live, {}
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(found) < limit:
+            (key, row_id), i = heappop(frontier)
+            if key > bound:
+                break
+            # Ten sam (klucz, id) może leżeć w kopcu dwa razy - po aktualizacji bez zmiany klucza
+            if live.get(row_id) == key:
+                found[row_id] = None
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heappush(frontier, (heap[child], child))
+        return list(found)
+
+class _MemoryTable:
+    """Wiersze jako słowniki + indeksy aktualizowane przy każdej zmianie.
+
+    Na zewnątrz wiersze wychodzą jako kopie typu `model` (models.py) - te
+    same obiekty co z SQLite.
+    """
+
+    def __init__(self, columns: dict, indexes: dict, model=dict):
+        self.columns = columns  # nazwa -> wartość domyślna
+        self.indexes = indexes
+        self.model = model
+        self.rows = {}
+        self.next_id = 1
+        self.version = 0  # podbijana przy każdej zmianie (odpowiednik change_counters)
+
+    def insert(self, values: dict) -> int:
+        row = dict(self.columns)
+        row.update(values)
+        if row.get('id') is None:
+            row['id'] = self.next_id
+        self.next_id = max(self.next_id, row['id'] + 1)
+        if 'created_at' in row and row['created_at'] is None:
+            row['created_at'] = _utc_now_ts()
+        self.rows[row['id']] = row
+        for index in self.indexes.values():
+            index.add(row)
+        self.version += 1
+        return row['id']
+
+    def update(self, row_id: int, **changes) -> bool:
+        row = self.rows.get(row_id)
+        if row is None:
+            return False
+        for index in self.indexes.values():
+            index.discard(row)
+        row.update(changes)
+        for index in self.indexes.values():
+            index.add(row)
+        self.version += 1
+        return True
+
+    def delete(self, row_id: int) -> bool:
+        row = self.rows.pop(row_id, None)
+        if row is None:
+            return False
+        for index in self.indexes.values():
+            index.discard(row)
+        self.version += 1
+        return True
+
+    def get(self, row_id: int):
+        row = self.rows.get(row_id)
+        return self.model(**row) if row else None
+
+    def select(self, ids) -> list:
+        model, rows = self.model, self.rows
+        return [model(**rows[i]) for i in ids]
+
+class MemoryTaskRepository(TaskRepository):
+    def __init__(self):
+        # created_at DESC przybliżamy malejącym id (ta sama kolejność wstawiania)
+        self.table = _MemoryTable(
+            {'id': None, 'content': '', 'created_at': None, 'is_done': 0, 'priority': 0, 'category': None,
+             'parent_id': None, 'due_at': None, 'effort_minutes': None, 'score': 0},
+            {
+                'active': SortedIndex(lambda r: (-r['score'], -r['id']), lambda r: not r['is_done']),
+                'done': SortedIndex(lambda r: -r['id'], lambda r: r['is_done']),
+                'parent': SortedIndex(lambda r: r['parent_id'], lambda r: r['parent_id'] is not None),
+            },
+            models.Task,
+        )
+        self.dependencies = set()  # pary (task_id, blocked_by)
+        self.similarity = similarity.LSHIndex()
+
+    def _descendants(self, task_id: int) -> list:
+        """[(id, głębokość)] poddrzewa w kolejności BFS - po indeksie rodzica."""
+        if task_id not in self.table.rows:
+            return []
+        found, frontier, depth = [(task_id, 0)], [task_id], 0
+        while frontier:
+            depth += 1
+            frontier = [child for parent in frontier for child in self.table.indexes['parent'].ids_equal(parent)]
+            found.extend((child, depth) for child in frontier)
+        return found
+
+    def add(self, content, priority=0, category=None, parent_id=None, due_at=None, effort_minutes=None):
+        task_id = self.table.insert({
+            'content': content, 'priority': priority, 'category': category, 'parent_id': parent_id,
+            'due_at': _ts(due_at) if due_at else None, 'effort_minutes': effort_minutes,
+            'score': scoring.task_score(priority, due_at, effort_minutes, datetime.now()),
+        })
+        self.similarity.add(task_id, content)
+        return task_id
+
+    def list_active(self, category=None):
+        ids = self.table.indexes['active'].ids()
+        if category:
+            ids = [i for i in ids if self.table.rows[i]['category'] == category]
+        return self.table.select(ids)
+
+    def list_completed(self, limit=20):
+        return self.table.select(self.table.indexes['done'].ids()[:limit])
+
+    def get(self, task_id):
+        return self.table.get(task_id)
+
+    def mark_done(self, task_id):
+        subtree = self._descendants(task_id)
+        for row_id, _ in subtree:
+            self.table.update(row_id, is_done=1)
+        return bool(subtree)
+
+    def update(self, task_id, content, priority=None, due_at=None, effort_minutes=None):
+        row = self.table.rows.get(task_id)
+        if row is None:
+            return False
+        changes = {'content': content}
+        if priority is not None:
+            changes['priority'] = priority
+        if due_at is not None:
+            changes['due_at'] = _ts(due_at)
+        if effort_minutes is not None:
+            changes['effort_minutes'] = effort_minutes
+        merged = {**row, **changes}
+        changes['score'] = scoring.task_score(merged['priority'], merged['due_at'], merged['effort_minutes'],
+                                              datetime.now())
+        self.similarity.add(task_id, content)
+        return self.table.update(task_id, **changes)
+
+    def delete(self, task_id):
+        subtree = {row_id for row_id, _ in self._descendants(task_id)}
+        for row_id in subtree:
+            self.table.delete(row_id)
+            self.similarity.remove(row_id)
+        self.dependencies = {(t, b) for t, b in self.dependencies if t not in subtree and b not in subtree}
+        return bool(subtree)
+
+    def subtree(self, task_id):
+        rows = []
+        for row_id, depth in self._descendants(task_id):
+            row = self.table.get(row_id)
+            row.depth = depth
+            rows.append(row)
+        rows.sort(key=lambda r: (r.depth, -r.priority, -r.id))
+        return rows
+
+    def progress(self, task_ids=None):
+        if task_ids is None:
+            task_ids = {r['parent_id'] for r in self.table.rows.values() if r['parent_id'] is not None}
+        result = {}
+        for task_id in task_ids:
+            descendants = [row_id for row_id, depth in self._descendants(task_id) if depth > 0]
+            if descendants:
+                done = sum(self.table.rows[row_id]['is_done'] for row_id in descendants)
+                result[task_id] = (done, len(descendants))
+        return result
+
+    def add_dependency(self, task_id, blocked_by):
+        if task_id == blocked_by:
+            return False
+        # Cykl: blocked_by już (pośrednio) czeka na task_id
+        seen, frontier = set(), {blocked_by}
+        while frontier:
+            if task_id in frontier:
+                return False
+            seen |= frontier
+            frontier = {b for t, b in self.dependencies if t in frontier} - seen
+        if (task_id, blocked_by) in self.dependencies:
+            return False
+        self.dependencies.add((task_id, blocked_by))
+        return True
+
+    def remove_dependency(self, task_id, blocked_by):
+        if (task_id, blocked_by) not in self.dependencies:
+            return False
+        self.dependencies.discard((task_id, blocked_by))
+        return True
+
+    def blocked_ids(self):
+        rows = self.table.rows
+        return {t for t, b in self.dependencies
+                if t in rows and b in rows and not rows[t]['is_done'] and not rows[b]['is_done']}
+
+    def list_unblocked(self, category=None, limit=None):
+        blocked = self.blocked_ids()
+        rows = []
+        # Indeks 'active' jest już posortowany po wyniku - z `limit` czytamy tylko jego początek
+        for row_id in self.table.indexes['active'].ids():
+            row = self.table.rows[row_id]
+            if category and row['category'] != category:
+                continue
+            if row_id in blocked or any(not self.table.rows[child]['is_done']
+                                        for child in self.table.indexes['parent'].ids_equal(row_id)):
+                continue
+            rows.append(self.table.model(**row))
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows
+
+    def refresh_scores(self, now=None):
+        now = now or datetime.now()
+        changed = 0
+        for row_id in self.table.indexes['active'].ids():
+            row = self.table.rows[row_id]
+            if row['due_at'] is None:
+                continue
+            score = scoring.task_score(row['priority'], row['due_at'], row['effort_minutes'], now)
+            if score != row['score']:
+                self.table.update(row_id, score=score)
+                changed += 1
+        return changed
+
+    def similar(self, content, limit=similarity.MAX_SUGGESTIONS):
+        sig = similarity.signature(content)
+        rows = self.table.rows
+        candidates = [(row_id, self.similarity.signatures[row_id]) for row_id in self.similarity.candidates(sig)
+                      if not rows[row_id]['is_done']]
+        return similarity.rank(sig, candidates, limit)
+
+class MemoryIdeaRepository(IdeaRepository):
+    def __init__(self):
+        self.table = _MemoryTable(
+            {'id': None, 'content': '', 'created_at': None, 'category': None, 'next_review': None,
+             'review_reps': 0, 'review_interval': 0, 'review_ease': review.DEFAULT_EASE, 'archived': 0},
+            {
+                'recent': SortedIndex(lambda r: -r['id'], lambda r: not r['archived']),
+                'review': HeapIndex(lambda r: r['next_review'],
+                                    lambda r: not r['archived'] and r['next_review'] is not None),
+            },
+            models.Idea,
+        )
+        self.similarity = similarity.LSHIndex()
+
+    def add(self, content, category=None):
+        idea_id = self.table.insert({'content': content, 'category': category,
+                                     'next_review': _ts(review.first_review(datetime.now()))})
+        self.similarity.add(idea_id, content)
+        return idea_id
+
+    def list(self, category=None):
+        ids = self.table.indexes['recent'].ids()
+        if category:
+            ids = [i for i in ids if self.table.rows[i]['category'] == category]
+        return self.table.select(ids)
+
+    def get(self, idea_id):
+        return self.table.get(idea_id)
+
+    def update(self, idea_id, content):
+        if not self.table.update(idea_id, content=content):
+            return False
+        self.similarity.add(idea_id, content)
+        return True
+
+    def delete(self, idea_id):
+        self.similarity.remove(idea_id)
+        return self.table.delete(idea_id)
+
+    def similar(self, content, limit=similarity.MAX_SUGGESTIONS):
+        sig = similarity.signature(content)
+        candidates = [(row_id, self.similarity.signatures[row_id]) for row_id in self.similarity.candidates(sig)]
+        return similarity.rank(sig, candidates, limit)
+
+    def due_for_review(self, now, limit=review.BATCH_SIZE):
+        return self.table.select(self.table.indexes['review'].smallest_upto(_ts(now), limit))
+
+    def postpone_reviews(self, idea_ids, until):
+        rows = self.table.rows
+        return sum(self.table.update(i, next_review=_ts(until)) for i in idea_ids
+                   if i in rows and not rows[i]['archived'])
+
+    def review(self, idea_id, grade, now):
+        row = self.table.rows.get(idea_id)
+        if row is None or row['archived']:
+            return None
+        reps, interval, ease = review.next_state(row['review_reps'], row['review_interval'], row['review_ease'], grade)
+        next_review = now + timedelta(days=interval)
+        self.table.update(idea_id, review_reps=reps, review_interval=interval, review_ease=ease,
+                          next_review=_ts(next_review))
+        return next_review
+
+    def archive(self, idea_id):
+        row = self.table.rows.get(idea_id)
+        if row is None or row['archived']:
+            return False
+        return self.table.update(idea_id, archived=1, next_review=None)
+
+def _claim(table: _MemoryTable, index: str, claim_token: str, limit: int, lease_seconds: int,
+           due_before: datetime | None, urgent_only: bool) -> list:
+    """Rezerwacja due wierszy jak w SQL: termin minął i brak ważnej rezerwacji."""
+    now = _ts(datetime.now())
+    claimed_until = _ts(datetime.now() + timedelta(seconds=lease_seconds))
+    claimed = []
+    for row_id in table.indexes[index].ids_upto(_ts(due_before) if due_before else now):
+        row = table.rows[row_id]
+        if row['claimed_until'] is not None and row['claimed_until'] > now:
+            continue
+        if urgent_only and not row['priority']:
+            continue
+        table.update(row_id, claim_token=claim_token, claimed_until=claimed_until)
+        claimed.append(table.model(**row))
+        if len(claimed) >= limit:
+            break
+    return claimed
+
+def _release(table: _MemoryTable, row_id: int, claim_token: str, attempts: int) -> bool:
+    row = table.rows.get(row_id)
+    if row is None or row['claim_token'] != claim_token:
+        return False
+    return table.update(row_id, claim_token=None, attempts=row['attempts'] + 1,
+                        claimed_until=_ts(datetime.now() + db.retry_delay(attempts)))
+
+_CLAIM_COLUMNS = {'claim_token': None, 'claimed_until': None, 'attempts': 0, 'priority': 0}
+
+class MemoryReminderRepository(ReminderRepository):
+    def __init__(self):
+        self.table = _MemoryTable(
+            {'id': None, 'content': '', 'remind_at': None, 'created_at': None, 'is_sent': 0,
+             'state': db.REMINDER_PENDING, 'nag_count': 0, **_CLAIM_COLUMNS},
+            {'pending': SortedIndex(lambda r: r['remind_at'], lambda r: not r['is_sent'])},
+            models.Reminder,
+        )
+
+    def add(self, content, remind_at, priority=0):
+        return self.table.insert({'content': content, 'remind_at': _ts(remind_at), 'priority': priority})
+
+    def list_active(self):
+        return self.table.select(self.table.indexes['pending'].ids())
+
+    def claim_due(self, claim_token, limit=50, lease_seconds=db.CLAIM_LEASE_SECONDS,
+                  due_before=None, urgent_only=False):
+        return _claim(self.table, 'pending', claim_token, limit, lease_seconds, due_before, urgent_only)
+
+    def ack(self, reminder_ids, claim_token, nag_at):
+        acked = []
+        for reminder_id in reminder_ids:
+            row = self.table.rows.get(reminder_id)
+            if row is None or row['claim_token'] != claim_token:
+                continue
+            self.table.update(reminder_id, state=db.REMINDER_NAGGING, nag_count=row['nag_count'] + 1,
+                              remind_at=_ts(nag_at), claim_token=None, claimed_until=None, attempts=0)
+            acked.append(reminder_id)
+        return acked
+
+    def release(self, reminder_id, claim_token, attempts):
+        return _release(self.table, reminder_id, claim_token, attempts)
+
+    def get(self, reminder_id):
+        return self.table.get(reminder_id)
+
+    def snooze(self, reminder_id, until):
+        row = self.table.rows.get(reminder_id)
+        if row is None or row['is_sent']:
+            return False
+        return self.table.update(reminder_id, state=db.REMINDER_SNOOZED, remind_at=_ts(until),
+                                 claim_token=None, claimed_until=None, attempts=0)
+
+    def complete(self, reminder_id):
+        row = self.table.rows.get(reminder_id)
+        if row is None or row['is_sent']:
+            return False
+        return self.table.update(reminder_id, state=db.REMINDER_DONE, is_sent=1,
+                                 claim_token=None, claimed_until=None)
+
+    def delete(self, reminder_id):
+        return self.table.delete(reminder_id)
+
+class MemoryRecurringReminderRepository(RecurringReminderRepository):
+    def __init__(self):
+        self.table = _MemoryTable(
+            {'id': None, 'content': '', 'schedule_type': '', 'schedule_days': None, 'schedule_time': '',
+             'next_run': None, 'created_at': None, 'is_active': 1, **_CLAIM_COLUMNS},
+            {'active': SortedIndex(lambda r: r['next_run'], lambda r: r['is_active'])},
+            models.RecurringReminder,
+        )
+
+    def add(self, content, schedule_type, schedule_days, schedule_time, next_run, priority=0):
+        return self.table.insert({
+            'content': content, 'schedule_type': schedule_type, 'schedule_days': schedule_days,
+            'schedule_time': schedule_time, 'next_run': _ts(next_run), 'priority': priority,
+        })
+
+    def list_active(self):
+        return self.table.select(self.table.indexes['active'].ids())
+
+    def get(self, reminder_id):
+        return self.table.get(reminder_id)
+
+    def claim_due(self, claim_token, limit=50, lease_seconds=db.CLAIM_LEASE_SECONDS,
+                  due_before=None, urgent_only=False):
+        return _claim(self.table, 'active', claim_token, limit, lease_seconds, due_before, urgent_only)
+
+    def ack(self, reminder_id, claim_token, next_run):
+        row = self.table.rows.get(reminder_id)
+        if row is None or row['claim_token'] != claim_token:
+            return False
+        return self.table.update(reminder_id, next_run=_ts(next_run), claim_token=None,
+                                 claimed_until=None, attempts=0)
+
+    def release(self, reminder_id, claim_token, attempts):
+        return _release(self.table, reminder_id, claim_token, attempts)
+
+    def delete(self, reminder_id):
+        return self.table.delete(reminder_id)
+
+class MemoryAttachmentRepository(AttachmentRepository):
+    def __init__(self):
+        self.table = _MemoryTable(
+            {'id': None, 'owner_type': '', 'owner_id': None, 'kind': '', 'file_id': '', 'file_unique_id': '',
+             'file_name': None, 'mime_type': None, 'size': None, 'sha256': None, 'created_at': None},
+            {
+                'owner': SortedIndex(lambda r: (r['owner_type'], r['owner_id'])),
+                'unique': SortedIndex(lambda r: r['file_unique_id']),
+            },
+        )
+
+    def add(self, owner_type, owner_id, kind, file_id, file_unique_id, file_name=None, mime_type=None, size=None):
+        return self.table.insert({
+            'owner_type': owner_type, 'owner_id': owner_id, 'kind': kind, 'file_id': file_id,
+            'file_unique_id': file_unique_id, 'file_name': file_name, 'mime_type': mime_type, 'size': size,
+        })
+
+    def get(self, attachment_id):
+        return self.table.get(attachment_id)
+
+    def list_for(self, owner_type, owner_id):
+        return self.table.select(sorted(self.table.indexes['owner'].ids_equal((owner_type, owner_id))))
+
+    def counts(self, owner_type, owner_ids):
+        result = {}
+        for owner_id in owner_ids:
+            n = len(self.table.indexes['owner'].ids_equal((owner_type, owner_id)))
+            if n:
+                result[owner_id] = n
+        return result
+
+    def set_sha256(self, attachment_id, sha256):
+        return self.table.update(attachment_id, sha256=sha256)
+
+    def find_sha256(self, file_unique_id):
+        for row_id in self.table.indexes['unique'].ids_equal(file_unique_id):
+            if self.table.rows[row_id]['sha256']:
+                return self.table.rows[row_id]['sha256']
+        return None
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.tasks = MemoryTaskRepository()
+        self.ideas = MemoryIdeaRepository()
+        self.reminders = MemoryReminderRepository()
+        self.recurring = MemoryRecurringReminderRepository()
+        self.attachments = MemoryAttachmentRepository()
+
+    def categories(self):
+        categories = set()
+        for table in (self.tasks.table, self.ideas.table):
+            categories.update(r['category'] for r in table.rows.values() if r['category'])
+        return sorted(categories)
+
+    def calendar_version(self):
+        # Zlicza każdą zmianę wierszy, także rezerwacje - w pamięci to tylko porównanie liczb
+        return self.reminders.table.version + self.recurring.table.version
+
+    def promote_idea(self, idea_id):
+        idea = self.ideas.get(idea_id)
+        if idea is None:
+            return None
+        task_id = self.tasks.add(idea.content, category=idea.category)
+        for attachment_id in self.attachments.table.indexes['owner'].ids_equal(('idea', idea_id)):
+            self.attachments.table.update(attachment_id, owner_type='task', owner_id=task_id)
+        self.ideas.delete(idea_id)
+        return task_id
+
+# --- Write-through ---
+
+class WriteThroughStorage(Storage):
+    """Odczyty z `MemoryStorage`, zapisy przez `SqliteStorage`.
+
+    Po każdym commicie `database.py` zgłasza zmienione ID; odświeżamy tylko
+    te wiersze, więc pamięć zawsze odpowiada SQLite w obrębie procesu.
+    """
+
+    def __init__(self):
+        self._sqlite = SqliteStorage()
+        self._memory = MemoryStorage()
+        self._tables = {
+            'tasks': self._memory.tasks.table,
+            'ideas': self._memory.ideas.table,
+            'reminders': self._memory.reminders.table,
+            'recurring_reminders': self._memory.recurring.table,
+        }
+        for name, table in self._tables.items():
+            for row in db.get_rows(name):
+                table.insert(dict(row))
+        db.add_change_listener(self._refresh)
+
+        self.tasks = _WriteThroughRepository(self._sqlite.tasks, self._memory.tasks)
+        self.ideas = _WriteThroughRepository(self._sqlite.ideas, self._memory.ideas)
+        self.reminders = _WriteThroughRepository(self._sqlite.reminders, self._memory.reminders)
+        self.recurring = _WriteThroughRepository(self._sqlite.recurring, self._memory.recurring)
+        # Załączniki nie są gorącą ścieżką - bez cache
+        self.attachments = self._sqlite.attachments
+
+    def _refresh(self, table_name: str, row_ids):
+        table = self._tables.get(table_name)
+        if table is None or not row_ids:
+            return
+        fresh = {row['id']: dict(row) for row in db.get_rows(table_name, row_ids)}
+        for row_id in row_ids:
+            table.delete(row_id)
+            if row_id in fresh:
+                table.insert(fresh[row_id])
+
+    def categories(self):
+        return self._memory.categories()
+
+    def calendar_version(self):
+        # Licznik podbijają triggery SQLite - rezerwacje przypomnień go nie zmieniają
+        return self._sqlite.calendar_version()
+
+    def promote_idea(self, idea_id):
+        return self._sqlite.promote_idea(idea_id)
+
+class _WriteThroughRepository:
+    """Metody odczytu kieruje do pamięci, wszystkie pozostałe do SQLite.
+
+    Zapytania o drzewo i zależności zadań (subtree, progress, blocked_ids...)
+    oraz `similar` też idą do SQLite - korzystają z tabel domknięcia,
+    zależności i indeksu podobieństwa, których cache nie trzyma.
+    """
+    READS = {'list_active', 'list_completed', 'list', 'get', 'due_for_review'}
+
+    def __init__(self, sqlite_repo, memory_repo):
+        self._sqlite = sqlite_repo
+        self._memory = memory_repo
+
+    def __getattr__(self, name):
+        target = self._memory if name in self.READS else self._sqlite
+        return getattr(target, name)
+
+STORAGE_ENGINES = {
+    'sqlite': SqliteStorage,
+    'memory': MemoryStorage,
+    'writethrough': WriteThroughStorage,
+}
+
+def open_storage(engine: str = 'sqlite') -> Storage:
+    """Tworzy silnik przechowywania po nazwie (sqlite | memory | writethrough)."""
+    try:
+        return STORAGE_ENGINES[engine]()
+    except KeyError:
+        raise ValueError(f"Nieznany silnik przechowywania: {engine!r}") from None
@@ -0,0 +1,23 @@
+"""Wspólne ustawienia testów: katalog projektu na ścieżce, świeża baza na każdy test."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# bot.py czyta konfigurację przy imporcie - procesy uruchamiane przez testy dziedziczą te zmienne
+os.environ.update(TELEGRAM_TOKEN='123:ABC', MY_CHAT_ID='42', LOG_LEVEL='ERROR', FOCUSBOT_RECORD='',
+                  FOCUSBOT_STORAGE='sqlite')
+
+import database as db  # noqa: E402
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Pusta baza w katalogu testu; słuchacze zmian (cache write-through) nie przeżywają testu."""
+    path = str(tmp_path / 'focus_bot.db')
+    monkeypatch.setattr(db, 'DB_NAME', path)
+    monkeypatch.setattr(db, '_change_listeners', [])
+    db.init_db()
+    return path
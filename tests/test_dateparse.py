@@ -0,0 +1,94 @@
+"""dateparse.parse: tabela znanych wyrażeń i losowe wejścia (fuzz)."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import dateparse
+
+# Poniedziałek, południe
+NOW = datetime(2026, 10, 19, 12, 0)
+
+def _daily(clock: str) -> dict:
+    return {'type': 'daily', 'days': None, 'time': clock}
+
+def _weekly(day: int, clock: str) -> dict:
+    return {'type': 'weekly', 'days': str(day), 'time': clock}
+
+CASES = [
+    ("jutro o 7 Leki", datetime(2026, 10, 20, 7, 0), None, "Leki"),
+    ("za 10 min Herbata", datetime(2026, 10, 19, 12, 10), None, "Herbata"),
+    ("codziennie o 7 Leki", datetime(2026, 10, 20, 7, 0), _daily('07:00'), "Leki"),
+    ("co piątek 16:00 Raport", datetime(2026, 10, 23, 16, 0), _weekly(4, '16:00'), "Raport"),
+    ("w każdy wtorek o 9 Basen", datetime(2026, 10, 20, 9, 0), _weekly(1, '09:00'), "Basen"),
+    ("15:00 Zadzwonić do mamy", datetime(2026, 10, 19, 15, 0), None, "Zadzwonić do mamy"),
+    ("10:00 Kawa", datetime(2026, 10, 20, 10, 0), None, "Kawa"),  # już minęła - jutro
+    ("o 14 Spotkanie", datetime(2026, 10, 19, 14, 0), None, "Spotkanie"),
+    ("rano Leki", datetime(2026, 10, 20, 8, 0), None, "Leki"),
+    ("wieczorem Serial", datetime(2026, 10, 19, 20, 0), None, "Serial"),
+    ("za 30m Pranie", datetime(2026, 10, 19, 12, 30), None, "Pranie"),
+    ("za 1h30m Piekarnik", datetime(2026, 10, 19, 13, 30), None, "Piekarnik"),
+    ("za 2 godziny Obiad", datetime(2026, 10, 19, 14, 0), None, "Obiad"),
+    ("za tydzień Przegląd", datetime(2026, 10, 26, 12, 0), None, "Przegląd"),
+    ("jutro Raport", datetime(2026, 10, 20, 9, 0), None, "Raport"),
+    ("pojutrze o 8 Dentysta", datetime(2026, 10, 21, 8, 0), None, "Dentysta"),
+    ("w piątek o 14 Kino", datetime(2026, 10, 23, 14, 0), None, "Kino"),
+    ("15.11 10:00 Urodziny", datetime(2026, 11, 15, 10, 0), None, "Urodziny"),
+    ("18.10 9:00 Rocznica", datetime(2027, 10, 18, 9, 0), None, "Rocznica"),  # w tym roku minęło
+    ("1.1.2027 Sylwester", datetime(2027, 1, 1, 9, 0), None, "Sylwester"),
+    ("  JUTRO  o 7   Leki  ", datetime(2026, 10, 20, 7, 0), None, "Leki"),
+]
+
+INVALID = [
+    "31.02 Coś",         # nie ma takiego dnia
+    "29.02 Coś",         # 2027 nie jest przestępny
+    "25:00 Coś",
+    "12:60 Coś",
+    "za 0m Coś",         # termin nie jest w przyszłości
+    "1.1.2020 Coś",
+    "jutro o 7",         # brak treści
+    "Kupić mleko",       # brak terminu
+    "",
+]
+
+@pytest.mark.parametrize('text, when, recurrence, content', CASES)
+def test_parse_table(text, when, recurrence, content):
+    assert dateparse.parse(text, NOW) == dateparse.ParsedTime(when, recurrence, content)
+
+@pytest.mark.parametrize('text', INVALID)
+def test_parse_rejects(text):
+    assert dateparse.parse(text, NOW) is None
+
+# Słowa gramatyki i śmieci - losowe zdania trafiają w reguły i w ich granice
+_VOCABULARY = [
+    'za', 'o', 'w', 'co', 'codziennie', 'jutro', 'pojutrze', 'dziś', 'rano', 'wieczorem', 'każdy', 'każdą',
+    'piątek', 'pt', 'środę', 'niedziela', 'min', 'godziny', 'tydzień', 'dni', 'h', 'm',
+    '7', '0', '24', '99', '16:00', '23:59', '24:00', '9:5', '30m', '1h30m', '9999m', '2d', '1tyg', '0d',
+    '15.11', '31.02', '29.02', '1/1', '1.1.2027', '00.00', '12.13', '1.1.', '31.12.9999',
+    'Leki', 'Kupić', 'mleko', 'ŻÓŁW', '🙂', '-', ':', '.', 'x' * 40, '1' * 30,
+]
+
+def _random_text(rng: random.Random) -> str:
+    words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(0, 9))]
+    separators = [' ', '  ', '\t', '\n', ' ']
+    text = ''.join(word + rng.choice(separators) for word in words)
+    if rng.random() < 0.2:
+        text += ''.join(chr(rng.randint(1, 0x2FFF)) for _ in range(rng.randint(1, 12)))
+    return text
+
+def test_parse_fuzz():
+    rng = random.Random(20261019)
+    hits = 0
+    for _ in range(20000):
+        text = _random_text(rng)
+        now = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 3 * 366 * 1440))
+        parsed = dateparse.parse(text, now)
+        if parsed is None:
+            continue
+        hits += 1
+        assert parsed.content and parsed.content == parsed.content.strip(), text
+        assert text.rstrip().endswith(parsed.content), text
+        assert parsed.when > now, text
+        assert parsed.recurrence is None or parsed.recurrence['type'] in ('daily', 'weekly'), text
+    # Fuzz ma sens tylko, jeśli część wejść faktycznie przechodzi przez gramatykę
+    assert hits > 1000
@@ -0,0 +1,59 @@
+"""deliver_reminders: podział należnych przypomnień (jednorazowych i cyklicznych) na digesty."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import database as db
+
+@pytest.fixture
+def digests(db_path, monkeypatch):
+    """Bot bez Telegrama: zamiast wysyłki zapisuje (jednorazowe, cykliczne) każdego digestu."""
+    import bot
+    sent = []
+
+    def reminder_digest(reminders, recurring):
+        sent.append((len(reminders), len(recurring)))
+        return "digest"
+
+    async def send_text(chat_id, text, reply_markup=None, **kwargs):
+        return None
+
+    monkeypatch.setattr(bot.render, 'reminder_digest', reminder_digest)
+    monkeypatch.setattr(bot, 'send_text', send_text)
+    monkeypatch.setattr(bot, 'in_quiet_hours', lambda moment, quiet_hours=None: False)
+    return bot, sent
+
+def _add_recurring(count: int):
+    past = datetime.now() - timedelta(minutes=1)
+    for i in range(count):
+        db.add_recurring_reminder(f"cykl-{i}", 'daily', None, '08:00', past)
+
+def test_recurring_backlog_fills_digests_up_to_limit(digests):
+    bot, sent = digests
+    rows = bot.keyboards.MAX_REMINDER_ROWS
+    _add_recurring(2 * rows + 3)
+    assert asyncio.run(bot.deliver_reminders()) == 2 * rows + 3
+    # Same cykliczne: kolejne digesty, aż zostanie niepełny
+    assert sent == [(0, rows), (0, rows), (0, 3)]
+
+def test_recurring_only_fill_room_left_by_one_off(digests):
+    bot, sent = digests
+    rows = bot.keyboards.MAX_REMINDER_ROWS
+    past = datetime.now() - timedelta(minutes=1)
+    for i in range(rows - 5):
+        db.add_reminder(f"jednorazowe-{i}", past)
+    _add_recurring(8)
+    assert asyncio.run(bot.deliver_reminders()) == rows - 5 + 8
+    assert sent == [(rows - 5, 5), (0, 3)]
+    assert all(one_off + recurring <= rows for one_off, recurring in sent)
+
+def test_full_one_off_digest_leaves_recurring_for_next(digests):
+    bot, sent = digests
+    rows = bot.keyboards.MAX_REMINDER_ROWS
+    past = datetime.now() - timedelta(minutes=1)
+    for i in range(rows):
+        db.add_reminder(f"jednorazowe-{i}", past)
+    _add_recurring(1)
+    assert asyncio.run(bot.deliver_reminders()) == rows + 1
+    assert sent == [(rows, 0), (0, 1)]
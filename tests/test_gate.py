@@ -0,0 +1,143 @@
+"""gate.Gate na sztucznym zegarze: throttling, okno odpowiedzi, limit globalny, LRU, ApplicationHandlerStop."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+import gate
+import sender
+
+OWNER = 42
+
+class FakeClock:
+    """Zastępuje moduł `time` w gate.py i sender.py - monotonic() przesuwa tylko test."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(gate, 'time', fake)
+    monkeypatch.setattr(sender, 'time', fake)
+    return fake
+
+def _update(user_id: int | None, callback: bool = False):
+    user = SimpleNamespace(id=user_id, username=None) if user_id is not None else None
+    query = SimpleNamespace(answers=[]) if callback else None
+    if query:
+        async def answer(text):
+            query.answers.append(text)
+        query.answer = answer
+    return SimpleNamespace(effective_user=user, callback_query=query, effective_message=SimpleNamespace())
+
+def _gate(**kwargs) -> tuple[gate.Gate, list]:
+    replies = []
+
+    async def reply(update, text):
+        replies.append((update.effective_user.id, text))
+
+    options = {'reply_window': 3600, 'replies_per_minute': 20, 'burst': 5, 'refill_seconds': 60,
+               'max_senders': 100, **kwargs}
+    return gate.Gate(OWNER, reply, **options), replies
+
+def test_owner_allowed_and_anonymous_dropped(clock):
+    g, _ = _gate(burst=1)
+    assert [g.classify(_update(OWNER)) for _ in range(10)] == [gate.ALLOW] * 10
+    assert g.classify(_update(None)) == gate.DROP
+    assert (g.counters['allowed'], g.counters['anonymous'], g.counters['throttled']) == (10, 1, 0)
+    assert not g.senders
+
+def test_sender_bucket_throttles(clock):
+    g, _ = _gate(burst=3, refill_seconds=60)
+    assert [g.classify(_update(7)) for _ in range(5)] == [gate.REPLY] + [gate.DROP] * 4
+    # Seria `burst` przechodzi przez bramkę (log, licznik denied), reszta ginie w throttlingu
+    assert (g.counters['denied'], g.counters['throttled']) == (3, 2)
+    clock.advance(59)
+    g.classify(_update(7))
+    assert (g.counters['denied'], g.counters['throttled']) == (3, 3)
+    clock.advance(1)
+    g.classify(_update(7))
+    assert (g.counters['denied'], g.counters['throttled']) == (4, 3)
+    # Wiadra są osobne dla każdego nadawcy
+    assert g.classify(_update(8)) == gate.REPLY
+    assert g.senders[7].updates == 7
+
+def test_reply_window_per_sender(clock):
+    g, _ = _gate(reply_window=600, burst=100)
+    assert g.classify(_update(7)) == gate.REPLY
+    clock.advance(599)
+    assert g.classify(_update(7)) == gate.DROP
+    assert g.classify(_update(8)) == gate.REPLY
+    clock.advance(1)
+    assert g.classify(_update(7)) == gate.REPLY
+    assert (g.counters['replied'], g.counters['denied'], g.counters['replies_suppressed']) == (3, 4, 0)
+
+def test_global_reply_cap(clock):
+    g, _ = _gate(replies_per_minute=3)
+    assert [g.classify(_update(user_id)) for user_id in range(100, 105)] == [gate.REPLY] * 3 + [gate.DROP] * 2
+    assert (g.counters['replied'], g.counters['replies_suppressed']) == (3, 2)
+    # 3 na minutę - kolejny żeton po 20 s
+    clock.advance(19)
+    assert g.classify(_update(105)) == gate.DROP
+    clock.advance(1)
+    assert g.classify(_update(106)) == gate.REPLY
+    assert (g.counters['replied'], g.counters['replies_suppressed']) == (4, 3)
+
+def test_lru_eviction(clock):
+    g, _ = _gate(max_senders=3, burst=1)
+    for user_id in (1, 2, 3):
+        g.classify(_update(user_id))
+    g.classify(_update(1))  # 1 znów najświeższy - najdawniej widziany jest teraz 2
+    g.classify(_update(4))
+    assert list(g.senders) == [3, 1, 4]
+    assert g.counters['evicted'] == 1
+    # Wyrzucony nadawca wraca z pełnym wiadrem (i kosztem nowego wpisu)
+    assert g.classify(_update(2)) == gate.REPLY
+    assert list(g.senders) == [1, 4, 2]
+    assert g.counters['evicted'] == 2
+    assert g.stats()['senders'] == 3
+
+class _Application:
+    def __init__(self):
+        self.tasks = []
+
+    def create_task(self, coroutine, update=None, name=None):
+        self.tasks.append((coroutine, name))
+
+def test_handle_stops_only_non_owners(clock):
+    g, replies = _gate(burst=2)
+    context = SimpleNamespace(application=_Application())
+    button = _update(8, callback=True)
+
+    async def scenario():
+        assert await g.handle(_update(OWNER), context) is None
+        assert context.application.tasks == []
+        for _ in range(3):  # odmowa z odpowiedzią, po cichu (okno), po cichu (throttling)
+            with pytest.raises(ApplicationHandlerStop):
+                await g.handle(_update(7), context)
+        with pytest.raises(ApplicationHandlerStop):
+            await g.handle(_update(None), context)
+        with pytest.raises(ApplicationHandlerStop):
+            await g.handle(button, context)
+        assert [name for _, name in context.application.tasks] == ['gate-deny', 'gate-deny']
+        for coroutine, _ in context.application.tasks:
+            await coroutine
+
+    asyncio.run(scenario())
+    assert replies == [(7, gate.DENIED_TEXT)]
+    assert button.callback_query.answers == [gate.DENIED_ANSWER]
+    assert g.stats() | {'top_senders': None} == {
+        'allowed': 1, 'denied': 3, 'throttled': 1, 'replied': 2, 'replies_suppressed': 0, 'anonymous': 1,
+        'evicted': 0, 'senders': 2, 'top_senders': None}
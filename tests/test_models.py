@@ -0,0 +1,80 @@
+"""Modele wierszy z projekcją kolumn kontra SELECT * z sqlite3.Row: pamięć i przepustowość list.
+
+Mierzy to samo, co robi /lista na dużej liście: pobranie aktywnych
+zadań i odczyt pól potrzebnych do sformatowania linii. Wyniki widać
+z `python -m pytest -s tests/test_models.py`.
+"""
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import database as db
+import models
+
+TASKS = 5000
+ROUNDS = 10
+
+def _fill():
+    conn = db.get_db_connection()
+    conn.executemany('INSERT INTO tasks (content, priority, category, score) VALUES (?, ?, ?, ?)',
+                     [(f"Zadanie numer {i} z dłuższą treścią", i % 4, f"kat{i % 7}", i % 13) for i in range(TASKS)])
+    conn.commit()
+    conn.close()
+
+def _rows_before() -> list:
+    """Dawna ścieżka: wszystkie kolumny, dostęp po nazwie."""
+    conn = sqlite3.connect(db.DB_NAME)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('SELECT * FROM tasks WHERE is_done = 0 ORDER BY score DESC, created_at DESC').fetchall()
+    conn.close()
+    return rows
+
+def _format_before(rows) -> int:
+    return sum(len(r['content']) + r['priority'] + (r['effort_minutes'] or 0) + bool(r['category']) for r in rows)
+
+def _format_after(tasks) -> int:
+    return sum(len(t.content) + t.priority + (t.effort_minutes or 0) + bool(t.category) for t in tasks)
+
+def _retained_bytes(fetch) -> int:
+    fetch()  # rozgrzewka (połączenie, cache zapytań)
+    tracemalloc.start()
+    rows = fetch()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return retained
+
+def _best_seconds(fetch, use) -> float:
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        use(fetch())
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def test_list_projection_beats_select_star(db_path):
+    _fill()
+    assert _format_before(_rows_before()) == _format_after(db.get_active_tasks())
+
+    memory = _retained_bytes(_rows_before), _retained_bytes(db.get_active_tasks)
+    seconds = _best_seconds(_rows_before, _format_before), _best_seconds(db.get_active_tasks, _format_after)
+    print(f"\n{TASKS} zadań - pamięć: {memory[0] // 1024} -> {memory[1] // 1024} KB, "
+          f"przepustowość: {1 / seconds[0]:.0f} -> {1 / seconds[1]:.0f} list/s")
+    assert memory[1] < memory[0]
+    assert seconds[1] < seconds[0]
+
+def test_list_rows_skip_unused_columns(db_path):
+    db.add_task("Raport", priority=1, category="praca")
+    [task] = db.get_active_tasks()
+    assert isinstance(task, models.Task)
+    # Listy nie pobierają daty utworzenia ani wyniku - zostają domyślne wartości modelu
+    assert (task.content, task.priority, task.category, task.created_at, task.score) == \
+        ("Raport", 1, "praca", None, 0)
+
+def test_claim_rows_carry_only_delivery_columns(db_path):
+    db.add_reminder("Leki", datetime.now() - timedelta(minutes=1), priority=1)
+    [reminder] = db.claim_due_reminders("a:1")
+    assert (reminder.content, reminder.nag_count, reminder.attempts) == ("Leki", 0, 0)
+    # Priorytet i pola rezerwacji nie są potrzebne wysyłce - nie są pobierane
+    assert (reminder.priority, reminder.claim_token) == (0, None)
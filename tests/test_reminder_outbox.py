@@ -0,0 +1,110 @@
+"""Outbox przypomnień (claim -> wysyłka -> ack/release) pod wstrzykiwanymi awariami.
+
+Kilka procesów rozsyła te same przypomnienia ze wspólnej bazy. Atrapa
+wysyłki losowo zawodzi (release z backoffem), a proces losowo "pada" po
+rezerwacji - nie potwierdza ani nie zwalnia, wiersz wraca po wygaśnięciu
+rezerwacji. Każde przypomnienie ma wyjść dokładnie raz i żadne nie może
+zostać niewysłane.
+"""
+import multiprocessing
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import database as db
+
+REMINDERS = 200
+WORKERS = 4
+BATCH = 5
+LEASE_SECONDS = 1
+SEND_FAIL_RATE = 0.3
+CRASH_RATE = 0.1
+DEADLINE_SECONDS = 60
+# Potwierdzone wracają (nagging) dopiero po teście
+NAG_AT = datetime.now() + timedelta(days=1)
+
+def _pending() -> int:
+    conn = db.get_db_connection()
+    count = conn.execute('SELECT COUNT(*) FROM reminders WHERE state = ?', (db.REMINDER_PENDING,)).fetchone()[0]
+    conn.close()
+    return count
+
+def _send(rng):
+    """Atrapa send_message: zawodzi z prawdopodobieństwem SEND_FAIL_RATE."""
+    if rng.random() < SEND_FAIL_RATE:
+        raise ConnectionError("wstrzyknięta awaria wysyłki")
+
+def _worker(seed: int, log_path: str, deadline: float):
+    """Pętla workera jak deliver_digest w bot.py; dostarczone ID dopisuje do `log_path`."""
+    rng = random.Random(seed)
+    with open(log_path, 'a') as log:
+        while time.monotonic() < deadline:
+            claim_token = db.new_claim_token(f"worker{seed}")
+            claimed = db.claim_due_reminders(claim_token, limit=BATCH, lease_seconds=LEASE_SECONDS)
+            if not claimed:
+                if not _pending():
+                    return
+                time.sleep(0.01)
+                continue
+            if rng.random() < CRASH_RATE:
+                continue  # padnięcie po rezerwacji
+            try:
+                _send(rng)
+            except ConnectionError:
+                for r in claimed:
+                    db.release_reminder(r.id, claim_token, r.attempts)
+                continue
+            log.write(''.join(f"{r.id}\n" for r in claimed))
+            log.flush()
+            acked = db.ack_reminders([r.id for r in claimed], claim_token, NAG_AT)
+            if sorted(acked) != sorted(r.id for r in claimed):
+                raise AssertionError(f"Rezerwacja wygasła przed potwierdzeniem: {claimed} vs {acked}")
+
+def test_no_duplicates_and_no_losses_under_faults(db_path, tmp_path, monkeypatch):
+    # Backoff po awarii w setnych sekundy zamiast 30 s
+    monkeypatch.setattr(db, 'RETRY_BASE_SECONDS', 0.01)
+    monkeypatch.setattr(db, 'RETRY_MAX_SECONDS', 0.2)
+    past = datetime.now() - timedelta(minutes=1)
+    ids = [db.add_reminder(f"r{i}", past) for i in range(REMINDERS)]
+
+    log_path = str(tmp_path / 'delivered.log')
+    deadline = time.monotonic() + DEADLINE_SECONDS
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_worker, args=(seed, log_path, deadline)) for seed in range(WORKERS)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(DEADLINE_SECONDS + 10)
+    assert [w.exitcode for w in workers] == [0] * WORKERS
+
+    with open(log_path) as log:
+        delivered = Counter(int(line) for line in log)
+    assert sorted(delivered) == sorted(ids)
+    assert [i for i, n in delivered.items() if n > 1] == []
+
+    conn = db.get_db_connection()
+    rows = conn.execute('SELECT state, nag_count, claim_token, attempts FROM reminders').fetchall()
+    conn.close()
+    assert {tuple(row) for row in rows} == {(db.REMINDER_NAGGING, 1, None, 0)}
+
+def test_expired_claim_cannot_be_acked(db_path):
+    reminder_id = db.add_reminder("r", datetime.now() - timedelta(minutes=1))
+    assert [r.id for r in db.claim_due_reminders("a:1", lease_seconds=0)] == [reminder_id]
+    # Rezerwacja wygasła - przejmuje ją inny worker, spóźniony ack pierwszego nic nie zmienia
+    assert [r.id for r in db.claim_due_reminders("b:1")] == [reminder_id]
+    assert db.claim_due_reminders("c:1") == []
+    assert db.ack_reminders([reminder_id], "a:1", NAG_AT) == []
+    assert db.ack_reminders([reminder_id], "b:1", NAG_AT) == [reminder_id]
+    assert db.get_reminder_by_id(reminder_id).nag_count == 1
+
+def test_release_backs_off_and_counts_attempts(db_path):
+    reminder_id = db.add_reminder("r", datetime.now() - timedelta(minutes=1))
+    claimed = db.claim_due_reminders("a:1")
+    assert db.release_reminder(reminder_id, "a:1", claimed[0].attempts)
+    assert not db.release_reminder(reminder_id, "a:1", 0)  # już nie jego
+    # Backoff: wiersz nie wraca od razu
+    assert db.claim_due_reminders("b:1") == []
+    reminder = db.get_reminder_by_id(reminder_id)
+    assert (reminder.attempts, reminder.claim_token) == (1, None)
+    assert reminder.claimed_until > str(datetime.now() + timedelta(seconds=db.RETRY_BASE_SECONDS - 5))
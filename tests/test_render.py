@@ -0,0 +1,95 @@
+"""render: losowe listy z dowolną treścią użytkownika (fuzz).
+
+Każda część po `split`/`truncate` musi przejść przez Telegram: znaczniki
+domknięte i poprawnie zagnieżdżone, w HTML każdy `&` to encja, w
+MarkdownV2 żaden znak specjalny nie zostaje bez escapowania, a widoczny
+tekst mieści się w MAX_MESSAGE_LENGTH jednostkach UTF-16.
+"""
+import random
+import re
+from html.parser import HTMLParser
+
+import models
+import render
+
+LISTS = 3000
+OVERLONG_RATE = 0.1  # część list kończy się linią dłuższą od limitu wiadomości
+# Znaki specjalne obu trybów, polskie litery, emoji (2 i więcej jednostek UTF-16), długie słowo
+_ALPHABET = list("abc ąęź_*`~<>&[]()#!.\\|{}-=+\n") + ['😀', '👨‍👩‍👧', 'x' * 50]
+_ENTITY = re.compile(r'&(?!amp;|lt;|gt;|quot;)')
+
+def _text(rng: random.Random, max_length: int) -> str:
+    return ''.join(rng.choices(_ALPHABET, k=rng.randint(0, max_length)))
+
+class _TagChecker(HTMLParser):
+    ALLOWED = {'b', 'i', 's', 'code', 'pre'}
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs):
+        assert tag in self.ALLOWED, tag
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.stack and self.stack.pop() == tag, tag
+
+def _check_html(chunk: str):
+    assert not _ENTITY.search(chunk), chunk
+    checker = _TagChecker()
+    checker.feed(chunk)
+    checker.close()
+    assert not checker.stack, chunk
+
+def _check_markdown(chunk: str):
+    # Bez escapów i wnętrza `code` znaczniki muszą się parować, pozostałe znaki specjalne są zakazane
+    body = re.sub(r'\\.', '', chunk, flags=re.S)
+    body = re.sub(r'`[^`]*`', '', body)
+    assert not re.search(r'[\[\]()>#+\-=|{}.!]', body), chunk
+    for marker in '*_~`':
+        assert body.count(marker) % 2 == 0, chunk
+
+def _check_chunks(text: str, markup: render.Markup, check):
+    for chunk in render.split(text, markup=markup):
+        assert chunk.strip()
+        assert render.utf16_len(markup.plain(chunk)) <= render.MAX_MESSAGE_LENGTH
+        check(chunk)
+    truncated = render.truncate(text, markup=markup)
+    assert render.utf16_len(markup.plain(truncated)) <= render.MAX_MESSAGE_LENGTH
+    check(truncated)
+
+def _random_list(rng: random.Random) -> tuple[list, list]:
+    tasks = [models.Task(i, _text(rng, 400), rng.randint(0, 3), _text(rng, 10) or None,
+                         effort_minutes=rng.choice([None, 30])) for i in range(rng.randint(0, 60))]
+    ideas = [models.Idea(i, _text(rng, 400), _text(rng, 8) or None) for i in range(rng.randint(0, 30))]
+    return tasks, ideas
+
+def test_split_keeps_every_chunk_valid():
+    rng = random.Random(1)
+    for _ in range(LISTS):
+        tasks, ideas = _random_list(rng)
+        for markup, check in ((render.HTML, _check_html), (render.MARKDOWN_V2, _check_markdown)):
+            lines = [markup.bold(render.clip(_text(rng, 20)))]
+            lines += [f"{markup.escape(f'{t.id}.')} {markup.escape(render.clip(t.content))} "
+                      f"{markup.code(render.clip(t.category or ''))}" for t in tasks]
+            lines += [markup.italic(render.clip(idea.content)) for idea in ideas]
+            if rng.random() < OVERLONG_RATE:
+                # Linia dłuższa od limitu - split tnie ją jako zwykły tekst
+                lines.append(markup.escape(_text(rng, 9000).replace('\n', ' ')))
+            _check_chunks('\n'.join(lines), markup, check)
+
+def test_templates_keep_every_chunk_valid():
+    rng = random.Random(2)
+    for _ in range(LISTS // 10):
+        tasks, ideas = _random_list(rng)
+        header = render.list_header(rng.choice([None, _text(rng, 10)]), [_text(rng, 10)])
+        reminders = [models.Reminder(t.id, t.content, '2026-10-19 12:00:00', nag_count=rng.randint(0, 3))
+                     for t in tasks]
+        recurring = [models.RecurringReminder(t.id, t.content, 'weekly', '4', '16:00', '2026-10-23 16:00:00')
+                     for t in tasks]
+        for message in (render.task_list(header, tasks, ideas, {}, set(), {}, {}, prompt="x"),
+                        render.next_actions(tasks), render.briefing(tasks), render.history(tasks, 20),
+                        render.idea_review(ideas), render.reminder_digest(reminders, recurring),
+                        render.reminder_list(reminders, {}), render.recurring_list(recurring)):
+            _check_chunks(message, render.HTML, _check_html)
@@ -0,0 +1,141 @@
+"""OutboundQueue z atrapą Bota: kolejność per czat, flood control, backoff, dead letters, limity.
+
+Atrapa nie wysyła niczego - zapisuje (czas, czat, tekst) każdej próby i
+rzuca błędy wskazane przez test. Czas jest prawdziwy: limity i pauzy
+mierzymy zegarem, jak zobaczyłby je Telegram.
+"""
+import asyncio
+import random
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import database as db
+import sender
+
+class FakeBot:
+    """send_message zapisuje próbę; `failures[(chat_id, text)]` to wyjątki dla kolejnych prób."""
+
+    def __init__(self, failures: dict | None = None):
+        self.failures = failures or {}
+        self.attempts = []   # (czas, chat_id, text)
+        self.delivered = []  # (czas, chat_id, text)
+
+    async def send_message(self, chat_id, text):
+        now = time.monotonic()
+        self.attempts.append((now, chat_id, text))
+        pending = self.failures.get((chat_id, text))
+        if pending:
+            raise pending.pop(0)
+        self.delivered.append((now, chat_id, text))
+        return text
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    """Backoff w setnych sekundy, bez jittera (mnożnik 1.0)."""
+    monkeypatch.setattr(sender, 'BACKOFF_BASE_SECONDS', 0.02)
+    monkeypatch.setattr(sender.random, 'uniform', lambda a, b: 1.0)
+
+def _queue(bot: FakeBot, unlimited: bool = True) -> sender.OutboundQueue:
+    queue = sender.OutboundQueue()
+    queue.start(bot)
+    if unlimited:
+        queue.set_rate_limits(10_000, 10_000, 10_000)
+    return queue
+
+async def _send_all(queue: sender.OutboundQueue, messages: list) -> list:
+    """Wysyła [(chat_id, text)] współbieżnie; zwraca wyniki albo wyjątki w tej samej kolejności."""
+    return await asyncio.gather(*(queue.send('send_message', chat_id, text=text) for chat_id, text in messages),
+                                return_exceptions=True)
+
+def _dead_letters() -> list:
+    return [(row['chat_id'], row['error'].split('(')[0], row['attempts']) for row in db.get_dead_letters(100)]
+
+def test_per_chat_order_survives_retries(db_path, fast_backoff):
+    rng = random.Random(7)
+    messages = [(chat_id, f"{chat_id}-{i}") for i in range(20) for chat_id in (1, 2, 3)]
+    failures = {m: [NetworkError("timeout")] * rng.randint(1, 2) for m in messages if rng.random() < 0.3}
+    injected = sum(map(len, failures.values()))
+    bot = FakeBot(failures)
+    results = asyncio.run(_send_all(_queue(bot), messages))
+    assert results == [text for _, text in messages]
+    for chat_id in (1, 2, 3):
+        # Ponowienie blokuje kolejkę czatu - następna wiadomość nie wyprzedza ponawianej
+        assert [text for _, c, text in bot.delivered if c == chat_id] == [f"{chat_id}-{i}" for i in range(20)]
+    assert injected and len(bot.attempts) == len(messages) + injected
+    assert _dead_letters() == []
+
+def test_retry_after_pauses_every_chat(db_path, fast_backoff):
+    pause = 0.5
+    bot = FakeBot({(1, "a"): [RetryAfter(timedelta(seconds=pause))]})
+    results = asyncio.run(_send_all(_queue(bot), [(1, "a"), (1, "b"), (2, "c"), (3, "d")]))
+    assert results == ["a", "b", "c", "d"]
+    flooded = bot.attempts[0][0]
+    # Flood control dotyczy całego bota: po RetryAfter żaden czat nie wysyła przed końcem pauzy
+    later = [stamp for stamp, _, _ in bot.attempts[1:] if stamp > flooded]
+    assert later and min(later) - flooded >= pause * 0.95
+    assert [text for _, c, text in bot.delivered if c == 1] == ["a", "b"]
+    assert _dead_letters() == []
+
+def test_network_backoff_grows_then_dead_letters(db_path, fast_backoff):
+    bot = FakeBot({(1, "x"): [NetworkError("connection reset")] * sender.MAX_ATTEMPTS})
+    [result] = asyncio.run(_send_all(_queue(bot), [(1, "x")]))
+    assert isinstance(result, sender.DeliveryFailed)
+    stamps = [stamp for stamp, _, _ in bot.attempts]
+    assert len(stamps) == sender.MAX_ATTEMPTS
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    # 0.02, 0.04, 0.08, 0.16 s - każda przerwa co najmniej dwa razy dłuższa od poprzedniej (z tolerancją)
+    assert all(gap >= sender.BACKOFF_BASE_SECONDS * 2 ** i * 0.9 for i, gap in enumerate(gaps)), gaps
+    assert all(later > earlier * 1.5 for earlier, later in zip(gaps, gaps[1:])), gaps
+    assert _dead_letters() == [('1', 'NetworkError', sender.MAX_ATTEMPTS)]
+
+def test_backoff_delay_jitter_and_cap():
+    rng_values = []
+    for attempt in range(10):
+        delay = sender.backoff_delay(attempt)
+        expected = min(sender.BACKOFF_MAX_SECONDS, sender.BACKOFF_BASE_SECONDS * 2 ** attempt)
+        assert 0.5 * expected <= delay <= 1.5 * expected
+        rng_values.append(delay / expected)
+    assert len(set(rng_values)) > 1  # jitter
+
+def test_permanent_failures_dead_letter_without_retry(db_path, fast_backoff):
+    bot = FakeBot({
+        (1, "blocked"): [Forbidden("bot was blocked by the user")],
+        (2, "bad"): [BadRequest("can't parse entities")],
+        (3, "same"): [BadRequest("Message is not modified")],
+    })
+    results = asyncio.run(_send_all(_queue(bot), [(1, "blocked"), (1, "next"), (2, "bad"), (3, "same")]))
+    assert isinstance(results[0], Forbidden) and isinstance(results[2], BadRequest)
+    assert isinstance(results[3], BadRequest)
+    assert results[1] == "next"  # błąd jednej wiadomości nie blokuje kolejki czatu
+    assert len(bot.attempts) == 4
+    # "not modified" to nie awaria - bez wpisu
+    assert sorted(_dead_letters()) == [('1', 'Forbidden', 1), ('2', 'BadRequest', 1)]
+
+def _rate(stamps: list) -> float:
+    """Wiadomości na sekundę w stanie ustalonym (po początkowej serii)."""
+    return (len(stamps) - 1) / (stamps[-1] - stamps[0])
+
+def test_global_rate_limit_throughput(db_path):
+    bot = FakeBot()
+    # Każda wiadomość do innego czatu - działa tylko limit globalny
+    messages = [(chat_id, "x") for chat_id in range(3 * sender.GLOBAL_RATE)]
+    asyncio.run(_send_all(_queue(bot, unlimited=False), messages))
+    stamps = sorted(stamp for stamp, _, _ in bot.delivered)
+    assert len(stamps) == len(messages)
+    sustained = _rate(stamps[sender.GLOBAL_RATE:])
+    assert sender.GLOBAL_RATE * 0.8 <= sustained <= sender.GLOBAL_RATE * 1.1, sustained
+
+def test_per_chat_rate_limit_throughput(db_path):
+    bot = FakeBot()
+    burst = sender.PER_CHAT_BURST
+    messages = [(1, f"m{i}") for i in range(burst + 3)]
+    asyncio.run(_send_all(_queue(bot, unlimited=False), messages))
+    stamps = [stamp for stamp, _, _ in bot.delivered]
+    # Seria od razu, potem jedna na sekundę
+    assert stamps[burst - 1] - stamps[0] < 0.1
+    sustained = _rate(stamps[burst - 1:])
+    assert sender.PER_CHAT_RATE * 0.9 <= sustained <= sender.PER_CHAT_RATE * 1.1, sustained
+    assert [text for _, _, text in bot.delivered] == [text for _, text in messages]
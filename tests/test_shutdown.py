@@ -0,0 +1,130 @@
+"""SIGTERM w trakcie wysyłki: drenaż, zwolnienie rezerwacji, szybkie przejęcie przez następny proces.
+
+Worker to osobny proces z `run_worker` i atrapą Bot API (replay.py), której
+send_message trwa `--send-seconds`. Uruchomiony bezpośrednio plik działa
+jako taki proces:
+
+    python tests/test_shutdown.py <baza> <log> <send-seconds>
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHUTDOWN_TIMEOUT_SECONDS = 1
+HANG_SECONDS = 60            # wysyłka, która nie skończy się przed terminem zamknięcia
+TIMEOUT_SECONDS = 30
+# Następny proces przejmuje zwolnione przypomnienie od razu, nie po wygaśnięciu rezerwacji
+# (CLAIM_LEASE_SECONDS) - mieści się w tym czasie razem ze startem interpretera
+RESTART_BOUND_SECONDS = 5
+
+def _spawn(db_path: str, log_path: str, send_seconds: float) -> subprocess.Popen:
+    env = {**os.environ, 'SHUTDOWN_TIMEOUT_SECONDS': str(SHUTDOWN_TIMEOUT_SECONDS)}
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), db_path, log_path, str(send_seconds)],
+                            cwd=ROOT, env=env)
+
+def _events(log_path: str, kind: str) -> list:
+    """[(czas, tekst)] zdarzeń `kind` (start / sent) z logu atrapy."""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as log:
+        entries = [line.rstrip('\n').split(' ', 2) for line in log]
+    return [(float(stamp), text) for event, stamp, text in entries if event == kind]
+
+def _wait_for(predicate, timeout: float = TIMEOUT_SECONDS) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+def _row(db, reminder_id: int) -> tuple:
+    r = db.get_reminder_by_id(reminder_id)
+    return r.state, r.is_sent, r.nag_count, r.attempts, r.claim_token, r.claimed_until
+
+def _terminate(process: subprocess.Popen) -> float:
+    """SIGTERM i czas do zakończenia procesu."""
+    signalled = time.monotonic()
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(TIMEOUT_SECONDS) == 0
+    return time.monotonic() - signalled
+
+def test_sigterm_mid_send_releases_claim_and_next_process_delivers(db_path, tmp_path):
+    import database as db
+    reminder_id = db.add_reminder("Leki", datetime.now() - timedelta(minutes=1))
+    log_path = str(tmp_path / 'sent.log')
+
+    worker = _spawn(db_path, log_path, HANG_SECONDS)
+    try:
+        assert _wait_for(lambda: _events(log_path, 'start'))
+        assert db.get_reminder_by_id(reminder_id).claim_token is not None
+        # Wysyłka wisi - przerwana po terminie zamknięcia, nie po HANG_SECONDS
+        assert _terminate(worker) < SHUTDOWN_TIMEOUT_SECONDS + 2
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+    assert _events(log_path, 'sent') == []
+    # Rezerwacja zwolniona przy zamknięciu, przerwana wysyłka nie liczy się jako nieudana próba
+    assert _row(db, reminder_id) == (db.REMINDER_PENDING, 0, 0, 0, None, None)
+
+    restarted = time.time()
+    worker = _spawn(db_path, log_path, 0)
+    try:
+        assert _wait_for(lambda: _events(log_path, 'sent'), RESTART_BOUND_SECONDS)
+        delivered_at, text = _events(log_path, 'sent')[0]
+        assert delivered_at - restarted < RESTART_BOUND_SECONDS
+        assert 'Leki' in text
+    finally:
+        _terminate(worker)
+    assert len(_events(log_path, 'sent')) == 1
+    assert _row(db, reminder_id)[:3] == (db.REMINDER_NAGGING, 0, 1)
+
+def test_sigterm_drains_send_in_flight(db_path, tmp_path):
+    import database as db
+    reminder_id = db.add_reminder("Leki", datetime.now() - timedelta(minutes=1))
+    log_path = str(tmp_path / 'sent.log')
+    send_seconds = SHUTDOWN_TIMEOUT_SECONDS / 2
+
+    worker = _spawn(db_path, log_path, send_seconds)
+    try:
+        assert _wait_for(lambda: _events(log_path, 'start'))
+        # Wysyłka mieści się w terminie - kończy się i jest potwierdzona przed wyjściem
+        assert _terminate(worker) < SHUTDOWN_TIMEOUT_SECONDS + 2
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+    assert len(_events(log_path, 'sent')) == 1
+    assert _row(db, reminder_id) == (db.REMINDER_NAGGING, 0, 1, 0, None, None)
+
+def _worker_main(db_path: str, log_path: str, send_seconds: float):
+    sys.path.insert(0, ROOT)
+    import database as db
+    db.DB_NAME = db_path
+    import bot
+    import replay
+    from telegram import Bot
+
+    def log(event: str, text: str):
+        with open(log_path, 'a') as f:
+            f.write(f"{event} {time.time()} {text!r}\n")
+
+    class SlowStub(replay.StubRequest):
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            if url.endswith('/sendMessage'):
+                text = request_data.parameters['text']
+                log('start', text)
+                await asyncio.sleep(send_seconds)
+                log('sent', text)
+            return await super().do_request(url, method, request_data, **kwargs)
+
+    bot.WORKER_POLL_SECONDS = 0.1
+    asyncio.run(bot.run_worker(Bot(bot.TOKEN, request=SlowStub())))
+
+if __name__ == '__main__':
+    _worker_main(sys.argv[1], sys.argv[2], float(sys.argv[3]))
@@ -0,0 +1,268 @@
+"""Wspólny kontrakt silników przechowywania (FOCUSBOT_STORAGE: sqlite | memory | writethrough).
+
+Każdy test przechodzi przez każdy silnik - wynik zapytania nie może
+zależeć od tego, który jest włączony.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import database as db
+import storage
+
+NOW = datetime.now().replace(microsecond=0)
+PAST = NOW - timedelta(minutes=5)
+FUTURE = NOW + timedelta(hours=2)
+
+def _ts(value: datetime) -> str:
+    return value.isoformat(' ')
+
+@pytest.fixture(params=sorted(storage.STORAGE_ENGINES))
+def store(request, db_path):
+    return storage.open_storage(request.param)
+
+def test_incomplete_engine_fails_on_creation():
+    class NoPromotion(storage.Storage):
+        def categories(self):
+            return []
+
+        def calendar_version(self):
+            return 0
+
+    with pytest.raises(TypeError, match='promote_idea'):
+        NoPromotion()
+
+# --- Zadania ---
+
+def test_task_add_get(store):
+    due = NOW + timedelta(days=1)
+    task_id = store.tasks.add("Raport", priority=2, category="praca", due_at=due, effort_minutes=30)
+    task = store.tasks.get(task_id)
+    assert (task.id, task.content, task.priority, task.category, task.due_at, task.effort_minutes, task.is_done) == \
+        (task_id, "Raport", 2, "praca", _ts(due), 30, 0)
+    assert store.tasks.get(task_id + 1) is None
+
+def test_task_list_active_by_score_and_category(store):
+    low = store.tasks.add("Mleko", category="dom")
+    high = store.tasks.add("Podatki", priority=3, category="dom")
+    mid = store.tasks.add("Raport", priority=1, category="praca")
+    assert [t.id for t in store.tasks.list_active()] == [high, mid, low]
+    assert [t.id for t in store.tasks.list_active("dom")] == [high, low]
+    listed = store.tasks.list_active("praca")[0]
+    assert (listed.content, listed.priority, listed.category) == ("Raport", 1, "praca")
+
+def test_task_ties_newest_first(store):
+    # Dodane w tej samej sekundzie, z tym samym wynikiem - nowsze (wyższe ID) pierwsze
+    ids = [store.tasks.add(f"Zadanie {i}") for i in range(3)]
+    assert [t.id for t in store.tasks.list_active()] == ids[::-1]
+    assert [t.id for t in store.tasks.list_unblocked()] == ids[::-1]
+    for task_id in ids:
+        store.tasks.mark_done(task_id)
+    assert [t.id for t in store.tasks.list_completed()] == ids[::-1]
+
+def test_task_update(store):
+    task_id = store.tasks.add("Mleko")
+    assert store.tasks.update(task_id, "Mleko 2%", priority=1, effort_minutes=15)
+    task = store.tasks.get(task_id)
+    assert (task.content, task.priority, task.effort_minutes) == ("Mleko 2%", 1, 15)
+    assert not store.tasks.update(task_id + 1, "x")
+
+def test_task_complete_with_subtasks(store):
+    parent = store.tasks.add("Projekt")
+    child = store.tasks.add("Krok", parent_id=parent)
+    other = store.tasks.add("Inne")
+    assert store.tasks.mark_done(parent)
+    assert [t.id for t in store.tasks.list_active()] == [other]
+    assert sorted(t.id for t in store.tasks.list_completed()) == [parent, child]
+    assert store.tasks.get(child).is_done == 1
+    assert not store.tasks.mark_done(other + 1)
+
+def test_task_delete_with_subtasks(store):
+    parent = store.tasks.add("Projekt")
+    child = store.tasks.add("Krok", parent_id=parent)
+    assert store.tasks.delete(parent)
+    assert store.tasks.get(parent) is None and store.tasks.get(child) is None
+    assert store.tasks.list_active() == []
+    assert not store.tasks.delete(parent)
+
+def test_task_dependency(store):
+    first, second = store.tasks.add("Projekt"), store.tasks.add("Wdrożenie")
+    assert store.tasks.add_dependency(second, first)
+    assert store.tasks.blocked_ids() == {second}
+    assert not store.tasks.add_dependency(second, first)  # już istnieje
+    assert not store.tasks.add_dependency(first, second)  # cykl
+    assert not store.tasks.add_dependency(first, first)
+    assert store.tasks.remove_dependency(second, first)
+    assert store.tasks.blocked_ids() == set()
+    assert not store.tasks.remove_dependency(second, first)
+
+# --- Pomysły ---
+
+def test_idea_add_get_list(store):
+    first = store.ideas.add("Aplikacja", category="dev")
+    second = store.ideas.add("Książka")
+    idea = store.ideas.get(first)
+    assert (idea.content, idea.category, idea.archived) == ("Aplikacja", "dev", 0)
+    assert [i.id for i in store.ideas.list()] == [second, first]
+    assert [i.id for i in store.ideas.list("dev")] == [first]
+    assert store.ideas.get(second + 1) is None
+
+def test_idea_update_delete(store):
+    idea_id = store.ideas.add("Aplikacja")
+    assert store.ideas.update(idea_id, "Aplikacja mobilna")
+    assert store.ideas.get(idea_id).content == "Aplikacja mobilna"
+    assert store.ideas.delete(idea_id)
+    assert store.ideas.get(idea_id) is None and store.ideas.list() == []
+    assert not store.ideas.update(idea_id, "x")
+    assert not store.ideas.delete(idea_id)
+
+# --- Przypomnienia ---
+
+def _reminder_fields(r) -> tuple:
+    return r.id, r.content, r.remind_at, r.state, r.nag_count, r.priority
+
+def test_reminder_add_get_list(store):
+    later = store.reminders.add("Później", FUTURE)
+    sooner = store.reminders.add("Leki", PAST, priority=1)
+    reminder = store.reminders.get(sooner)
+    assert _reminder_fields(reminder) == (sooner, "Leki", _ts(PAST), db.REMINDER_PENDING, 0, 1)
+    assert (reminder.is_sent, reminder.claim_token, reminder.attempts) == (0, None, 0)
+    assert [_reminder_fields(r) for r in store.reminders.list_active()] == [
+        _reminder_fields(reminder), _reminder_fields(store.reminders.get(later))]
+    assert store.reminders.get(sooner + 1) is None
+
+def test_reminder_claim(store):
+    # "Za chwilę" liczone od teraz - NOW modułu mógł minąć, gdy wcześniejsze testy trwały
+    now = datetime.now()
+    due = store.reminders.add("Należne", PAST)
+    urgent = store.reminders.add("Pilne", PAST, priority=1)
+    soon = store.reminders.add("Za chwilę", now + timedelta(seconds=30))
+    store.reminders.add("Później", FUTURE)
+    assert [r.id for r in store.reminders.claim_due("a:1", urgent_only=True)] == [urgent]
+    # Zarezerwowane nie wracają do innego workera, dopóki rezerwacja trwa
+    assert [r.id for r in store.reminders.claim_due("b:1")] == [due]
+    assert [r.id for r in store.reminders.claim_due("c:1", due_before=now + timedelta(minutes=1))] == [soon]
+    assert store.reminders.claim_due("d:1", due_before=now + timedelta(minutes=1)) == []
+    claimed = store.reminders.get(due)
+    assert claimed.claim_token == "b:1" and claimed.claimed_until > _ts(datetime.now())
+
+def test_reminder_ack_nags(store):
+    reminder_id = store.reminders.add("Leki", PAST, priority=1)
+    store.reminders.claim_due("a:1")
+    nag_at = NOW + timedelta(minutes=10)
+    assert store.reminders.ack([reminder_id], "b:1", nag_at) == []
+    assert store.reminders.ack([reminder_id], "a:1", nag_at) == [reminder_id]
+    reminder = store.reminders.get(reminder_id)
+    assert _reminder_fields(reminder) == (reminder_id, "Leki", _ts(nag_at), db.REMINDER_NAGGING, 1, 1)
+    assert (reminder.claim_token, reminder.claimed_until, reminder.is_sent) == (None, None, 0)
+    # Lista pokazuje to samo co pojedynczy odczyt (licznik ponowień, priorytet)
+    assert [_reminder_fields(r) for r in store.reminders.list_active()] == [_reminder_fields(reminder)]
+    assert store.reminders.ack([reminder_id], "a:1", nag_at) == []
+
+def test_reminder_release(store):
+    reminder_id = store.reminders.add("Leki", PAST)
+    store.reminders.claim_due("a:1")
+    assert not store.reminders.release(reminder_id, "b:1", 0)
+    assert store.reminders.release(reminder_id, "a:1", 0)
+    reminder = store.reminders.get(reminder_id)
+    assert (reminder.claim_token, reminder.attempts, reminder.state) == (None, 1, db.REMINDER_PENDING)
+    assert reminder.claimed_until > _ts(datetime.now())
+    assert store.reminders.claim_due("b:1") == []  # backoff
+
+def test_reminder_snooze(store):
+    reminder_id = store.reminders.add("Leki", PAST)
+    store.reminders.claim_due("a:1")
+    assert store.reminders.snooze(reminder_id, FUTURE)
+    reminder = store.reminders.get(reminder_id)
+    assert (reminder.state, reminder.remind_at, reminder.claim_token) == (db.REMINDER_SNOOZED, _ts(FUTURE), None)
+    # Rezerwacja sprzed drzemki jest nieważna
+    assert store.reminders.ack([reminder_id], "a:1", NOW) == []
+    assert store.reminders.claim_due("b:1") == []
+    assert [r.state for r in store.reminders.list_active()] == [db.REMINDER_SNOOZED]
+
+def test_reminder_complete_delete(store):
+    done = store.reminders.add("Leki", PAST)
+    other = store.reminders.add("Inne", FUTURE)
+    assert store.reminders.complete(done)
+    reminder = store.reminders.get(done)
+    assert (reminder.state, reminder.is_sent) == (db.REMINDER_DONE, 1)
+    assert not store.reminders.complete(done)
+    assert not store.reminders.snooze(done, FUTURE)
+    assert [r.id for r in store.reminders.list_active()] == [other]
+    assert store.reminders.claim_due("a:1") == []
+    assert store.reminders.delete(other)
+    assert store.reminders.get(other) is None and store.reminders.list_active() == []
+    assert not store.reminders.delete(other)
+
+# --- Przypomnienia cykliczne ---
+
+def _recurring_fields(r) -> tuple:
+    return (r.id, r.content, r.schedule_type, r.schedule_days, r.schedule_time, r.next_run, r.attempts,
+            r.priority, r.is_active)
+
+def test_recurring_add_get_list(store):
+    weekly = store.recurring.add("Raport", 'weekly', '4', '16:00', FUTURE)
+    daily = store.recurring.add("Leki", 'daily', None, '08:00', PAST, priority=1)
+    reminder = store.recurring.get(daily)
+    assert _recurring_fields(reminder) == (daily, "Leki", 'daily', None, '08:00', _ts(PAST), 0, 1, 1)
+    assert [_recurring_fields(r) for r in store.recurring.list_active()] == [
+        _recurring_fields(reminder), _recurring_fields(store.recurring.get(weekly))]
+    assert store.recurring.get(daily + 1) is None
+
+def test_recurring_claim_ack(store):
+    due = store.recurring.add("Leki", 'daily', None, '08:00', PAST)
+    store.recurring.add("Raport", 'weekly', '4', '16:00', FUTURE)
+    assert store.recurring.claim_due("a:1", urgent_only=True) == []
+    assert [r.id for r in store.recurring.claim_due("a:1")] == [due]
+    assert store.recurring.claim_due("b:1") == []
+    next_run = NOW + timedelta(days=1)
+    assert not store.recurring.ack(due, "b:1", next_run)
+    assert store.recurring.ack(due, "a:1", next_run)
+    reminder = store.recurring.get(due)
+    assert (reminder.next_run, reminder.claim_token, reminder.claimed_until) == (_ts(next_run), None, None)
+    assert not store.recurring.ack(due, "a:1", next_run)
+    assert store.recurring.claim_due("b:1") == []
+
+def test_recurring_release(store):
+    due = store.recurring.add("Leki", 'daily', None, '08:00', PAST)
+    store.recurring.claim_due("a:1")
+    assert not store.recurring.release(due, "b:1", 0)
+    assert store.recurring.release(due, "a:1", 0)
+    reminder = store.recurring.get(due)
+    assert (reminder.claim_token, reminder.attempts) == (None, 1)
+    assert [_recurring_fields(r) for r in store.recurring.list_active()] == [_recurring_fields(reminder)]
+    assert store.recurring.claim_due("b:1") == []  # backoff
+
+def test_recurring_delete(store):
+    reminder_id = store.recurring.add("Leki", 'daily', None, '08:00', PAST)
+    assert store.recurring.delete(reminder_id)
+    assert store.recurring.get(reminder_id) is None and store.recurring.list_active() == []
+    assert store.recurring.claim_due("a:1") == []
+    assert not store.recurring.delete(reminder_id)
+
+# --- Dziennik (SQLite) ---
+
+def _journal_ops() -> list:
+    conn = db.get_db_connection()
+    ops = [row['op'] for row in conn.execute('SELECT op FROM journal ORDER BY id')]
+    conn.close()
+    return ops
+
+def test_duplicate_dependency_not_journaled(db_path):
+    first, second = db.add_task("Projekt"), db.add_task("Wdrożenie")
+    assert db.add_task_dependency(second, first)
+    assert not db.add_task_dependency(second, first)
+    assert _journal_ops() == ['add_task', 'add_task', 'add_dependency']
+    # Jedno /cofnij cofa jedyną zależność, nie fantomowy duplikat
+    assert [e.op for e in db.undo_last()] == ['add_dependency']
+    assert db.get_blocked_task_ids() == set()
+
+def test_attachment_undone_with_its_task(db_path):
+    with db.journal_batch():
+        task_id = db.add_task("Zdjęcie: paragon.jpg")
+        attachment_id = db.add_attachment('task', task_id, 'photo', 'f1', 'u1', 'paragon.jpg', 'image/jpeg', 10)
+    # Skrót pobranej treści to stan pochodny - bez wpisu
+    assert db.set_attachment_sha256(attachment_id, 'ab' * 32)
+    assert _journal_ops() == ['add_task', 'add_attachment']
+    assert [e.op for e in db.undo_last()] == ['add_attachment', 'add_task']
+    assert db.get_task_by_id(task_id) is None and db.get_attachment(attachment_id) is None
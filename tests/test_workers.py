@@ -0,0 +1,167 @@
+"""Procesy `bot.py --worker` na wspólnej bazie: przepustowość, brak duplikatów, przejęcie lidera.
+
+Każdy worker to osobny proces z `run_worker` i atrapą Bot API (replay.py),
+która zapisuje dostarczone przypomnienia do wspólnego logu. Uruchomiony
+bezpośrednio plik działa jako taki proces:
+
+    python tests/test_workers.py <baza> <log> [--until-leader] [--go <plik>]
+"""
+import asyncio
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEND_SECONDS = 0.2   # czas jednego send_message w atrapie
+DIGESTS = 16         # tyle wiadomości (po MAX_REMINDER_ROWS przypomnień) do rozesłania
+WORKERS = 4
+TIMEOUT_SECONDS = 30
+_CONTENT = re.compile(r'rem-(\d+)')
+
+def _spawn(db_path: str, log_path: str, *args: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), db_path, log_path, *args], cwd=ROOT)
+
+def _wait_for(predicate, timeout: float = TIMEOUT_SECONDS, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+def _read_log(log_path: str) -> list:
+    """[(czas zakończenia wysyłki, [ID przypomnień])] ze wszystkich procesów."""
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as log:
+        entries = [line.split(' ', 1) for line in log]
+    return [(float(stamp), [int(i) for i in _CONTENT.findall(text)]) for stamp, text in entries]
+
+def _pending(db) -> int:
+    conn = db.get_db_connection()
+    count = conn.execute('SELECT COUNT(*) FROM reminders WHERE state = ?', (db.REMINDER_PENDING,)).fetchone()[0]
+    conn.close()
+    return count
+
+def _stop(processes):
+    for p in processes:
+        p.send_signal(signal.SIGTERM)
+    return [p.wait(TIMEOUT_SECONDS) for p in processes]
+
+def _deliver_all(db, tmp_path, workers: int) -> tuple[float, Counter]:
+    """Rozsyła DIGESTS digestów przez `workers` procesów; zwraca (czas rozsyłania, ile razy wyszło każde ID)."""
+    import keyboards
+    log_path = str(tmp_path / f'sent-{workers}.log')
+    go_path = str(tmp_path / f'go-{workers}')
+    past = datetime.now() - timedelta(minutes=1)
+    ids = [db.add_reminder(f"rem-{i}", past) for i in range(DIGESTS * keyboards.MAX_REMINDER_ROWS)]
+    processes = [_spawn(db.DB_NAME, log_path, '--go', go_path) for _ in range(workers)]
+    try:
+        # Wszystkie procesy po imporcie czekają na plik startowy - mierzymy samo rozsyłanie
+        assert _wait_for(lambda: all(os.path.exists(f"{go_path}.{p.pid}") for p in processes))
+        open(go_path, 'w').close()
+        assert _wait_for(lambda: not _pending(db))
+    finally:
+        assert _stop(processes) == [0] * workers
+    entries = _read_log(log_path)
+    delivered = Counter(i for _, batch in entries for i in batch)
+    assert sorted(delivered) == list(range(len(ids)))
+    # Od początku pierwszej wysyłki do końca ostatniej (bez startu pętli asyncio i bota)
+    stamps = [stamp for stamp, _ in entries]
+    return max(stamps) - min(stamps) + SEND_SECONDS, delivered
+
+def test_throughput_rises_with_workers_without_duplicates(db_path, tmp_path):
+    import database as db
+    single, delivered = _deliver_all(db, tmp_path, 1)
+    assert max(delivered.values()) == 1
+    parallel, delivered = _deliver_all(db, tmp_path, WORKERS)
+    assert max(delivered.values()) == 1
+    # Bez wspólnych rezerwacji workery wysyłałyby to samo; z nimi dzielą się digestami
+    assert parallel < single / 2, (single, parallel)
+
+def _leader(db) -> str | None:
+    conn = db.get_db_connection()
+    row = conn.execute('SELECT holder FROM leases WHERE name = ?', ('updates',)).fetchone()
+    conn.close()
+    return row['holder'] if row else None
+
+def test_worker_takes_over_released_lease(db_path, tmp_path):
+    import database as db
+    assert db.acquire_lease('updates', 'leader', 60)
+    log_path = str(tmp_path / 'sent.log')
+    worker = _spawn(db_path, log_path, '--until-leader')
+    try:
+        # Dopóki lider trzyma dzierżawę, proces rozsyła przypomnienia jako worker
+        db.add_reminder("rem-1", datetime.now() - timedelta(minutes=1))
+        assert _wait_for(lambda: _read_log(log_path))
+        assert worker.poll() is None and _leader(db) == 'leader'
+        assert db.release_lease('updates', 'leader')
+        assert worker.wait(TIMEOUT_SECONDS) == 0
+    finally:
+        if worker.poll() is None:
+            _stop([worker])
+    assert _leader(db) == f"{socket.gethostname()}-{worker.pid}"
+    assert not db.acquire_lease('updates', 'leader', 60)
+
+def test_worker_takes_over_expired_lease(db_path, tmp_path):
+    import database as db
+    ttl = 3
+    taken = time.monotonic()
+    assert db.acquire_lease('updates', 'leader', ttl)
+    worker = _spawn(db_path, str(tmp_path / 'sent.log'), '--until-leader')
+    try:
+        assert worker.wait(TIMEOUT_SECONDS) == 0
+    finally:
+        if worker.poll() is None:
+            _stop([worker])
+    # Lider nie odnowił dzierżawy - przejęcie dopiero po TTL, nie wcześniej
+    assert time.monotonic() - taken >= ttl
+    assert _leader(db) == f"{socket.gethostname()}-{worker.pid}"
+    assert not db.acquire_lease('updates', 'leader', ttl)
+
+def test_lease_renewal_and_release(db_path):
+    import database as db
+    assert db.acquire_lease('updates', 'a', 60)
+    assert db.acquire_lease('updates', 'a', 60)  # odnowienie
+    assert not db.acquire_lease('updates', 'b', 60)
+    assert not db.release_lease('updates', 'b')
+    assert db.release_lease('updates', 'a')
+    assert db.acquire_lease('updates', 'b', 0)
+    assert db.acquire_lease('updates', 'a', 60)  # TTL 0 - od razu do przejęcia
+
+def _worker_main(db_path: str, log_path: str, until_leader: bool, go_path: str | None):
+    sys.path.insert(0, ROOT)
+    import database as db
+    db.DB_NAME = db_path
+    import bot
+    import replay
+    from telegram import Bot
+
+    class LoggingStub(replay.StubRequest):
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            if url.endswith('/sendMessage'):
+                await asyncio.sleep(SEND_SECONDS)
+                with open(log_path, 'a') as log:
+                    log.write(f"{time.time()} {request_data.parameters['text']!r}\n")
+            return await super().do_request(url, method, request_data, **kwargs)
+
+    bot.WORKER_POLL_SECONDS = 0.1
+    # Limity Telegrama dotyczą jednego bota - tu mierzymy same workery
+    bot.outbound.set_rate_limits(1000, 1000, 1000)
+    if go_path:
+        open(f"{go_path}.{os.getpid()}", 'w').close()
+        while not os.path.exists(go_path):
+            time.sleep(0.01)
+    asyncio.run(bot.run_worker(Bot(bot.TOKEN, request=LoggingStub()), until_leader=until_leader))
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    go = args[args.index('--go') + 1] if '--go' in args else None
+    _worker_main(args[0], args[1], '--until-leader' in args, go)
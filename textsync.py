@@ -0,0 +1,374 @@
+"""Dwustronna synchronizacja zadań i pomysłów z plikiem tekstowym (todo.txt lub Markdown).
+
+- Linia = pozycja w składni bota (`!!` priorytet, `#kategoria` - parsowane
+  jak w /zadanie) plus identyfikator wiersza, który łączy ją z bazą:
+  todo.txt:  `!! Zapłacić podatki #dom id:12`, pomysł z `+pomysl`,
+             `x ` na początku = wykonane;
+  Markdown:  `- [ ] !! Zapłacić podatki #dom <!-- id:12 -->` w sekcji
+             `## Zadania`, `- Aplikacja #dev <!-- id:3 -->` w `## Pomysły`,
+             `- [x]` = wykonane.
+  Linia bez identyfikatora to nowa pozycja; usunięta linia usuwa wiersz.
+- Trójstronnie: plik i baza są porównywane ze stanem z ostatniej
+  synchronizacji (tabela sync_base). Zmiany z pliku trafiają do bazy
+  jedną transakcją (database.apply_sync_changes), zmiany z bazy do pliku
+  jednym zapisem.
+- Przyrostowo: plik czytamy tylko po zmianie mtime/rozmiaru, a linie
+  takie jak po ostatniej synchronizacji rozpoznajemy słownikiem, bez
+  parsowania. Po stronie bazy sprawdzamy tylko wiersze zgłoszone przez
+  `database.add_change_listener` (pełne uzgodnienie tylko przy starcie).
+- Konflikt (ta sama pozycja zmieniona w pliku i w bocie): wygrywa bot, a
+  wersja z pliku wraca w `SyncResult.conflicts`.
+- Plik zapisujemy przez plik tymczasowy i rename - przerwany zapis nigdy
+  nie wygląda jak usunięte linie. Jeśli edytor zmienił plik w trakcie
+  przebiegu, zapis czeka na następny.
+"""
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 2
+IDEA_TAG = '+pomysl'
+_TABLE_KINDS = {'tasks': 'task', 'ideas': 'idea'}
+
+@dataclass(slots=True)
+class Entry:
+    kind: str
+    row_id: int | None
+    done: bool
+    text: str
+
+@dataclass(slots=True)
+class SyncResult:
+    to_db: int = 0     # zmiany z pliku zapisane w bazie
+    to_file: int = 0   # linie zmienione w pliku
+    conflicts: list = field(default_factory=list)  # [(kind, row_id, tekst z pliku)]
+    deferred: bool = False  # plik zmienił się w trakcie - dokończy następny przebieg
+    duration_ms: float = 0
+
+# --- Formaty ---
+
+class TodoTxtFormat:
+    """todo.txt: każda niepusta linia to pozycja."""
+    _ID = re.compile(r'\s+id:(\d+)$')
+
+    def skeleton(self) -> list:
+        return []
+
+    def parse(self, line: str, section):
+        """(sekcja, Entry albo None) - todo.txt nie ma sekcji."""
+        text = line.strip()
+        if not text:
+            return section, None
+        done = text.startswith('x ')
+        if done:
+            text = text[2:].lstrip()
+        row_id = None
+        match = self._ID.search(text)
+        if match:
+            row_id, text = int(match.group(1)), text[:match.start()]
+        kind = 'task'
+        words = text.split()
+        if IDEA_TAG in words:
+            kind, text = 'idea', ' '.join(word for word in words if word != IDEA_TAG)
+        return section, Entry(kind, row_id, done, text)
+
+    def render(self, kind: str, row_id: int, text: str) -> str:
+        tag = f' {IDEA_TAG}' if kind == 'idea' else ''
+        return f'{text}{tag} id:{row_id}'
+
+    def insert_at(self, lines: list, kind: str) -> int:
+        return len(lines)
+
+class MarkdownFormat:
+    """Markdown: listy w sekcjach `## Zadania` (z polami wyboru) i `## Pomysły`."""
+    SECTIONS = {'task': 'Zadania', 'idea': 'Pomysły'}
+    _KINDS = {title.lower(): kind for kind, title in SECTIONS.items()}
+    _ID = re.compile(r'\s*<!-- id:(\d+) -->$')
+
+    def skeleton(self) -> list:
+        return ['# FocusBot', '', '## Zadania', '', '## Pomysły']
+
+    def _heading(self, text: str):
+        # (czy nagłówek, rodzaj sekcji albo None dla obcej sekcji)
+        if not text.startswith('#'):
+            return False, None
+        return True, self._KINDS.get(text.lstrip('#').strip().lower())
+
+    def parse(self, line: str, section):
+        text = line.strip()
+        is_heading, kind = self._heading(text)
+        if is_heading:
+            return kind, None
+        if section is None or not text.startswith(('- ', '* ')):
+            return section, None
+        body, done = text[2:], False
+        if body.startswith('[ ] '):
+            body = body[4:]
+        elif body[:4] in ('[x] ', '[X] '):
+            body, done = body[4:], True
+        row_id = None
+        match = self._ID.search(body)
+        if match:
+            row_id, body = int(match.group(1)), body[:match.start()]
+        return section, Entry(section, row_id, done, body.strip())
+
+    def render(self, kind: str, row_id: int, text: str) -> str:
+        box = '[ ] ' if kind == 'task' else ''
+        return f'- {box}{text} <!-- id:{row_id} -->'
+
+    def insert_at(self, lines: list, kind: str) -> int:
+        """Indeks za ostatnią pozycją sekcji `kind` (brakującą sekcję dopisuje na końcu)."""
+        start = next((i for i, line in enumerate(lines) if self._heading(line.strip()) == (True, kind)), None)
+        if start is None:
+            lines += ['', f'## {self.SECTIONS[kind]}']
+            return len(lines)
+        end = next((i for i in range(start + 1, len(lines)) if self._heading(lines[i].strip())[0]), len(lines))
+        while end > start + 1 and not lines[end - 1].strip():
+            end -= 1
+        return end
+
+def format_for(path: str):
+    return MarkdownFormat() if path.lower().endswith(('.md', '.markdown')) else TodoTxtFormat()
+
+# --- Synchronizacja ---
+
+class TextSync:
+    """Stan synchronizacji jednego pliku; `sync(parse)` wołane okresowo (job w bot.py)."""
+
+    def __init__(self, path: str, fmt=None):
+        self.path = path
+        self.format = fmt or format_for(path)
+        self.base = None      # {klucz: (content, priority, category)} - ładowany przy pierwszym sync()
+        self.lines = []       # plik po ostatniej synchronizacji
+        self.index = {}       # linia -> klucz (kind, row_id) dla linii z ostatniej synchronizacji
+        self.stamp = None     # (mtime_ns, rozmiar, inode) pliku po ostatnim odczycie/zapisie
+        self.dirty = set()    # klucze zmienione w bazie od ostatniego przebiegu
+        self.unwritten = {}   # nowa linia (bez id) -> klucz wiersza, gdy zapis pliku został odłożony
+        db.add_change_listener(self._on_change)
+
+    def _on_change(self, table: str, row_ids):
+        kind = _TABLE_KINDS.get(table)
+        if kind:
+            self.dirty.update((kind, row_id) for row_id in row_ids)
+
+    def text(self, kind: str, values) -> str:
+        """Treść linii w składni bota: `!!! treść #kategoria`."""
+        content, priority, category = values
+        text = f"{'!' * priority} {content}" if priority and kind == 'task' else content
+        return f'{text} #{category}' if category else text
+
+    def render(self, key, values) -> str:
+        return self.format.render(key[0], key[1], self.text(key[0], values))
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read(self) -> list:
+        with open(self.path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def _write(self, lines: list, expected) -> bool:
+        """Zapis przez plik tymczasowy; False, gdy plik zmienił się od odczytu (`expected`)."""
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        if self._stat() != expected:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, self.path)
+        return True
+
+    def _scan(self, lines: list, parse):
+        """Klucz każdej linii (albo None), linie z kluczem spoza indeksu i nowe pozycje.
+
+        Linie zapisane w ostatnim przebiegu rozpoznaje słownik `index` - bez
+        parsowania. Powtórzony identyfikator (skopiowana linia) to nowa pozycja.
+        """
+        keys, seen, changed, new = [], set(), {}, []
+        markdown = isinstance(self.format, MarkdownFormat)
+        section = None
+        for i, line in enumerate(lines):
+            key = self.index.get(line)
+            if key is not None and key not in seen:
+                if markdown:
+                    section = key[0]  # linia z kluczem leży w sekcji swojego rodzaju
+                keys.append(key)
+                seen.add(key)
+                continue
+            section, entry = self.format.parse(line, section)
+            key = None
+            if entry is not None:
+                values = parse(entry.kind, entry.text)
+                key = (entry.kind, entry.row_id) if entry.row_id is not None else self.unwritten.get(line.strip())
+                if not values[0]:
+                    key = None  # pusta treść (np. sam #tag) - linia zostaje, ale nie jest pozycją
+                elif key is None or key in seen:
+                    new.append((i, entry, values))
+                    key = None
+                else:
+                    changed[key] = (i, entry, values)
+                    seen.add(key)
+            keys.append(key)
+        return keys, changed, new
+
+    def sync(self, parse) -> SyncResult:
+        """Jeden przebieg w obu kierunkach. `parse(kind, tekst)` -> (content, priority, category)."""
+        start = time.perf_counter()
+        result = SyncResult()
+        if self.base is None:
+            self.base = db.get_sync_base()
+            # Pełne uzgodnienie na starcie: zmiany z czasu, gdy synchronizacja nie działała
+            self.dirty.update(self.base, db.get_sync_keys())
+        stamp = self._stat()
+        if stamp is not None and stamp == self.stamp and not self.dirty:
+            return result
+
+        if stamp is None:
+            # Brak pliku: tworzymy go od nowa z bazy (to nie jest usunięcie wszystkich linii)
+            lines = self.format.skeleton()
+            self.dirty.update(self.base, db.get_sync_keys())
+        elif stamp != self.stamp:
+            lines = self._read()
+            if self._stat() != stamp:
+                result.deferred = True  # edytor właśnie zapisuje
+                return result
+        else:
+            lines = self.lines
+        keys, changed, new = self._scan(lines, parse)
+        positions = {key: i for i, key in enumerate(keys) if key is not None}
+        replace = {}  # indeks linii -> nowa linia albo None (usunięcie)
+
+        # --- Plik -> baza ---
+        ops = {}  # klucz -> (op, wartości); None = identyfikator spoza stanu bazowego
+        for key, (i, entry, values) in changed.items():
+            base = self.base.get(key)
+            if base is None:
+                ops[key] = None
+            elif entry.done:
+                ops[key] = ('done', values)
+            elif values != base:
+                ops[key] = ('update', values)
+        if stamp is not None:
+            for key in self.base.keys() - positions.keys():
+                ops[key] = ('delete', self.base[key])
+
+        dirty, self.dirty = self.dirty | ops.keys(), set()
+        current = db.get_sync_values(dirty)
+        applied = {}
+        for key, op in ops.items():
+            if op is None:
+                i, entry, values = changed[key]
+                if entry.done:
+                    replace[i] = None  # wykonane, a w bazie już nieaktywne lub nieznane
+                    positions.pop(key)
+                elif current[key] is None:
+                    new.append((i, entry, values))  # wiersza nie ma - linia staje się nową pozycją
+                    positions.pop(key)
+                elif current[key] != values:
+                    result.conflicts.append((key[0], key[1], entry.text))
+                continue
+            if current[key] != self.base[key] and current[key] != op[1]:
+                # Zmienione po obu stronach: wygrywa bot, linię ustawi strona bazy
+                if op[0] != 'delete' and current[key] is not None:
+                    result.conflicts.append((key[0], key[1], changed[key][1].text))
+                continue
+            applied[key] = op
+
+        new.sort(key=lambda item: item[0])
+        changes = [(op, key[0], key[1], *values) for key, (op, values) in applied.items()]
+        changes += [('add', entry.kind, None, *values) for _, entry, values in new]
+        added = db.apply_sync_changes(changes) if changes else []
+        result.to_db = len(changes)
+
+        for key, (op, values) in applied.items():
+            if op == 'update':
+                self.base[key] = values
+                replace[positions[key]] = self.render(key, values)
+            else:
+                self.base.pop(key)
+                if key in positions:
+                    replace[positions.pop(key)] = None
+        for row_id, (i, entry, values) in zip(added, new):
+            key = (entry.kind, row_id)
+            self.base[key] = values
+            keys[i], positions[key] = key, i
+            replace[i] = self.render(key, values)
+            self.unwritten[lines[i].strip()] = key
+            applied[key] = ('add', values)
+        # Linie zmienione tylko w formie (spacje, kolejność znaczników) - do postaci kanonicznej
+        for key, (i, entry, values) in changed.items():
+            if key in self.base and i not in replace and lines[i] != self.render(key, self.base[key]):
+                replace[i] = self.render(key, self.base[key])
+
+        # --- Baza -> plik ---
+        # self.dirty: m.in. poddrzewa odhaczone kaskadowo przez apply_sync_changes
+        pending, self.dirty = (dirty | self.dirty) - applied.keys(), set()
+        current = db.get_sync_values(pending)
+        base_updates, append = {}, {}
+        for key in pending:
+            value, base = current[key], self.base.get(key)
+            if value is None:
+                if key in positions:
+                    replace[positions[key]] = None
+                if base is not None:
+                    base_updates[key] = None
+                continue
+            line = self.render(key, value)
+            if key not in positions:
+                append.setdefault(key[0], []).append((key, line))
+            elif replace.get(positions[key], lines[positions[key]]) != line:
+                replace[positions[key]] = line
+            if value != base:
+                base_updates[key] = value
+
+        out, out_keys = [], []
+        for i, line in enumerate(lines):
+            line = replace.get(i, line)
+            if line is not None:
+                out.append(line)
+                out_keys.append(keys[i])
+        for kind, items in sorted(append.items()):
+            items.sort()
+            at = self.format.insert_at(out, kind)
+            out_keys += [None] * (len(out) - len(out_keys))  # nagłówek sekcji dopisany przez insert_at
+            out[at:at] = [line for _, line in items]
+            out_keys[at:at] = [key for key, _ in items]
+        result.to_file = len(replace) + sum(map(len, append.values()))
+
+        if out != lines or stamp is None:
+            if not self._write(out, stamp):
+                # Edytor zapisał plik w trakcie: zmiany z bazy wrócą w następnym przebiegu
+                self.dirty |= pending
+                self.stamp = None
+                result.deferred = True
+                return self._finish(result, start)
+            stamp = self._stat()
+        if base_updates:
+            db.save_sync_base(base_updates)
+        for key, value in base_updates.items():
+            if value is None:
+                self.base.pop(key, None)
+            else:
+                self.base[key] = value
+        self.lines, self.stamp = out, stamp
+        self.index = {line: key for line, key in zip(out, out_keys) if key is not None}
+        self.unwritten.clear()
+        return self._finish(result, start)
+
+    def _finish(self, result: SyncResult, start: float) -> SyncResult:
+        result.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        if result.to_db or result.to_file or result.conflicts:
+            logger.info("Synchronizacja z plikiem: %d zmian do bazy, %d do pliku, %d konfliktów",
+                        result.to_db, result.to_file, len(result.conflicts),
+                        extra={'duration_ms': result.duration_ms})
+        return result